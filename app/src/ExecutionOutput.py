@@ -0,0 +1,154 @@
+# ExecutionOutput holds the output of a single job execution
+#  Only the first and last maxBytes/2 bytes are kept in memory. Once output exceeds
+#  maxBytes everything is also written to a spool file so the full output is not lost
+#  Output is written by the thread running the job and can be read while the job runs
+#  by offset so clients can follow it
+import os
+import threading
+
+class ExecutionOutputClass():
+  headMax = None
+  tailMax = None
+  head = None
+  tail = None
+  totalBytes = 0
+  spoolFileName = None
+  spoolFile = None
+  spooled = False
+  closed = False
+  condition = None # covers all the above and is notified when output is written or closed
+
+  def __init__(self, maxBytes, spoolFileName):
+    self.headMax = maxBytes // 2
+    self.tailMax = maxBytes - self.headMax
+    self.head = bytearray()
+    self.tail = bytearray()
+    self.totalBytes = 0
+    self.spoolFileName = spoolFileName
+    self.spoolFile = None
+    self.spooled = False
+    self.closed = False
+    self.condition = threading.Condition()
+
+  def write(self, chunk):
+    with self.condition:
+      self.totalBytes += len(chunk)
+      if len(self.head) < self.headMax:
+        headSpace = self.headMax - len(self.head)
+        self.head += chunk[:headSpace]
+        chunk = chunk[headSpace:]
+      if len(chunk) > 0:
+        if not self.spooled:
+          if (len(self.tail) + len(chunk)) > self.tailMax:
+            self._startSpooling()
+        if self.spoolFile is not None:
+          self.spoolFile.write(chunk)
+        self.tail += chunk
+        if len(self.tail) > self.tailMax:
+          del self.tail[:len(self.tail) - self.tailMax]
+      self.condition.notify_all()
+
+  #Output is about to be lost from memory so write everything seen so far to the spool file
+  def _startSpooling(self):
+    self.spooled = True
+    if self.spoolFileName is None:
+      return
+    try:
+      #unbuffered so readers following the output see everything written
+      #only the owner may read it as job output can contain secrets
+      fd = os.open(self.spoolFileName, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+      self.spoolFile = os.fdopen(fd, 'wb', buffering=0)
+      self.spoolFile.write(self.head)
+      self.spoolFile.write(self.tail)
+    except OSError as err:
+      print('Could not open output spool file ' + self.spoolFileName + ' - ' + str(err))
+      self.spoolFile = None
+      self.spoolFileName = None
+
+  #Called when the job has finished writing output
+  def close(self):
+    with self.condition:
+      if self.spoolFile is not None:
+        self.spoolFile.close()
+        self.spoolFile = None
+      self.closed = True
+      self.condition.notify_all()
+
+  def isTruncated(self):
+    return self.totalBytes > (len(self.head) + len(self.tail))
+
+  #Remove the spool file. Called when the execution is deleted or purged
+  def remove(self):
+    self.close()
+    with self.condition:
+      if not self.spooled:
+        return
+      if self.spoolFileName is None:
+        return
+      try:
+        os.remove(self.spoolFileName)
+      except FileNotFoundError:
+        pass
+      self.spoolFileName = None
+
+  #Returns the output as bytes. If output was truncated the middle is replaced by a message
+  def getValue(self):
+    with self.condition:
+      if not self.isTruncated():
+        return bytes(self.head + self.tail)
+      missingBytes = self.totalBytes - len(self.head) - len(self.tail)
+      msg = '\n...[' + str(missingBytes) + ' bytes of output truncated'
+      if self.spoolFileName is not None:
+        msg += ' - full output in ' + self.spoolFileName
+      msg += ']...\n'
+      return bytes(_trimIncompleteUTF8End(self.head)) + msg.encode() + bytes(_trimIncompleteUTF8Start(self.tail))
+
+  #Read up to maxBytes of output starting at offset
+  # returns (offset, data). The returned offset is greater than the one asked for when the
+  # requested output is no longer available (truncated and not spooled)
+  def read(self, offset, maxBytes):
+    with self.condition:
+      if offset >= self.totalBytes:
+        return (offset, b'')
+      if offset < len(self.head):
+        return (offset, bytes(self.head[offset:offset + maxBytes]))
+      tailStartOffset = self.totalBytes - len(self.tail)
+      if offset >= tailStartOffset:
+        return (offset, bytes(self.tail[offset - tailStartOffset:offset - tailStartOffset + maxBytes]))
+      if self.spoolFileName is not None:
+        with open(self.spoolFileName, 'rb') as f:
+          f.seek(offset)
+          return (offset, f.read(min(maxBytes, tailStartOffset - offset)))
+      return (tailStartOffset, bytes(self.tail[:maxBytes]))
+
+  #Block until there is output after offset, the output is closed or timeout seconds pass
+  # returns True if there may be more output to come
+  def waitForOutput(self, offset, timeout):
+    with self.condition:
+      self.condition.wait_for(lambda: (self.totalBytes > offset) or self.closed, timeout)
+      return (self.totalBytes > offset) or (not self.closed)
+
+#When output is cut in two a multibyte utf-8 character may be split
+# these remove the partial character so the result can still be decoded
+def _trimIncompleteUTF8Start(data):
+  start = 0
+  while start < min(3, len(data)) and (data[start] & 0xC0) == 0x80:
+    start += 1
+  return data[start:]
+
+def _trimIncompleteUTF8End(data):
+  for back in range(1, min(4, len(data)) + 1):
+    byte = data[-back]
+    if (byte & 0xC0) == 0x80:
+      continue # continuation byte, keep looking for the lead byte
+    if byte < 0x80:
+      return data
+    expectedLength = 2
+    if byte >= 0xE0:
+      expectedLength = 3
+    if byte >= 0xF0:
+      expectedLength = 4
+    if back < expectedLength:
+      return data[:-back]
+    return data
+  return data
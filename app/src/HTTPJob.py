@@ -0,0 +1,169 @@
+# HTTPJob runs jobs with executionMode http
+#  Instead of starting a process (e.g. wget) the request is made from the worker thread.
+#  Connections are kept open after a request and reused by later requests to the same
+#  host so frequent health check jobs don't open a new connection every time.
+import http.client
+import socket
+import threading
+from urllib.parse import urlsplit
+
+validHTTPMethods = ['GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS']
+
+#Methods that are safe to send again if a reused connection turns out to have been closed by the server
+retryableHTTPMethods = ['GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS']
+
+class HTTPConnectionPoolClass():
+  maxIdlePerHost = None
+  idleConnections = None # (scheme, host, port) -> list of idle connections
+  lock = None # covers idleConnections
+
+  def __init__(self, maxIdlePerHost):
+    self.maxIdlePerHost = maxIdlePerHost
+    self.idleConnections = dict()
+    self.lock = threading.Lock()
+
+  #returns (connection, reused)
+  def getConnection(self, key, timeout):
+    with self.lock:
+      idle = self.idleConnections.get(key, [])
+      if len(idle) > 0:
+        conn = idle.pop()
+        conn.timeout = timeout
+        if conn.sock is not None:
+          conn.sock.settimeout(timeout)
+        return (conn, True)
+    (scheme, host, port) = key
+    if scheme == 'https':
+      return (http.client.HTTPSConnection(host, port, timeout=timeout), False)
+    return (http.client.HTTPConnection(host, port, timeout=timeout), False)
+
+  def returnConnection(self, key, conn):
+    with self.lock:
+      idle = self.idleConnections.setdefault(key, [])
+      if len(idle) < self.maxIdlePerHost:
+        idle.append(conn)
+        return
+    conn.close()
+
+  def closeAll(self):
+    with self.lock:
+      for key in self.idleConnections:
+        for conn in self.idleConnections[key]:
+          conn.close()
+      self.idleConnections = dict()
+
+#Check the httpRequest of a job and fill in defaults. Raises ValueError if it is not valid
+def normaliseHTTPRequest(httpRequest):
+  if not isinstance(httpRequest, dict):
+    raise ValueError('httpRequest must be an object')
+  url = httpRequest.get('url', None)
+  if not isinstance(url, str):
+    raise ValueError('httpRequest url must be set')
+  splitURL = urlsplit(url)
+  if splitURL.scheme not in ['http', 'https'] or splitURL.hostname is None:
+    raise ValueError('httpRequest url must be a http or https url')
+  method = httpRequest.get('method', None)
+  if method is None:
+    method = 'GET'
+  method = method.upper()
+  if method not in validHTTPMethods:
+    raise ValueError('httpRequest method must be one of ' + ','.join(validHTTPMethods))
+  headers = httpRequest.get('headers', None)
+  if headers is None:
+    headers = dict()
+  if not isinstance(headers, dict):
+    raise ValueError('httpRequest headers must be an object')
+  for name in headers:
+    if not isinstance(headers[name], str):
+      raise ValueError('Value of httpRequest header ' + name + ' must be a string')
+  body = httpRequest.get('body', None)
+  if body is not None and not isinstance(body, str):
+    raise ValueError('httpRequest body must be a string')
+  expectedStatus = httpRequest.get('expectedStatus', None)
+  if expectedStatus is not None:
+    if not isinstance(expectedStatus, int) or expectedStatus < 100 or expectedStatus > 599:
+      raise ValueError('httpRequest expectedStatus must be a HTTP status code')
+  return {
+    'method': method,
+    'url': url,
+    'headers': headers,
+    'body': body,
+    'expectedStatus': expectedStatus,
+  }
+
+class HTTPJobRunnerClass():
+  connectionPool = None
+
+  def __init__(self, maxIdleConnectionsPerHost):
+    self.connectionPool = HTTPConnectionPoolClass(maxIdleConnectionsPerHost)
+
+  #Make the request, writing the status line and body to outputBuffer
+  # returns 0 if the response had the expected status (any 2xx if none is set), the status code
+  # if it didn't, 1 if the request failed and -1 if it timed out. (The same -1 a timed out command gets)
+  def execute(self, httpRequest, outputBuffer, timeout, maxBodyBytes):
+    splitURL = urlsplit(httpRequest['url'])
+    port = splitURL.port
+    if port is None:
+      port = 443 if splitURL.scheme == 'https' else 80
+    key = (splitURL.scheme, splitURL.hostname, port)
+    path = splitURL.path
+    if path == '':
+      path = '/'
+    if splitURL.query != '':
+      path += '?' + splitURL.query
+    body = None
+    if httpRequest['body'] is not None:
+      body = httpRequest['body'].encode()
+
+    conn = None
+    try:
+      (conn, response) = self._sendRequest(key, httpRequest['method'], path, body, httpRequest['headers'], timeout)
+      outputBuffer.write(('HTTP ' + str(response.status) + ' ' + response.reason + '\n').encode())
+      bodyBytesRead = 0
+      while True:
+        chunk = response.read(min(65536, maxBodyBytes - bodyBytesRead))
+        if len(chunk) == 0:
+          break
+        outputBuffer.write(chunk)
+        bodyBytesRead += len(chunk)
+        if bodyBytesRead >= maxBodyBytes:
+          break
+      if response.isclosed() and not response.will_close:
+        self.connectionPool.returnConnection(key, conn)
+      else:
+        #body was not fully read or server wants to close the connection
+        if not response.isclosed():
+          outputBuffer.write(b'\n...[response body truncated]...')
+        conn.close()
+    except socket.timeout:
+      if conn is not None:
+        conn.close()
+      outputBuffer.write(b'\nRequest timed out')
+      return -1
+    except (OSError, http.client.HTTPException) as err:
+      if conn is not None:
+        conn.close()
+      outputBuffer.write(('\nRequest failed - ' + type(err).__name__ + ' ' + str(err)).encode())
+      return 1
+
+    if httpRequest['expectedStatus'] is None:
+      if response.status >= 200 and response.status < 300:
+        return 0
+    elif response.status == httpRequest['expectedStatus']:
+      return 0
+    return response.status
+
+  #returns (connection, response). Tries again if a reused connection had been closed by the server
+  def _sendRequest(self, key, method, path, body, headers, timeout):
+    while True:
+      (conn, reused) = self.connectionPool.getConnection(key, timeout)
+      try:
+        conn.request(method, path, body=body, headers=headers)
+        return (conn, conn.getresponse())
+      except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+        conn.close()
+        if not reused or method not in retryableHTTPMethods:
+          raise
+      except Exception:
+        conn.close()
+        raise
@@ -19,7 +19,7 @@ def getJobExecutionModel(appObj):
     'guid': fields.String(default='',description='Unique identifier for this job execution'),
     'executionName': fields.String(default=''),
     'manual': fields.Boolean(default=False,description='Was the Job manually requested'),
-    'stage': fields.String(default='',description='Execution Stage'),
+    'stage': fields.String(default='',description='Execution Stage. Pending, Running, Completed, Timeout or Replaced'),
     'jobGUID': fields.String(default='',description='Unique identifier for the job this execution is for'),
     'jobName': fields.String(default='',description='Name of the job being executed'),
     'jobCommand': fields.String(default=''),
@@ -27,7 +27,14 @@ def getJobExecutionModel(appObj):
     'dateStarted': fields.DateTime(dt_format=u'iso8601', description='Time the execution was started'),
     'dateCompleted': fields.DateTime(dt_format=u'iso8601', description='Time the execution was completed'),
     'resultReturnCode': fields.Integer(default=0,description='Return code or -1 for timed out'),
-    'resultSTDOUT': fields.String(default='',description='Output from the job')
+    'resultSTDOUT': fields.String(default='',description='Output from the job'),
+    'durationSeconds': fields.Float(default=None,description='Wall clock time the job ran for'),
+    'userCPUSeconds': fields.Float(default=None,description='CPU time the job used in user mode (null for http jobs)'),
+    'systemCPUSeconds': fields.Float(default=None,description='CPU time the job used in the kernel (null for http jobs)'),
+    'maxRSSKB': fields.Integer(default=None,description='Peak resident memory of the job in kilobytes (null for http jobs)'),
+    'schedulingDelaySeconds': fields.Float(default=None,description='Seconds between the time a scheduled run was due and the time it was submitted (null for manual and event triggered runs)'),
+    'coalescedCount': fields.Integer(default=0,description='Number of scheduled or event triggered runs merged into this execution while it was Pending'),
+    'queuePosition': fields.Integer(default=None,description='Place in the queue of Pending executions waiting for a worker (1 is next) or null if not queued')
   })
 
 
@@ -38,6 +45,11 @@ def getJobExecutionModel(appObj):
 class SimpleJobObj():
   name = 'SimpleJobObjConstantName'
   guid = None
+  timeoutSeconds = None
+  environment = None
+  executionMode = 'shell'
+  priority = 0
+  resourceLimits = None
   def __init__(self):
     self.guid = str(uuid.uuid4())
 
@@ -58,16 +70,22 @@ class SimpleJobExecutionClass():
   jobObj = None
   triggerJobObj = None
   triggerExecutionObj = None
+  outputBuffer = None
+  jobCommandArgs = None
+  jobHTTPRequest = None
 
 
-  def __init__(self, command):
+  def __init__(self, command, commandArgs=None):
     self.guid = str(uuid.uuid4())
     self.jobCommand = command
+    self.jobCommandArgs = commandArgs
+    self.jobHTTPRequest = None
     self.jobObj = SimpleJobObj()
     self.jobGUID = self.jobObj.guid
     self.triggerJobObj = None
     self.triggerExecutionObj = None
     self.executionName = 'SimpleJobExecutionConstantName'
+    self.outputBuffer = None
 
   def getJobExecutionMethod(self):
     return 'Manual'
@@ -78,6 +96,9 @@ class SimpleJobExecutionClass():
     del ret['jobObj']
     del ret['triggerJobObj']
     del ret['triggerExecutionObj']
+    del ret['outputBuffer']
+    del ret['jobCommandArgs']
+    del ret['jobHTTPRequest']
     return ret
 
 
@@ -86,19 +107,28 @@ class JobExecutionClass():
   guid = None
   executionName = None #executons not accessible by this name which dosen't have to be unique
   manual = None #manually ran or ran from schedule
-  stage = None  #Pending, Running, Completed, Timeout
+  stage = None  #Pending, Running, Completed, Timeout, Replaced
   jobGUID = None #copy taken on init so it is invariant during execution
   jobCommand = None #copy taken on init so it is invariant during execution
   dateCreated = None
   dateStarted = None
   dateCompleted = None
   resultReturnCode = None
-  resultSTDOUT = None
+  coalescedCount = 0 #scheduled or event runs merged into this execution while Pending
+  durationSeconds = None
+  userCPUSeconds = None
+  systemCPUSeconds = None
+  maxRSSKB = None
+  schedulingDelaySeconds = None #only set for scheduled runs
 
   #Items not in JSON output
   jobObj = None
   triggerJobObj = None
   triggerExecutionObj = None
+  outputBuffer = None #ExecutionOutputClass set by the executor when the job starts
+  jobCommandArgs = None #tokenized command when the job is in exec mode, None to run the command with the shell
+  jobHTTPRequest = None #request to make when the job is in http mode
+  pendingQueueKey = None #sort key in the executors pending queue, set when the execution is queued
 
   def __repr__(self):
     ret = 'JobExecutionClass('
@@ -122,23 +152,56 @@ class JobExecutionClass():
     self.stage = 'Pending'
     self.jobGUID = jobObj.guid
     self.jobCommand = jobObj.command
+    self.jobCommandArgs = jobObj.commandArgs
+    self.jobHTTPRequest = jobObj.httpRequest
+    self.pendingQueueKey = None
     self.dateCreated = curDatetime.isoformat()
     self.dateStarted = None
     self.dateCompleted = None
     self.resultReturnCode = None
-    self.resultSTDOUT = None
+    self.coalescedCount = 0
+    self.durationSeconds = None
+    self.userCPUSeconds = None
+    self.systemCPUSeconds = None
+    self.maxRSSKB = None
+    self.schedulingDelaySeconds = None
     self.executionName = executionName
     self.manual = manual
     self.jobObj = jobObj
     self.triggerJobObj = triggerJobObj
     self.triggerExecutionObj = triggerExecutionObj
+    self.outputBuffer = None
 
-  def _caculatedDict(self):
+  #The output is only held once, in outputBuffer, for as long as the execution is retained
+  # so resultSTDOUT is worked out from it each time it is asked for
+  @property
+  def resultSTDOUT(self):
+    if self.dateCompleted is None or self.stage == 'Replaced' or self.outputBuffer is None:
+      return None
+    try:
+      return self.outputBuffer.getValue().decode().strip()
+    except UnicodeDecodeError:
+      return "ERROR - failed to decode output probally because it wasn't in utf-8 format"
+
+  #Remove any output spool file. Called when the execution is deleted or purged
+  def removeOutput(self):
+    if self.outputBuffer is not None:
+      self.outputBuffer.remove()
+
+  #appObj is needed to include the queue position
+  def _caculatedDict(self, appObj=None):
     ret = dict(self.__dict__)
     ret['jobName'] = self.jobObj.name
     del ret['jobObj']
     del ret['triggerJobObj']
     del ret['triggerExecutionObj']
+    del ret['outputBuffer']
+    del ret['jobCommandArgs']
+    del ret['jobHTTPRequest']
+    del ret['pendingQueueKey']
+    ret['resultSTDOUT'] = self.resultSTDOUT
+    if appObj is not None:
+      ret['queuePosition'] = appObj.jobExecutor.getQueuePosition(self)
     return ret
 
   def execute(self, executor, lockAcquireFn, lockReleaseFn, registerRunDetailsFn, appObj):
@@ -153,7 +216,6 @@ class JobExecutionClass():
     except TimeoutExpired:
       lockAcquireFn()
       self.resultReturnCode = -1
-      self.resultSTDOUT = None
       self.stage = 'Timeout'
       self.dateCompleted = appObj.getCurDateTime().isoformat()
       registerRunDetailsFn(jobGUID=self.jobGUID, newLastRunDate=appObj.getCurDateTime(), newLastRunReturnCode=self.resultReturnCode, triggerExecutionObj=self)
@@ -161,10 +223,10 @@ class JobExecutionClass():
       return
     lockAcquireFn()
     self.resultReturnCode = executionResult.returncode
-    try:
-      self.resultSTDOUT = executionResult.stdout.decode().strip()
-    except Exception:
-      self.resultSTDOUT = "ERROR - failed to decode output probally because it wasn't in utf-8 format"
+    self.durationSeconds = executionResult.resourceUsage.get('durationSeconds', None)
+    self.userCPUSeconds = executionResult.resourceUsage.get('userCPUSeconds', None)
+    self.systemCPUSeconds = executionResult.resourceUsage.get('systemCPUSeconds', None)
+    self.maxRSSKB = executionResult.resourceUsage.get('maxRSSKB', None)
     #valid exit codes are between 0-255. I have hijacked -1 for timeout
     if executionResult.returncode == -1:
       self.stage = 'Timeout'
@@ -174,6 +236,13 @@ class JobExecutionClass():
     registerRunDetailsFn(jobGUID=self.jobGUID, newLastRunDate=appObj.getCurDateTime(), newLastRunReturnCode=self.resultReturnCode, triggerExecutionObj=self)
     lockReleaseFn()
 
+  #Called with the execution lock held when a newer execution for the same job takes the place of this Pending one
+  def markReplaced(self, curDatetime):
+    self.stage = 'Replaced'
+    self.dateCompleted = curDatetime.isoformat()
+    if self.outputBuffer is not None:
+      self.outputBuffer.close()
+
   def getJobExecutionMethod(self):
     #determine setting from Manual,Scheduled,StateChangeToSuccess,StateChangeToFail,StateChangeToUnknown
     if self.manual:
@@ -182,3 +251,15 @@ class JobExecutionClass():
       return 'Scheduled'
     return 'StateChangeTo' + self.triggerJobObj.mostRecentCompletionStatus
 
+  #Pending executions with a lower priority class are run first
+  # manual runs go before executions triggered by another jobs state change which go before scheduled runs
+  priorityClassManual = 0
+  priorityClassEvent = 1
+  priorityClassScheduled = 2
+  def getPriorityClass(self):
+    if self.manual:
+      return JobExecutionClass.priorityClassManual
+    if self.triggerJobObj is None:
+      return JobExecutionClass.priorityClassScheduled
+    return JobExecutionClass.priorityClassEvent
+
@@ -7,34 +7,188 @@ import pwd
 import grp
 import time
 import threading
+import selectors
 from JobExecution import JobExecutionClass, SimpleJobExecutionClass
+from ExecutionOutput import ExecutionOutputClass
+from JobSpawner import JobSpawnerClass, PopenJobProcessClass
+from HTTPJob import HTTPJobRunnerClass
+from JobResourceLimits import applyResourceLimits
 from sortedcontainers import SortedDict
 import datetime
 import pytz
-import queue
+import collections
+import traceback
 from baseapp_for_restapi_backend_with_swagger import from_iso8601
+from werkzeug.exceptions import BadRequest, TooManyRequests
+
+#Raised when a manual execution is requested while too many executions are waiting to run
+class TooManyPendingExecutionsException(TooManyRequests):
+  retryAfterSeconds = None
+
+  def __init__(self, description, retryAfterSeconds):
+    super(TooManyPendingExecutionsException, self).__init__(description)
+    self.retryAfterSeconds = retryAfterSeconds
+
+  def get_headers(self, environ=None):
+    headers = super(TooManyPendingExecutionsException, self).get_headers(environ)
+    headers.append(('Retry-After', str(self.retryAfterSeconds)))
+    return headers
+
+# Worker threads take execution GUID's off the pending queue and run them
+#  this means a long running job only ties up one worker and the main
+#  scheduler loop keeps running while jobs execute
+class JobExecutorWorkerClass(threading.Thread):
+  executor = None
+  workerNumber = None
+
+  def __init__(self, executor, workerNumber):
+    self.executor = executor
+    self.workerNumber = workerNumber
+    threading.Thread.__init__(self, name='JobExecutorWorker' + str(workerNumber))
+    self.daemon = True
+
+  def run(self):
+    while True:
+      executionGUID = self.executor.pendingExecutions.get()
+      if executionGUID is None:
+        #None is placed on the queue to tell workers to stop
+        break
+      try:
+        self.executor.executeExecution(executionGUID, datetime.datetime.now(pytz.utc))
+      except Exception as err:
+        #a failure in one execution must not kill the worker
+        print('Worker ' + str(self.workerNumber) + ' failed running execution ' + executionGUID + ' - ' + str(err))
+
+#Pending executions waiting for a worker
+# ordered by (priority class, -job priority, sequence number) so manual runs go first and
+# executions of the same priority run in the order they were queued. Kept in a SortedDict rather
+# than a queue.PriorityQueue so the position of an execution in the queue can be found quickly
+class PendingExecutionQueueClass():
+  condition = None # covers all the below
+  queued = None # key -> execution GUID, None tells a worker to stop
+  lastSequenceNumber = 0
+
+  def __init__(self):
+    self.condition = threading.Condition()
+    self.queued = SortedDict()
+    self.lastSequenceNumber = 0
+
+  def getNextSequenceNumber(self):
+    with self.condition:
+      self.lastSequenceNumber += 1
+      return self.lastSequenceNumber
+
+  def put(self, key, executionGUID):
+    with self.condition:
+      self.queued[key] = executionGUID
+      self.condition.notify()
+
+  #Block until there is an execution in the queue and return it's GUID
+  def get(self):
+    with self.condition:
+      self.condition.wait_for(lambda: len(self.queued) > 0)
+      return self.queued.popitem(0)[1]
+
+  def empty(self):
+    with self.condition:
+      return len(self.queued) == 0
+
+  #Take an execution that will no longer run out of the queue
+  def remove(self, key):
+    with self.condition:
+      self.queued.pop(key, None)
+
+  #1 is next to run, None if the key is not in the queue
+  def getPosition(self, key):
+    with self.condition:
+      if key not in self.queued:
+        return None
+      return self.queued.index(key) + 1
+
+#Priority class used for the markers that stop workers. Sorts after every execution so queued executions are run first
+stopWorkerPriorityClass = 99
 
 class JobExecutorClass(threading.Thread):
   processUserID = None
   processGroupID = None
-  timeout = 15 #default to 15 second timeout for jobs
+  timeout = 15 #default to 15 second timeout for jobs, jobs can override this
+  killGracePeriod = 5 #seconds between sending SIGTERM and SIGKILL to a job that timed out
   appObj = None
+  maxConcurrentJobs = 1
+  workers = None
+  maxJobOutputBytes = None
+  jobOutputSpoolDir = None
+  baseJobEnviroment = None # server enviroment passed to every job, built once at startup
+  jobSpawner = None # JobSpawnerClass used to start jobs, None to start them directly
+  httpJobRunner = None # runs jobs in http mode, connections are pooled across executions
 
   # https://docs.python.org/3/library/asyncio-sync.html#asyncio.Lock
   JobExecutions =  None
   JobExecutionLock = None
-  pendingExecutions = None # Queue to hold GUID's of executions to run
+  pendingExecutions = None # PendingExecutionQueueClass holding GUID's of executions to run
 
   totalExecutions = 0 #covered for writing by jobexecutionlock
 
+  #Per job tracking used to enforce maxConcurrentExecutions. All covered by jobexecutionlock
+  activeExecutionsByJob = None # jobGUID -> list of executions which are Pending or Running
+  runningCountByJob = None # jobGUID -> number of executions which have been started
+  deferredExecutionsByJob = None # jobGUID -> deque of execution GUID's waiting for a running execution to finish
+
+  #Limits on executions waiting to run. All covered by jobexecutionlock
+  maxPendingExecutions = None
+  maxPendingExecutionsPerJob = None
+  waitingExecutionsByJob = None # jobGUID -> set of GUID's of executions that have not been started by a worker
+  waitingExecutionCount = 0
+  droppedScheduledExecutions = 0 # scheduled and event runs not created because of the limits
+  misfireThresholdSeconds = None # scheduled runs later than this are handled by the jobs misfirePolicy
+
+  #The main loop sleeps until it next has something to do or it is woken by a change
+  wakeCondition = None # covers wakeRequested
+  wakeRequested = False
+  maxLoopSleepSeconds = 60 # upper bound on a sleep so changes to the system clock are noticed
+  executionRetention = datetime.timedelta(days=7) # completed executions are purged after this
+
+  #Completed executions keyed by (dateCompleted, guid) so the ones due to be purged are at the front. Covered by jobexecutionlock
+  retentionIndex = None
+  retentionIndexKeys = None # execution GUID -> key of the execution in retentionIndex
+  executionPurgeInterval = None # timedelta, purging is done at most this often
+  lastPurgeTime = None
+  purgeBatchSize = 100 # most executions purged each time the lock is taken so API readers are not held up
+  failedIterationRetrySeconds = 1 # wait before trying again after a main loop iteration fails
+
   def __init__(self, appObj, skipUserCheck):
     self.JobExecutions =  SortedDict()
     self.JobExecutionLock = threading.Lock()
-    self.pendingExecutions = queue.Queue() # Queue to hold GUID's of executions to run
+    self.pendingExecutions = PendingExecutionQueueClass()
+    self.activeExecutionsByJob = dict()
+    self.runningCountByJob = dict()
+    self.deferredExecutionsByJob = dict()
+    self.waitingExecutionsByJob = dict()
+    self.waitingExecutionCount = 0
+    self.wakeCondition = threading.Condition()
+    self.wakeRequested = False
+    self.droppedScheduledExecutions = 0
+    self.retentionIndex = SortedDict()
+    self.retentionIndexKeys = dict()
+    self.lastPurgeTime = None
 
     self.totalExecutions = 0
 
     self.appObj = appObj
+    self.maxConcurrentJobs = appObj.maxConcurrentJobs
+    self.timeout = appObj.defaultJobTimeoutSeconds
+    self.killGracePeriod = appObj.jobKillGraceSeconds
+    self.maxPendingExecutions = appObj.maxPendingExecutions
+    self.maxPendingExecutionsPerJob = appObj.maxPendingExecutionsPerJob
+    self.misfireThresholdSeconds = appObj.misfireThresholdSeconds
+    self.executionPurgeInterval = datetime.timedelta(seconds=appObj.executionPurgeIntervalSeconds)
+    self.workers = []
+    self.maxJobOutputBytes = appObj.maxJobOutputBytes
+    self.jobOutputSpoolDir = appObj.jobOutputSpoolDir
+    self.prepareJobOutputSpoolDir()
+    self.baseJobEnviroment = self.buildBaseJobEnviroment(os.environ, appObj.jobEnvAllowList)
+    #a worker can only use one connection at a time so there is no point keeping more idle
+    self.httpJobRunner = HTTPJobRunnerClass(self.maxConcurrentJobs)
     if os.getuid() != 0:
       raise Exception('Job Executor only works when run as root')
     if appObj.userforjobs == None:
@@ -57,6 +211,11 @@ class JobExecutorClass(threading.Thread):
 
     print('Will run jobs as user: ' + appObj.userforjobs + ' (' + str(self.processUserID) + ')')
     print('Will run jobs as group: ' + appObj.groupforjobs + ' (' + str(self.processGroupID) + ')')
+    print('Will run up to ' + str(self.maxConcurrentJobs) + ' jobs concurrently')
+
+    if appObj.useJobSpawner:
+      self.jobSpawner = JobSpawnerClass(self.getDemoteFunction())
+      self.jobSpawner.start()
 
     if not skipUserCheck:
       testProcess = self.executeCommand(SimpleJobExecutionClass('whoami'))
@@ -81,8 +240,15 @@ class JobExecutorClass(threading.Thread):
     #completedProcess = subprocess.run(jobExecutionObj.jobCommand, stdin=None, input=None, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, shell=True, cwd=None, timeout=self.timeout, check=False, preexec_fn=self.getDemoteFunction())
     #return completedProcess
 
-    job_env = dict()
-    job_env = os.environ.copy()
+    if jobExecutionObj.outputBuffer is None:
+      jobExecutionObj.outputBuffer = self.createOutputBuffer(jobExecutionObj.guid)
+    outputBuffer = jobExecutionObj.outputBuffer
+
+    startTime = time.monotonic()
+    if jobExecutionObj.jobHTTPRequest is not None:
+      return self.executeHTTPRequest(jobExecutionObj, outputBuffer, startTime)
+
+    job_env = self.getJobEnviroment(jobExecutionObj)
     job_env["DOCKJOB_JOB_GUID"] = jobExecutionObj.jobGUID
     job_env["DOCKJOB_JOB_NAME"] = jobExecutionObj.jobObj.name
     job_env["DOCKJOB_EXECUTION_METHOD"] = jobExecutionObj.getJobExecutionMethod()
@@ -105,27 +271,165 @@ class JobExecutorClass(threading.Thread):
       job_env["DOCKJOB_TRIGGEREXECUTION_NAME"] = jobExecutionObj.triggerExecutionObj.executionName
       job_env["DOCKJOB_TRIGGEREXECUTION_STDOUT"] = jobExecutionObj.triggerExecutionObj.resultSTDOUT
 
-    start_time = time.time()
-    proc = subprocess.Popen(jobExecutionObj.jobCommand, stdin=None, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, shell=True, cwd=None, preexec_fn=self.getDemoteFunction(), env=job_env)
-    returncode = None
-    while (returncode == None):
-      returncode = proc.poll()
-      if (time.time() - start_time) > self.timeout:
-        os.killpg(os.getpgid(proc.pid), signal.SIGTERM)
-        #valid return codes are between 0-255. I have hijacked -1 for timeout
-        returncode = -1
-      time.sleep(0.2)
-    stdout, stderr = proc.communicate()
+    try:
+      jobProcess = self.startJobProcess(jobExecutionObj.jobCommand, jobExecutionObj.jobCommandArgs, job_env, jobExecutionObj.jobObj.resourceLimits)
+    except OSError as err:
+      #In exec mode there is no shell to report a missing program so report it the same way a shell would
+      outputBuffer.write(('Could not start job - ' + str(err) + '\n').encode())
+      outputBuffer.close()
+      return self.getCompletedProcess(jobExecutionObj, 127, outputBuffer, {'durationSeconds': time.monotonic() - startTime})
+
+    #Completion is detected by the kernel (EOF on the output pipe then a blocking wait)
+    # rather than polling. A deadline thread kills the process group if the job runs too long
+    timeout = self.getTimeoutForExecution(jobExecutionObj)
+    timedOut = threading.Event()
+    finished = threading.Event()
+    killLock = threading.Lock() # stops a kill being sent after the process has been reaped (pid could be reused)
+    def enforceDeadline():
+      if finished.wait(timeout):
+        return
+      with killLock:
+        if finished.is_set():
+          return
+        timedOut.set()
+        jobProcess.sendSignal(signal.SIGTERM)
+      #Jobs that ignore SIGTERM are killed after the grace period
+      if finished.wait(self.killGracePeriod):
+        return
+      with killLock:
+        if finished.is_set():
+          return
+        print('Job ' + jobExecutionObj.executionName + ' ignored SIGTERM - sending SIGKILL')
+        jobProcess.sendSignal(signal.SIGKILL)
+    deadlineThread = threading.Thread(target=enforceDeadline, name='JobDeadline-' + jobExecutionObj.guid)
+    deadlineThread.daemon = True
+    deadlineThread.start()
+    try:
+      try:
+        #Extra second allows for a process that left a child holding the pipe open after it was killed
+        self.readOutputUntilClosed(jobProcess.stdout, outputBuffer, time.monotonic() + timeout + self.killGracePeriod + 1)
+        jobProcess.stdout.close()
+        jobProcess.waitForExit()
+      finally:
+        with killLock:
+          finished.set()
+      returncode = jobProcess.reap()
+    except OSError as err:
+      #e.g. the job spawner died while the job was running. The execution must still complete
+      jobProcess.stdout.close()
+      outputBuffer.write(('\nLost track of job - ' + str(err) + '\n').encode())
+      returncode = 1
+    finally:
+      outputBuffer.close()
+    resourceUsage = {'durationSeconds': time.monotonic() - startTime}
+    if jobProcess.resourceUsage is not None:
+      resourceUsage.update(jobProcess.resourceUsage)
+    if timedOut.is_set():
+      #valid return codes are between 0-255. I have hijacked -1 for timeout
+      returncode = -1
+    return self.getCompletedProcess(jobExecutionObj, returncode, outputBuffer, resourceUsage)
+
+  #resourceUsage has durationSeconds and if a process was run userCPUSeconds, systemCPUSeconds and maxRSSKB
+  def getCompletedProcess(self, jobExecutionObj, returncode, outputBuffer, resourceUsage):
     completed = subprocess.CompletedProcess(
       args=jobExecutionObj.jobCommand,
       returncode=returncode,
-      stdout=stdout,
-      stderr=stderr,
+      stdout=outputBuffer.getValue(),
+      stderr=None,
     )
+    completed.resourceUsage = resourceUsage # not part of CompletedProcess, read by JobExecutionClass.execute
     return completed
 
-  def getDemoteFunction(self):
+  #Filter the server enviroment down to the variables in the allow list
+  # entries ending in * match any variable starting with the rest of the entry
+  def buildBaseJobEnviroment(self, serverEnviroment, allowList):
+    if allowList is None:
+      return dict(serverEnviroment)
+    exactNames = set()
+    prefixes = []
+    for entry in allowList:
+      if entry.endswith('*'):
+        prefixes.append(entry[:-1])
+      else:
+        exactNames.add(entry)
+    ret = dict()
+    for name in serverEnviroment:
+      if name in exactNames or any(name.startswith(prefix) for prefix in prefixes):
+        ret[name] = serverEnviroment[name]
+    return ret
+
+  #Base enviroment with the jobs own variables laid over it. The DOCKJOB_ variables are added by the caller
+  def getJobEnviroment(self, jobExecutionObj):
+    job_env = dict(self.baseJobEnviroment)
+    if jobExecutionObj.jobObj.environment is not None:
+      job_env.update(jobExecutionObj.jobObj.environment)
+    return job_env
+
+  #http mode jobs are run in the worker thread without starting a process
+  def executeHTTPRequest(self, jobExecutionObj, outputBuffer, startTime):
+    try:
+      returncode = self.httpJobRunner.execute(jobExecutionObj.jobHTTPRequest, outputBuffer, self.getTimeoutForExecution(jobExecutionObj), self.maxJobOutputBytes)
+    finally:
+      outputBuffer.close()
+    return self.getCompletedProcess(jobExecutionObj, returncode, outputBuffer, {'durationSeconds': time.monotonic() - startTime})
+
+  #The spool directory is private to this user and any spool files left over from a
+  # previous run are removed as the executions they belonged to no longer exist
+  def prepareJobOutputSpoolDir(self):
+    os.makedirs(self.jobOutputSpoolDir, mode=0o700, exist_ok=True)
+    #makedirs does not change an existing directory and its mode is reduced by the umask
+    os.chmod(self.jobOutputSpoolDir, 0o700)
+    for fileName in os.listdir(self.jobOutputSpoolDir):
+      if fileName.endswith('.out'):
+        try:
+          os.remove(os.path.join(self.jobOutputSpoolDir, fileName))
+        except OSError as err:
+          print('Could not remove old output spool file ' + fileName + ' - ' + str(err))
+
+  def createOutputBuffer(self, executionGUID):
+    return ExecutionOutputClass(self.maxJobOutputBytes, os.path.join(self.jobOutputSpoolDir, executionGUID + '.out'))
+
+  #Block until the pipe is closed by the job or the deadline (time.monotonic value) is reached
+  # output is written to the buffer as it arrives so the job never blocks on a full pipe
+  def readOutputUntilClosed(self, pipe, outputBuffer, deadline):
+    with selectors.DefaultSelector() as selector:
+      selector.register(pipe, selectors.EVENT_READ)
+      while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+          break
+        if len(selector.select(remaining)) == 0:
+          continue
+        chunk = os.read(pipe.fileno(), 65536)
+        if len(chunk) == 0:
+          break
+        outputBuffer.write(chunk)
+
+  #Start the job in its own session with stdout and stderr going to a pipe
+  # commandArgs is None to run command with the shell, otherwise the program in commandArgs[0] is run directly
+  # resourceLimits are the jobs limits from JobResourceLimits (None for no limits)
+  def startJobProcess(self, command, commandArgs, job_env, resourceLimits=None):
+    if self.jobSpawner is not None:
+      return self.jobSpawner.spawn(command, commandArgs, job_env, resourceLimits)
+    if commandArgs is None:
+      proc = subprocess.Popen(command, stdin=None, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, shell=True, cwd=None, preexec_fn=self.getDemoteFunction(resourceLimits), env=job_env)
+    else:
+      proc = subprocess.Popen(commandArgs, stdin=None, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, shell=False, cwd=None, preexec_fn=self.getDemoteFunction(resourceLimits), env=job_env)
+    return PopenJobProcessClass(proc)
+
+  def stopJobSpawner(self):
+    if self.jobSpawner is not None:
+      self.jobSpawner.stop()
+
+  def getTimeoutForExecution(self, jobExecutionObj):
+    if jobExecutionObj.jobObj.timeoutSeconds is None:
+      return self.timeout
+    return jobExecutionObj.jobObj.timeoutSeconds
+
+  def getDemoteFunction(self, resourceLimits=None):
     def demote():
+      # limits are applied while still root so the io priority can always be set
+      applyResourceLimits(resourceLimits)
       # must set group first as user may not have permission to set group
       os.setgid(self.processGroupID)
       os.setuid(self.processUserID)
@@ -152,7 +456,8 @@ class JobExecutorClass(threading.Thread):
     triggerJobObj = None,
     triggerEvent = None,
     callerHasJobExecutionLock = False,
-    triggerExecutionObj = None
+    triggerExecutionObj = None,
+    schedulingDelaySeconds = None
   ):
     #print('Subbmitting new job execution name = ' + executionName)
     #manual = True when called by jobsDataAPI and False when called from scheduler
@@ -167,39 +472,189 @@ class JobExecutorClass(threading.Thread):
       triggerJobObj=triggerJobObj,
       triggerExecutionObj=triggerExecutionObj
     )
-    #lock shouldn't be needed but it is a cheap operation
+    execution.schedulingDelaySeconds = schedulingDelaySeconds
+    #Created up front so clients can wait for output from a Pending execution
+    execution.outputBuffer = self.createOutputBuffer(execution.guid)
+    #lock is required as the concurrency check must be atomic with adding the execution
     lockAquired = False
     try:
       if not callerHasJobExecutionLock:
         self.aquireJobExecutionLock()
         lockAquired = True
+      if not manual:
+        pendingExecution = self._getExecutionToCoalesceInto(jobObj)
+        if pendingExecution is not None:
+          pendingExecution.coalescedCount += 1
+          execution.removeOutput()
+          return pendingExecution
+      limitMessage = self._checkPendingLimits(jobObj)
+      if limitMessage is not None:
+        execution.removeOutput()
+        if manual:
+          #by the time a running job has finished or timed out there should be room
+          raise TooManyPendingExecutionsException(limitMessage, self.timeout)
+        self.droppedScheduledExecutions += 1
+        print('Dropping execution of ' + jobObj.name + ' - ' + limitMessage)
+        return None
+      if not self._applyConcurrencyPolicy(jobObj):
+        print('Skipping execution of ' + jobObj.name + ' - it already has ' + str(jobObj.maxConcurrentExecutions) + ' executions Pending or Running')
+        return None
       self.JobExecutions[execution.guid] = execution
+      self.activeExecutionsByJob.setdefault(jobObj.guid, []).append(execution)
+      self._addWaitingExecution(execution)
       self.totalExecutions += 1
     finally:
       if lockAquired:
         self.JobExecutionLock.release()
-    self.pendingExecutions.put(execution.guid)
+    self.queueExecution(execution)
     return execution
 
-  def deleteExecutionsForJob(self, jobGUID):
-    executionsToDelete = queue.Queue()
-    for cur in self.JobExecutions:
-      if self.JobExecutions[cur].jobGUID == jobGUID:
-        executionsToDelete.put(cur)
+  def queueExecution(self, execution):
+    if execution.pendingQueueKey is None:
+      execution.pendingQueueKey = (execution.getPriorityClass(), -execution.jobObj.priority, self.pendingExecutions.getNextSequenceNumber())
+    self.pendingExecutions.put(execution.pendingQueueKey, execution.guid)
+
+  def dequeueExecution(self, execution):
+    if execution.pendingQueueKey is not None:
+      self.pendingExecutions.remove(execution.pendingQueueKey)
+
+  def getQueuePosition(self, execution):
+    if execution.pendingQueueKey is None:
+      return None
+    return self.pendingExecutions.getPosition(execution.pendingQueueKey)
 
-    while not executionsToDelete.empty():
-      toDel = executionsToDelete.get()
-      self.deleteExecution(self.JobExecutions[toDel].guid)
+  #Called with lock held. Returns the Pending execution a new scheduled or event run should be merged into
+  def _getExecutionToCoalesceInto(self, jobObj):
+    if not jobObj.coalescePendingExecutions:
+      return None
+    for curExecution in self.activeExecutionsByJob.get(jobObj.guid, []):
+      if curExecution.stage == 'Pending':
+        return curExecution
+    return None
+
+  #Called with lock held. Returns None if another execution of the job can wait to run, otherwise the reason it can't
+  def _checkPendingLimits(self, jobObj):
+    if self.waitingExecutionCount >= self.maxPendingExecutions:
+      return 'there are already ' + str(self.waitingExecutionCount) + ' executions waiting to run'
+    waitingForJob = len(self.waitingExecutionsByJob.get(jobObj.guid, ()))
+    if waitingForJob >= self.maxPendingExecutionsPerJob:
+      return 'job ' + jobObj.name + ' already has ' + str(waitingForJob) + ' executions waiting to run'
+    return None
+
+  #Called with lock held. Executions count towards the pending limits from when they are created until a worker starts them
+  def _addWaitingExecution(self, execution):
+    self.waitingExecutionsByJob.setdefault(execution.jobGUID, set()).add(execution.guid)
+    self.waitingExecutionCount += 1
+
+  #Called with lock held. Safe to call more than once for an execution
+  def _removeWaitingExecution(self, execution):
+    waiting = self.waitingExecutionsByJob.get(execution.jobGUID, None)
+    if waiting is None or execution.guid not in waiting:
+      return
+    waiting.remove(execution.guid)
+    if len(waiting) == 0:
+      del self.waitingExecutionsByJob[execution.jobGUID]
+    self.waitingExecutionCount -= 1
+
+  #Called with lock held once an execution has its dateCompleted
+  def _addToRetentionIndex(self, execution):
+    key = (from_iso8601(execution.dateCompleted), execution.guid)
+    self.retentionIndex[key] = execution.guid
+    self.retentionIndexKeys[execution.guid] = key
+
+  #Called with lock held
+  def _removeFromRetentionIndex(self, execution):
+    key = self.retentionIndexKeys.pop(execution.guid, None)
+    if key is not None:
+      del self.retentionIndex[key]
+
+  #Called with lock held. Returns False if the new execution should not be created
+  def _applyConcurrencyPolicy(self, jobObj):
+    if jobObj.maxConcurrentExecutions is None:
+      return True
+    activeExecutions = self.activeExecutionsByJob.get(jobObj.guid, [])
+    if len(activeExecutions) < jobObj.maxConcurrentExecutions:
+      return True
+    if jobObj.concurrencyPolicy == 'Skip':
+      return False
+    if jobObj.concurrencyPolicy == 'Replace':
+      for curExecution in list(activeExecutions):
+        if curExecution.stage == 'Pending':
+          curExecution.markReplaced(self.appObj.getCurDateTime())
+          self._addToRetentionIndex(curExecution)
+          activeExecutions.remove(curExecution)
+          self.dequeueExecution(curExecution)
+          self._removeWaitingExecution(curExecution)
+    #Queue - execution is created and will wait for a running execution to finish
+    return True
+
+  #Called with lock held. Returns False if the job already has maxConcurrentExecutions running
+  # in which case the execution is deferred until one finishes
+  def _claimExecution(self, jobExecutionObj):
+    jobObj = jobExecutionObj.jobObj
+    runningCount = self.runningCountByJob.get(jobObj.guid, 0)
+    if jobObj.maxConcurrentExecutions is not None:
+      if runningCount >= jobObj.maxConcurrentExecutions:
+        self.deferredExecutionsByJob.setdefault(jobObj.guid, collections.deque()).append(jobExecutionObj.guid)
+        return False
+    self.runningCountByJob[jobObj.guid] = runningCount + 1
+    return True
+
+  #Called with lock held when an execution finishes
+  def _releaseExecution(self, jobExecutionObj):
+    jobGUID = jobExecutionObj.jobGUID
+    runningCount = self.runningCountByJob.get(jobGUID, 1) - 1
+    if runningCount > 0:
+      self.runningCountByJob[jobGUID] = runningCount
+    else:
+      self.runningCountByJob.pop(jobGUID, None) # no entry is left behind for jobs with nothing running
+    activeExecutions = self.activeExecutionsByJob.get(jobGUID, [])
+    if jobExecutionObj in activeExecutions:
+      activeExecutions.remove(jobExecutionObj)
+    deferred = self.deferredExecutionsByJob.get(jobGUID, None)
+    while deferred:
+      nextExecution = self.JobExecutions.get(deferred.popleft(), None)
+      if nextExecution is not None:
+        if nextExecution.stage == 'Pending':
+          #keeps the key it was first queued with so it isn't overtaken by later executions
+          self.queueExecution(nextExecution)
+          break
 
+  def deleteExecutionsForJob(self, jobGUID):
+    try:
+      self.aquireJobExecutionLock()
+      executionsToDelete = [cur for cur in self.JobExecutions if self.JobExecutions[cur].jobGUID == jobGUID]
+      for toDel in executionsToDelete:
+        self._deleteExecution(toDel)
+      #nothing is tracked for a deleted job, executions of it still running release nothing when they finish
+      self.activeExecutionsByJob.pop(jobGUID, None)
+      self.runningCountByJob.pop(jobGUID, None)
+      self.deferredExecutionsByJob.pop(jobGUID, None)
+      waiting = self.waitingExecutionsByJob.pop(jobGUID, None)
+      if waiting is not None:
+        self.waitingExecutionCount -= len(waiting)
+    finally:
+      self.JobExecutionLock.release()
 
   def deleteExecution(self, executionGUID):
    try:
      self.aquireJobExecutionLock()
+     self._deleteExecution(executionGUID)
+   finally:
+     self.JobExecutionLock.release()
+
+  #Called with lock held
+  def _deleteExecution(self, executionGUID):
      tmpVar = self.JobExecutions.pop(executionGUID)
      if tmpVar is None:
        raise Execption('Failed to delete a job execution - could not get it out of the job name lookup')
-   finally:
-     self.JobExecutionLock.release()
+     activeExecutions = self.activeExecutionsByJob.get(tmpVar.jobGUID, [])
+     if tmpVar in activeExecutions:
+       activeExecutions.remove(tmpVar)
+     self.dequeueExecution(tmpVar)
+     self._removeWaitingExecution(tmpVar)
+     self._removeFromRetentionIndex(tmpVar)
+     tmpVar.removeOutput()
 
   #return current data for a job execution
   def getJobExecutionStatus(self, jobGUID):
@@ -224,63 +679,116 @@ class JobExecutorClass(threading.Thread):
       self.JobExecutionLock.release()
     return output
 
-  def loopIteration(self, curDatetime):
-    #Run next pending job only the next one, other jobs are run on subsequent loop iterations
-    # this will block this thread until the execution is complete
-    if not self.pendingExecutions.empty():
-      executionGUID = self.pendingExecutions.get()
-      jobExecutionObj = None
+  #Run a single execution. Called by worker threads or directly from the loop when there are no workers
+  def executeExecution(self, executionGUID, curDatetime):
+    jobExecutionObj = None
+    try:
+      self.aquireJobExecutionLock()
       try:
         jobExecutionObj = self.JobExecutions[executionGUID]
       except KeyError:
         jobExecutionObj = None # if we get a key error it just means this job was deleted while it had a pending execution
-      if jobExecutionObj is not None:
-        print(curDatetime.isoformat() + ' Executing (Execution name = ' + jobExecutionObj.executionName + ')')
-        jobExecutionObj.execute(
-          self.appObj.jobExecutor, 
-          self.aquireJobExecutionLock, 
-          self.releaseJobExecutionLock,
-          self.appObj.appData['jobsData'].registerRunDetails,
-          self.appObj #Passing in so execution time stamps are simulated in testing
-        )
-
-    #schedule any new jobs that are due to be automatically run
+      if jobExecutionObj is None:
+        return
+      if jobExecutionObj.stage != 'Pending':
+        return # replaced by a newer execution while waiting
+      if not self._claimExecution(jobExecutionObj):
+        return
+      self._removeWaitingExecution(jobExecutionObj)
+    finally:
+      self.JobExecutionLock.release()
+    print(curDatetime.isoformat() + ' Executing (Execution name = ' + jobExecutionObj.executionName + ')')
+    try:
+      jobExecutionObj.execute(
+        self.appObj.jobExecutor,
+        self.aquireJobExecutionLock,
+        self.releaseJobExecutionLock,
+        self.appObj.appData['jobsData'].registerRunDetails,
+        self.appObj #Passing in so execution time stamps are simulated in testing
+      )
+    finally:
+      try:
+        self.aquireJobExecutionLock()
+        self._releaseExecution(jobExecutionObj)
+        #it is not retained if it was deleted while it ran
+        if jobExecutionObj.dateCompleted is not None and jobExecutionObj.guid in self.JobExecutions:
+          self._addToRetentionIndex(jobExecutionObj)
+      finally:
+        self.JobExecutionLock.release()
+
+  #Submit the due runs of a job. Runs later than the misfire threshold are handled by the jobs misfirePolicy
+  def submitScheduledRuns(self, jobObj, curDatetime):
+    scheduledTime = from_iso8601(jobObj.nextScheduledRun)
+    delaySeconds = (curDatetime - scheduledTime).total_seconds()
+    if delaySeconds <= self.misfireThresholdSeconds or jobObj.misfirePolicy == 'RunOnce':
+      self.submitJobForExecution(jobObj.guid, '', False, schedulingDelaySeconds=delaySeconds)
+      return
+    if jobObj.misfirePolicy == 'Skip':
+      print('Skipping scheduled run of ' + jobObj.name + ' - it is ' + str(int(delaySeconds)) + ' seconds late')
+      return
+    #RunAll
+    for runTime in jobObj.getScheduledRunsBetween(scheduledTime, curDatetime, jobObj.misfireMaxRuns):
+      self.submitJobForExecution(jobObj.guid, '', False, schedulingDelaySeconds=(curDatetime - runTime).total_seconds())
+
+  #Remove executions that completed more than executionRetention ago
+  def purgeExecutions(self, curDatetime):
+    if not self._isPurgeDue(curDatetime):
+      return
+    self.lastPurgeTime = curDatetime
+    timeToPurgeBefore = curDatetime - self.executionRetention
+    while True:
+      purged = []
+      try:
+        self.aquireJobExecutionLock()
+        while len(purged) < self.purgeBatchSize and len(self.retentionIndex) > 0:
+          (key, executionGUID) = self.retentionIndex.peekitem(0)
+          if key[0] >= timeToPurgeBefore:
+            break
+          self.retentionIndex.popitem(0)
+          self.retentionIndexKeys.pop(executionGUID, None)
+          execution = self.JobExecutions.pop(executionGUID, None)
+          if execution is not None: # already gone if it was deleted
+            purged.append(execution)
+      finally:
+        self.JobExecutionLock.release()
+      for execution in purged:
+        print('Purging Execution ' + execution.executionName + ' - date completed ' + execution.dateCompleted)
+        execution.removeOutput()
+      if len(purged) < self.purgeBatchSize:
+        return
+
+  #Purging runs at most once every executionPurgeInterval (or if the clock has gone backwards)
+  def _isPurgeDue(self, curDatetime):
+    if self.lastPurgeTime is None or curDatetime < self.lastPurgeTime:
+      return True
+    return curDatetime >= self.lastPurgeTime + self.executionPurgeInterval
+
+  def loopIteration(self, curDatetime):
+    #When worker threads are running they pick up pending executions
+    # if there are none (testing mode) run the next pending job only, other jobs are run on subsequent loop iterations
+    # this will block this thread until the execution is complete
+    if len(self.workers) == 0:
+      if not self.pendingExecutions.empty():
+        self.executeExecution(self.pendingExecutions.get(), curDatetime)
+
+    #schedule all the jobs that are due to be automatically run
     #  no lock acquire required here as it is inside submitJobForExecution
-    nextJob = self.appObj.appData['jobsData'].getNextJobToExecute()
-    if nextJob is not None:
-      if curDatetime.isoformat() > nextJob.nextScheduledRun:
-        # print('Submitting job ' + nextJob.name + ' for scheduled execution')
-        self.submitJobForExecution(nextJob.guid, '', False)
-        nextJob.setNextScheduledRun(curDatetime)
-        self.appObj.appData['jobsData'].nextJobToExecuteCalcRequired = True
-
-    #purge old runs from list
-    timeToPurgeBefore = curDatetime - datetime.timedelta(days=7)
-    toPurge = queue.Queue()
+    jobsData = self.appObj.appData['jobsData']
+    for dueJob in jobsData.getDueJobs(curDatetime):
+      # print('Submitting job ' + dueJob.name + ' for scheduled execution')
+      self.submitScheduledRuns(dueJob, curDatetime)
+      dueJob.anchorScheduleOnNextScheduledRun()
+      jobsData.setNextScheduledRun(dueJob, curDatetime)
+
+    self.purgeExecutions(curDatetime)
+
+    #Status changes can trigger new executions so the lock is held in the same way as when a run is registered
     try:
       self.aquireJobExecutionLock()
-      for curJobExecution in self.JobExecutions:
-        if self.JobExecutions[curJobExecution].dateCompleted is not None:
-          try:
-            tim = from_iso8601(self.JobExecutions[curJobExecution].dateCompleted)
-          except:
-            print('Error converting dateCompleted value: ' + self.JobExecutions[curJobExecution].dateCompleted)
-            print('Job execution: ' + self.JobExecutions[curJobExecution].guid)
-            raise
-          if tim < timeToPurgeBefore:
-            print('Purging Execution ' + self.JobExecutions[curJobExecution].executionName)
-            print(' - date completed ' + self.JobExecutions[curJobExecution].dateCompleted)
-            print(' - time to purge before (7 days before current) ' + str(timeToPurgeBefore))
-            toPurge.put(curJobExecution)
-      while not toPurge.empty():
-        toDel = toPurge.get()
-        self.JobExecutions.pop(toDel)
-
+      self.appObj.appData['jobsData'].loopIteration(self.appObj, curDatetime)
     finally:
       self.JobExecutionLock.release()
 
-    self.appObj.appData['jobsData'].loopIteration(self.appObj, curDatetime)
-
 
 
   #main loop of thread
@@ -288,13 +796,82 @@ class JobExecutorClass(threading.Thread):
   def run(self):
     self.running = True
     print('Job runner thread starting')
+    self.startWorkers()
     while self.running:
-      curDatetime = datetime.datetime.now(pytz.utc)
-      self.loopIteration(curDatetime)
-      time.sleep(0.2)
+      try:
+        curDatetime = datetime.datetime.now(pytz.utc)
+        self.loopIteration(curDatetime)
+        #time is taken again as the loop iteration may have taken a while
+        secondsUntilNextEvent = self.getSecondsUntilNextEvent(datetime.datetime.now(pytz.utc))
+      except Exception:
+        #this is the only thread scheduling jobs so a failed iteration (e.g. the execution lock was busy) must not end it
+        print('Job runner loop iteration failed')
+        traceback.print_exc()
+        secondsUntilNextEvent = self.failedIterationRetrySeconds
+      self.waitForNextEvent(secondsUntilNextEvent)
+    self.stopWorkers()
     print('Job runner thread terminating')
 
+  #Seconds until a job is next due, a job status next becomes Unknown or an execution is next purged
+  def getSecondsUntilNextEvent(self, curDatetime):
+    nextEventTimes = []
+    jobsData = self.appObj.appData['jobsData']
+    nextJob = jobsData.getNextJobToExecute()
+    if nextJob is not None:
+      nextEventTimes.append(from_iso8601(nextJob.nextScheduledRun))
+    nextExpiry = jobsData.getNextCompletionStatusExpiry()
+    if nextExpiry is not None:
+      nextEventTimes.append(nextExpiry)
+    nextPurge = self.getNextPurgeTime()
+    if nextPurge is not None:
+      nextEventTimes.append(nextPurge)
+    seconds = self.maxLoopSleepSeconds
+    for eventTime in nextEventTimes:
+      #events happen once the time has passed so wake just after
+      seconds = min(seconds, (eventTime - curDatetime).total_seconds() + 0.001)
+    return max(seconds, 0)
+
+  #Time the oldest completed execution will be purged or None if there are no completed executions
+  def getNextPurgeTime(self):
+    try:
+      self.aquireJobExecutionLock()
+      if len(self.retentionIndex) == 0:
+        return None
+      nextPurgeTime = self.retentionIndex.peekitem(0)[0][0] + self.executionRetention
+    finally:
+      self.JobExecutionLock.release()
+    if self.lastPurgeTime is not None:
+      nextPurgeTime = max(nextPurgeTime, self.lastPurgeTime + self.executionPurgeInterval)
+    return nextPurgeTime
+
+  #Block the main loop until timeout seconds pass or wakeScheduler is called
+  def waitForNextEvent(self, timeout):
+    with self.wakeCondition:
+      self.wakeCondition.wait_for(lambda: self.wakeRequested or not self.running, timeout)
+      self.wakeRequested = False
+
+  #Called when something changes that may mean the main loop has something to do sooner
+  def wakeScheduler(self):
+    with self.wakeCondition:
+      self.wakeRequested = True
+      self.wakeCondition.notify()
+
+  def startWorkers(self):
+    for workerNumber in range(0, self.maxConcurrentJobs):
+      worker = JobExecutorWorkerClass(self, workerNumber)
+      worker.start()
+      self.workers.append(worker)
+
+  #Workers finish the execution they are running before they stop
+  def stopWorkers(self):
+    for worker in self.workers:
+      self.pendingExecutions.put((stopWorkerPriorityClass, 0, self.pendingExecutions.getNextSequenceNumber()), None)
+    for worker in self.workers:
+      worker.join()
+    self.workers = []
+
   def stopThreadRunning(self):
     self.running = False
+    self.wakeScheduler()
     #not sleeping here in case appObj has other threads to stop. (Should stop them all then wait once)
     #time.sleep(0.3) #give thread a chance to stop
@@ -0,0 +1,113 @@
+# JobResourceLimits limits what a single job process can use so a runaway job can't
+#  starve the API or the other jobs sharing the container.
+#  Limits are applied in the job process after fork and before exec (by the demote function
+#  or by the job spawner) so they cover the job and anything it starts but never the server.
+#
+#  resourceLimits is an object with any of:
+#    cpuSeconds - RLIMIT_CPU. SIGXCPU is sent when it is reached and SIGKILL a second later
+#    addressSpaceMB - RLIMIT_AS
+#    openFiles - RLIMIT_NOFILE
+#    nice - 0 to 19, jobs can only be made lower priority than the server
+#    ioClass - best-effort or idle
+#    ioLevel - 0 (highest) to 7, only for best-effort
+import os
+import resource
+import ctypes
+import platform
+
+rlimitsByKey = {
+  'cpuSeconds': resource.RLIMIT_CPU,
+  'addressSpaceMB': resource.RLIMIT_AS,
+  'openFiles': resource.RLIMIT_NOFILE,
+}
+
+#realtime is not offered as it could starve the server
+ioPriorityClasses = {
+  'best-effort': 2,
+  'idle': 3,
+}
+defaultBestEffortIOLevel = 4 # what the kernel uses for processes with a nice level of 0
+
+#ioprio_set has no wrapper in libc or the os module so it is called with syscall(2)
+ioprioSetSyscallNumbers = {
+  'x86_64': 251,
+  'aarch64': 30,
+  'i386': 289,
+  'i686': 289,
+  'armv7l': 314,
+  'ppc64le': 273,
+  's390x': 282,
+}
+IOPRIO_WHO_PROCESS = 1
+IOPRIO_CLASS_SHIFT = 13
+
+ioprioSetSyscallNumber = ioprioSetSyscallNumbers.get(platform.machine(), None)
+#loaded up front, not in the forked child
+libc = ctypes.CDLL(None, use_errno=True)
+
+def _isInt(value):
+  return isinstance(value, int) and not isinstance(value, bool)
+
+#Check the resourceLimits of a job. Returns None if no limits are set. Raises ValueError if they are not valid
+def normaliseResourceLimits(resourceLimits):
+  if resourceLimits is None:
+    return None
+  if not isinstance(resourceLimits, dict):
+    raise ValueError('resourceLimits must be an object')
+  validKeys = list(rlimitsByKey.keys()) + ['nice', 'ioClass', 'ioLevel']
+  ret = dict()
+  for key in resourceLimits:
+    if key not in validKeys:
+      raise ValueError('Unknown resource limit ' + key + ' (must be one of ' + ','.join(validKeys) + ')')
+    if resourceLimits[key] is not None:
+      ret[key] = resourceLimits[key]
+  for key in rlimitsByKey:
+    if key in ret:
+      if not _isInt(ret[key]) or ret[key] < 1:
+        raise ValueError('resourceLimits ' + key + ' must be a positive integer')
+  if 'nice' in ret:
+    if not _isInt(ret['nice']) or ret['nice'] < 0 or ret['nice'] > 19:
+      raise ValueError('resourceLimits nice must be an integer between 0 and 19')
+  if 'ioLevel' in ret and 'ioClass' not in ret:
+    ret['ioClass'] = 'best-effort'
+  if 'ioClass' in ret:
+    if ret['ioClass'] not in ioPriorityClasses:
+      raise ValueError('resourceLimits ioClass must be one of ' + ','.join(ioPriorityClasses.keys()))
+    if ioprioSetSyscallNumber is None:
+      raise ValueError('resourceLimits ioClass is not supported on ' + platform.machine())
+    if ret['ioClass'] == 'best-effort':
+      if 'ioLevel' not in ret:
+        ret['ioLevel'] = defaultBestEffortIOLevel
+      if not _isInt(ret['ioLevel']) or ret['ioLevel'] < 0 or ret['ioLevel'] > 7:
+        raise ValueError('resourceLimits ioLevel must be an integer between 0 and 7')
+    elif 'ioLevel' in ret:
+      raise ValueError('resourceLimits ioLevel can only be set for the best-effort ioClass')
+  if len(ret) == 0:
+    return None
+  return ret
+
+#Called in the job process before exec. resourceLimits must have been through normaliseResourceLimits
+def applyResourceLimits(resourceLimits):
+  if resourceLimits is None:
+    return
+  for key in rlimitsByKey:
+    if key not in resourceLimits:
+      continue
+    soft = resourceLimits[key]
+    if key == 'addressSpaceMB':
+      soft = soft * 1024 * 1024
+    hard = soft
+    if key == 'cpuSeconds':
+      hard = soft + 1 # gives the job a chance to handle SIGXCPU
+    (unused, currentHard) = resource.getrlimit(rlimitsByKey[key])
+    if currentHard != resource.RLIM_INFINITY:
+      soft = min(soft, currentHard)
+      hard = min(hard, currentHard)
+    resource.setrlimit(rlimitsByKey[key], (soft, hard))
+  if 'nice' in resourceLimits:
+    os.setpriority(os.PRIO_PROCESS, 0, max(resourceLimits['nice'], os.getpriority(os.PRIO_PROCESS, 0)))
+  if 'ioClass' in resourceLimits:
+    ioPriority = (ioPriorityClasses[resourceLimits['ioClass']] << IOPRIO_CLASS_SHIFT) | resourceLimits.get('ioLevel', 0)
+    if libc.syscall(ioprioSetSyscallNumber, IOPRIO_WHO_PROCESS, 0, ioPriority) != 0:
+      errno = ctypes.get_errno()
+      raise OSError(errno, 'ioprio_set failed - ' + os.strerror(errno))
@@ -0,0 +1,313 @@
+# JobSpawner starts job processes
+#  Forking the server process to start every job is slow when the server is large and
+#  the preexec_fn used to demote the job runs python code between fork and exec.
+#  When enabled a small helper process is started once, already running as the job
+#  user, and the executor asks it to start each job over a unix socket.
+#
+#  Protocol: for each job the executor sends the write end of the job's output pipe
+#  and one end of a new socket pair over the control socket. The rest of the
+#  conversation for that job happens on the new socket as lines of JSON:
+#    executor -> spawner {"command": ..., "args": [...] or null, "env": {...}, "resourceLimits": {...} or null}
+#    spawner -> executor {"pid": ...} or {"error": ...}
+#    executor -> spawner {"signal": ...} (any number of times until it sends reap)
+#    spawner -> executor {"exited": true} once the job has exited. It is not reaped yet
+#    executor -> spawner {"reap": true} once the executor will send no more signals
+#    spawner -> executor {"returncode": ..., "resourceUsage": {...}} once the job has been reaped
+#  As with jobs started directly the job is left unreaped until signalling is finished so its process group
+#  can still be signalled (e.g. to kill children left running by a timed out job) and its pid can't be reused
+import os
+import sys
+import json
+import array
+import socket
+import threading
+import subprocess
+import shutil
+from JobResourceLimits import applyResourceLimits
+
+#Return code in the same form as Popen, negative signal number if the process was killed by a signal
+def getReturnCodeFromWaitStatus(status):
+  if os.WIFSIGNALED(status):
+    return -os.WTERMSIG(status)
+  return os.WEXITSTATUS(status)
+
+#Resource usage of a reaped job. Includes any of its children it waited for
+def getResourceUsageDict(rusage):
+  return {
+    'userCPUSeconds': rusage.ru_utime,
+    'systemCPUSeconds': rusage.ru_stime,
+    'maxRSSKB': rusage.ru_maxrss,
+  }
+
+#Processes started directly by the executor with subprocess
+class PopenJobProcessClass():
+  proc = None
+  pid = None
+  stdout = None
+  resourceUsage = None # set by reap
+
+  def __init__(self, proc):
+    self.proc = proc
+    self.pid = proc.pid
+    self.stdout = proc.stdout
+
+  #Jobs are started in their own session so the process group id is the pid
+  def sendSignal(self, sig):
+    try:
+      os.killpg(self.pid, sig)
+    except ProcessLookupError:
+      pass # process has already finished
+
+  #wait for exit without reaping so the process group can't be reused while it may still be signalled
+  def waitForExit(self):
+    os.waitid(os.P_PID, self.pid, os.WEXITED | os.WNOWAIT)
+
+  #wait4 rather than proc.wait so the resource usage of the job is available
+  def reap(self):
+    (unused, status, rusage) = os.wait4(self.pid, 0)
+    self.proc.returncode = getReturnCodeFromWaitStatus(status) # stops Popen trying to reap it again
+    self.resourceUsage = getResourceUsageDict(rusage)
+    return self.proc.returncode
+
+#Processes started by the spawner helper process
+class SpawnedJobProcessClass():
+  channel = None
+  reader = None
+  pid = None
+  stdout = None
+  returncode = None
+  resourceUsage = None # set by waitForExit
+
+  def __init__(self, channel, reader, pid, stdout):
+    self.channel = channel
+    self.reader = reader
+    self.pid = pid
+    self.stdout = stdout
+    self.returncode = None
+
+  def sendSignal(self, sig):
+    try:
+      self.channel.sendall(_encodeMessage({'signal': int(sig)}))
+    except OSError:
+      pass # job has finished and the spawner has closed the channel
+
+  def waitForExit(self):
+    message = _readMessage(self.reader)
+    if message is None:
+      raise OSError('Job spawner exited while job ' + str(self.pid) + ' was running')
+
+  def reap(self):
+    try:
+      self.channel.sendall(_encodeMessage({'reap': True}))
+      message = _readMessage(self.reader)
+      if message is None:
+        raise OSError('Job spawner exited before job ' + str(self.pid) + ' was reaped')
+      self.returncode = message['returncode']
+      self.resourceUsage = message['resourceUsage']
+    finally:
+      self.reader.close()
+      self.channel.close()
+    return self.returncode
+
+#Used by the executor to talk to the spawner process
+class JobSpawnerClass():
+  demoteFunction = None
+  process = None
+  controlSocket = None
+  lock = None # covers sending on the control socket and restarting the spawner
+
+  def __init__(self, demoteFunction):
+    self.demoteFunction = demoteFunction
+    self.process = None
+    self.controlSocket = None
+    self.lock = threading.Lock()
+
+  def start(self):
+    with self.lock:
+      self._start()
+
+  def _start(self):
+    (self.controlSocket, spawnerSocket) = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+      self.process = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), str(spawnerSocket.fileno())],
+        stdin=subprocess.DEVNULL,
+        pass_fds=[spawnerSocket.fileno()],
+        preexec_fn=self.demoteFunction
+      )
+    finally:
+      spawnerSocket.close()
+    print('Started job spawner process (pid ' + str(self.process.pid) + ')')
+
+  #The spawner exits when the control socket is closed
+  def stop(self):
+    with self.lock:
+      if self.controlSocket is None:
+        return
+      self.controlSocket.close()
+      self.controlSocket = None
+      try:
+        self.process.wait(timeout=5)
+      except subprocess.TimeoutExpired:
+        self.process.kill()
+        self.process.wait()
+      self.process = None
+
+  def _sendFds(self, fds):
+    self.controlSocket.sendmsg([b'S'], [(socket.SOL_SOCKET, socket.SCM_RIGHTS, array.array('i', fds))])
+
+  #Start command as a job. stdout of the returned process is the read end of the jobs output pipe
+  # if args is not None the program in args[0] is run directly instead of running command with the shell
+  def spawn(self, command, args, env, resourceLimits=None):
+    (outputReadFd, outputWriteFd) = os.pipe()
+    (channel, spawnerChannel) = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+      with self.lock:
+        if self.controlSocket is None:
+          raise OSError('Job spawner is not running')
+        try:
+          self._sendFds([outputWriteFd, spawnerChannel.fileno()])
+        except OSError as err:
+          print('Job spawner has stopped (' + str(err) + ') - restarting it')
+          self.controlSocket.close()
+          self.process.wait()
+          self._start()
+          self._sendFds([outputWriteFd, spawnerChannel.fileno()])
+    except Exception:
+      os.close(outputReadFd)
+      channel.close()
+      raise
+    finally:
+      #only the job should hold the write end, otherwise end of file is never seen
+      os.close(outputWriteFd)
+      spawnerChannel.close()
+    reader = channel.makefile('rb')
+    try:
+      channel.sendall(_encodeMessage({'command': command, 'args': args, 'env': env, 'resourceLimits': resourceLimits}))
+      message = _readMessage(reader)
+    except OSError:
+      message = None
+    if message is None or 'pid' not in message:
+      os.close(outputReadFd)
+      reader.close()
+      channel.close()
+      if message is None:
+        raise OSError('Job spawner did not start job')
+      raise OSError('Job spawner failed to start job - ' + message['error'])
+    return SpawnedJobProcessClass(channel, reader, message['pid'], os.fdopen(outputReadFd, 'rb', buffering=0))
+
+def _encodeMessage(message):
+  return json.dumps(message).encode() + b'\n'
+
+#Returns None at end of file
+def _readMessage(reader):
+  line = reader.readline()
+  if len(line) == 0:
+    return None
+  return json.loads(line.decode())
+
+#Code below here runs in the spawner process
+
+def _spawnJobProcess(command, args, env, resourceLimits, stdoutFd):
+  if args is None:
+    args = ['/bin/sh', '-c', command]
+  if resourceLimits is None and sys.version_info >= (3, 8):
+    #search the jobs PATH, not the spawners, the same way Popen does
+    program = args[0]
+    if os.path.dirname(program) == '':
+      program = shutil.which(program, path=env.get('PATH', os.defpath))
+      if program is None:
+        raise FileNotFoundError('No such file or directory: ' + args[0])
+    return os.posix_spawn(program, args, env, file_actions=[
+      (os.POSIX_SPAWN_OPEN, 0, os.devnull, os.O_RDONLY, 0),
+      (os.POSIX_SPAWN_DUP2, stdoutFd, 1),
+      (os.POSIX_SPAWN_DUP2, stdoutFd, 2),
+    ], setsid=True)
+  #older pythons have no posix_spawn with setsid. Popen without preexec_fn is still a plain fork and exec
+  # posix_spawn has no way to set limits in the child so jobs with limits need the preexec_fn
+  preexecFunction = None
+  if resourceLimits is not None:
+    preexecFunction = lambda: applyResourceLimits(resourceLimits)
+  proc = subprocess.Popen(args, stdin=subprocess.DEVNULL, stdout=stdoutFd, stderr=stdoutFd, env=env, start_new_session=True, preexec_fn=preexecFunction)
+  proc.returncode = 0 # reaped by _handleSpawnRequest, this stops Popen trying to reap it as well
+  return proc.pid
+
+def _handleSpawnRequest(stdoutFd, channelFd):
+  channel = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM, fileno=channelFd)
+  reader = channel.makefile('rb')
+  try:
+    try:
+      request = _readMessage(reader)
+      if request is None:
+        return
+      pid = _spawnJobProcess(request['command'], request['args'], request['env'], request.get('resourceLimits', None), stdoutFd)
+    except Exception as err:
+      channel.sendall(_encodeMessage({'error': str(err)}))
+      return
+    finally:
+      os.close(stdoutFd)
+    channel.sendall(_encodeMessage({'pid': pid}))
+
+    def waitForJob():
+      os.waitid(os.P_PID, pid, os.WEXITED | os.WNOWAIT)
+      try:
+        channel.sendall(_encodeMessage({'exited': True}))
+      except OSError:
+        pass # executor is no longer listening
+    waiter = threading.Thread(target=waitForJob)
+    waiter.daemon = True
+    waiter.start()
+
+    #signals and the reap are both handled in this thread so a signal is never sent after the job is reaped
+    reapMessage = None
+    while True:
+      request = _readMessage(reader)
+      if request is None:
+        break # executor has gone, the job is still reaped below
+      if 'signal' in request:
+        try:
+          os.killpg(pid, request['signal'])
+        except ProcessLookupError:
+          pass
+      if 'reap' in request:
+        reapMessage = request
+        break
+    waiter.join()
+    (unused, status, rusage) = os.wait4(pid, 0)
+    if reapMessage is not None:
+      try:
+        channel.sendall(_encodeMessage({'returncode': getReturnCodeFromWaitStatus(status), 'resourceUsage': getResourceUsageDict(rusage)}))
+      except OSError:
+        pass
+  finally:
+    reader.close()
+    channel.close()
+
+def _receiveFds(controlSocket):
+  fds = array.array('i')
+  (msg, ancdata, flags, addr) = controlSocket.recvmsg(1, socket.CMSG_SPACE(2 * fds.itemsize), socket.MSG_CMSG_CLOEXEC)
+  if len(msg) == 0:
+    return None
+  for (level, msgType, data) in ancdata:
+    if level == socket.SOL_SOCKET and msgType == socket.SCM_RIGHTS:
+      fds.frombytes(data[:len(data) - (len(data) % fds.itemsize)])
+  return list(fds)
+
+def runSpawner(controlFd):
+  #pass_fds made the control socket inheritable, it must not leak into jobs
+  os.set_inheritable(controlFd, False)
+  controlSocket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM, fileno=controlFd)
+  while True:
+    fds = _receiveFds(controlSocket)
+    if fds is None:
+      break # executor has closed the control socket
+    if len(fds) != 2:
+      for fd in fds:
+        os.close(fd)
+      continue
+    handler = threading.Thread(target=_handleSpawnRequest, args=fds)
+    handler.daemon = True
+    handler.start()
+
+if __name__ == '__main__':
+  runSpawner(int(sys.argv[1]))
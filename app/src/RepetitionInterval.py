@@ -2,6 +2,9 @@ from enum import Enum
 import datetime
 from datetime import timedelta
 import pytz
+import threading
+import calendar
+from bisect import bisect_left
 from sortedcontainers import SortedDict
 
 badModeException = Exception('Bad Mode')
@@ -12,15 +15,20 @@ missingTimezoneException = Exception('datetime objects passed must be timezone a
 curDateTimeTimezoneNotUTCException = Exception('Current Date/Time passed is not UTC')
 
 class ModeType(Enum):
-  HOURLY = 1 #Single paramater which is the minute past the error
+  HOURLY = 1 #Single paramater which is the minute past the error, optional second paramater is seconds past the minute ("HOURLY:03:30")
   DAILY = 2  #three params, minute, hour, days (+-+-+-- Each char represents DOW mon-sun + means include day, - do not), final paramater is the timezone the passed in date is
   MONTHLY = 3	#Same hour and minute each day of the month (24 hour clock)	"MONTHLY:39:13:3" = Run at 1:39pm each 3rd of month, final paramater is the timezone the passed in date is
   # params are always minute:hour:day
+  CRON = 4 #two params, a 5 field cron expression (minute hour day-of-month month day-of-week) and the timezone it is in
+  # "CRON:*/5 8-18 * * MON-FRI:Europe/London" = every 5 minutes from 8:00 to 18:55 on weekdays
+  # a 6th field at the start of the expression gives seconds, "CRON:*/15 * * * * *:UTC" = every 15 seconds
+  EVERY = 5 #Single paramater, a fixed period in seconds. Runs are the period apart from an anchor time passed in (e.g. the jobs last scheduled run)
 
-  #                       | HOURLY  | DAILY  | MONTHLY |
-  # Has Day of month      |   no    |   no   |   yes   |
-  # Has Days of week      |   no    |   yes  |   no    |
-  # Cares about timezone  |   no    |   yes  |   yes   |
+  #                       | HOURLY  | DAILY  | MONTHLY | CRON | EVERY |
+  # Has Day of month      |   no    |   no   |   yes   |  yes |   no  |
+  # Has Days of week      |   no    |   yes  |   no    |  yes |   no  |
+  # Cares about timezone  |   no    |   yes  |   yes   |  yes |   no  |
+  # Has seconds           |   yes   |   no   |   no    |  yes |  yes  |
 
   def getExpectedNumParams(self):
     if (self == ModeType.HOURLY):
@@ -29,8 +37,151 @@ class ModeType(Enum):
       return 4
     if (self == ModeType.MONTHLY):
       return 4
+    if (self == ModeType.CRON):
+      return 2
+    if (self == ModeType.EVERY):
+      return 1
     return -1
 
+#Range of values and names allowed in each cron field
+cronSecondField = ('second', 0, 59, None) # only when the expression has 6 fields
+cronFields = [
+  ('minute', 0, 59, None),
+  ('hour', 0, 23, None),
+  ('dayOfMonth', 1, 31, None),
+  ('month', 1, 12, ['JAN','FEB','MAR','APR','MAY','JUN','JUL','AUG','SEP','OCT','NOV','DEC']),
+  ('dayOfWeek', 0, 7, ['SUN','MON','TUE','WED','THU','FRI','SAT']), # 0 and 7 are both Sunday
+]
+
+#A cron expression compiled into one bitmask per field. Bit n of a mask is set if value n matches
+class CronExpressionClass():
+  expression = None
+  secondMask = 1 # 5 field expressions match on second 0
+  minuteMask = 0
+  hourMask = 0
+  dayOfMonthMask = 0
+  monthMask = 0
+  dayOfWeekMask = 0 # bit 0 is Sunday as in cron, not datetime.weekday
+  dayOfMonthRestricted = False # when both day fields are restricted a day matches if either does (as in cron)
+  dayOfWeekRestricted = False
+
+  def __init__(self, expression):
+    fieldStrings = expression.split()
+    if (len(fieldStrings) == len(cronFields) + 1):
+      self.secondMask = self._parseField(fieldStrings[0], cronSecondField)
+      self.expression = ' '.join(fieldStrings).upper()
+      fieldStrings = fieldStrings[1:]
+    elif (len(fieldStrings) == len(cronFields)):
+      self.secondMask = 1
+      self.expression = ' '.join(fieldStrings).upper()
+    else:
+      raise badParamater
+    masks = []
+    for x in range(0, len(cronFields)):
+      masks.append(self._parseField(fieldStrings[x], cronFields[x]))
+    (self.minuteMask, self.hourMask, self.dayOfMonthMask, self.monthMask, self.dayOfWeekMask) = masks
+    if (self.dayOfWeekMask & (1 << 7)):
+      self.dayOfWeekMask = (self.dayOfWeekMask | 1) & ~(1 << 7)
+    self.dayOfMonthRestricted = not fieldStrings[2].startswith('*')
+    self.dayOfWeekRestricted = not fieldStrings[4].startswith('*')
+
+  def _parseValue(self, valueString, field):
+    (name, minVal, maxVal, names) = field
+    if (names is not None) and (valueString.upper() in names):
+      return names.index(valueString.upper()) + minVal
+    try:
+      value = int(valueString)
+    except ValueError:
+      raise badParamater
+    if (value < minVal) or (value > maxVal):
+      raise badParamater
+    return value
+
+  #Each comma separated item is *, a value or a range, optionally followed by /step
+  def _parseField(self, fieldString, field):
+    (name, minVal, maxVal, names) = field
+    mask = 0
+    for item in fieldString.split(','):
+      step = 1
+      if ('/' in item):
+        (item, stepString) = item.split('/', 1)
+        try:
+          step = int(stepString)
+        except ValueError:
+          raise badParamater
+        if (step < 1):
+          raise badParamater
+      if (item == '*'):
+        (start, end) = (minVal, maxVal)
+      elif ('-' in item):
+        (startString, endString) = item.split('-', 1)
+        (start, end) = (self._parseValue(startString, field), self._parseValue(endString, field))
+        if (start > end):
+          raise badParamater
+      else:
+        start = self._parseValue(item, field)
+        #a/n means every n from a
+        end = maxVal if step > 1 else start
+      for value in range(start, end + 1, step):
+        mask |= (1 << value)
+    return mask
+
+  def _isDayMatch(self, date):
+    dayOfMonthMatch = (self.dayOfMonthMask >> date.day) & 1
+    dayOfWeekMatch = (self.dayOfWeekMask >> date.isoweekday() % 7) & 1
+    if (self.dayOfMonthRestricted and self.dayOfWeekRestricted):
+      return bool(dayOfMonthMatch or dayOfWeekMatch)
+    return bool(dayOfMonthMatch and dayOfWeekMatch)
+
+  def matchesEveryHour(self):
+    return self.hourMask == (1 << 24) - 1
+
+  #Time (naive, in the expressions timezone) of the first match at or after localStart or None if there is none
+  # within maxYears. Whole months, days, hours and minutes that can't match are skipped rather than checking each second
+  def getNextMatch(self, localStart, maxYears=10):
+    cur = localStart.replace(microsecond=0)
+    if (cur < localStart):
+      cur += timedelta(seconds=1)
+    lastYear = cur.year + maxYears
+    while cur.year <= lastYear:
+      month = _nextSetBit(self.monthMask, cur.month, 12)
+      if (month is None):
+        cur = datetime.datetime(cur.year + 1, 1, 1)
+        continue
+      if (month != cur.month):
+        cur = datetime.datetime(cur.year, month, 1)
+      if not self._isDayMatch(cur):
+        cur = datetime.datetime(cur.year, cur.month, cur.day) + timedelta(days=1)
+        continue
+      hour = _nextSetBit(self.hourMask, cur.hour, 23)
+      if (hour is None):
+        cur = datetime.datetime(cur.year, cur.month, cur.day) + timedelta(days=1)
+        continue
+      if (hour != cur.hour):
+        cur = cur.replace(hour=hour, minute=0, second=0)
+      minute = _nextSetBit(self.minuteMask, cur.minute, 59)
+      if (minute is None):
+        cur = cur.replace(minute=0, second=0) + timedelta(hours=1)
+        continue
+      if (minute != cur.minute):
+        cur = cur.replace(minute=minute, second=0)
+      second = _nextSetBit(self.secondMask, cur.second, 59)
+      if (second is None):
+        cur = cur.replace(second=0) + timedelta(minutes=1)
+        continue
+      return cur.replace(second=second)
+    return None
+
+#Lowest value from start to maxVal with its bit set in mask or None
+def _nextSetBit(mask, start, maxVal):
+  remaining = (mask >> start) << start
+  if (remaining == 0):
+    return None
+  value = (remaining & -remaining).bit_length() - 1
+  if (value > maxVal):
+    return None
+  return value
+
 class RepetitionIntervalClass():
   mode = None;
   minute = -1;
@@ -43,6 +194,14 @@ class RepetitionIntervalClass():
   ## matches datetime.weekday function
   daysForDaily = [False,False,False,False,False,False,False]
 
+  #Worked out once the interval is parsed
+  daysUntilValidDay = None #daily mode, indexed by weekday, days from that day to the next day in daysForDaily
+  sortedDaysOfMonth = None #monthly mode, list of dayOfMonth values in order
+  lastLocalized = None #(date, UTC datetime) from the last call to _localizeToUTC, localize is the slowest step
+  cronExpression = None #CronExpressionClass, only used in cron mode
+  second = 0 #seconds past the minute in hourly mode
+  periodSeconds = None #only used in every mode
+
   def getIntArrayFromCommaListWithRangeCheck(self, commaListStr, minVal, maxVal):
     returnVal = SortedDict()
     for curValSTR in commaListStr.split(","):
@@ -61,10 +220,20 @@ class RepetitionIntervalClass():
   def __init__(self, intervalString):
     self.hourlyModeMinutes = SortedDict()
     self.dayOfMonth = SortedDict()
+    self.daysForDaily = [False,False,False,False,False,False,False]
 
     if (None == intervalString):
       raise badModeException
     a = intervalString.split(":")
+    if (a[0].upper().strip() == ModeType.CRON.name):
+      self._initCron(a)
+      return
+    if (a[0].upper().strip() == ModeType.EVERY.name):
+      self._initEvery(a)
+      return
+    #seconds are optional in hourly mode
+    if (a[0].upper().strip() == ModeType.HOURLY.name) and (len(a) == 3):
+      self.second = self._parseSeconds(a.pop())
     if (len(a) == 0):
       raise badModeException
     modeType = None
@@ -120,7 +289,7 @@ class RepetitionIntervalClass():
             self.daysForDaily[x] = True
             numDays = numDays + 1
           elif (daysOfWeek[x]=="-"):
-           self. daysForDaily[x] = False
+            self.daysForDaily[x] = False
           else:
             raise badParamater
         if (numDays == 0):
@@ -138,6 +307,94 @@ class RepetitionIntervalClass():
       except pytz.exceptions.UnknownTimeZoneError:
         raise unknownTimezone
 
+    if (modeType == ModeType.DAILY):
+      self.daysUntilValidDay = []
+      for weekday in range(0, 7):
+        daysAhead = 0
+        while not self.daysForDaily[(weekday + daysAhead) % 7]:
+          daysAhead = daysAhead + 1
+        self.daysUntilValidDay.append(daysAhead)
+    if (modeType == ModeType.MONTHLY):
+      self.sortedDaysOfMonth = list(self.dayOfMonth.keys())
+
+  def _parseSeconds(self, secondsString):
+    secondsString = secondsString.strip()
+    if (" " in secondsString):
+      raise badParamater
+    try:
+      seconds = int(secondsString)
+    except ValueError:
+      raise badParamater
+    if (seconds < 0) or (seconds > 59):
+      raise badParamater
+    return seconds
+
+  def _initEvery(self, a):
+    if ((1+ModeType.EVERY.getExpectedNumParams()) != len(a)):
+      raise badNumberOfModeParamaters
+    self.mode = ModeType.EVERY
+    try:
+      self.periodSeconds = int(a[1].strip())
+    except ValueError:
+      raise badParamater
+    if (self.periodSeconds < 1):
+      raise badParamater
+
+  #True if occurrences depend on the anchor passed to getNextOccuranceDatetime
+  def isAnchored(self):
+    return self.mode == ModeType.EVERY
+
+  #The first anchor + a whole number of periods that is after curDateTime (the anchor can be before or after it)
+  def _getNextOccuranceDatetimeForEveryMode(self, curDateTime, anchor):
+    if (anchor is None):
+      anchor = everyModeDefaultAnchor
+    period = timedelta(seconds=self.periodSeconds)
+    periods = ((curDateTime - anchor) // period) + 1
+    return (anchor + (period * periods)).astimezone(pytz.utc)
+
+  def _initCron(self, a):
+    if ((1+ModeType.CRON.getExpectedNumParams()) != len(a)):
+      raise badNumberOfModeParamaters
+    self.mode = ModeType.CRON
+    self.cronExpression = CronExpressionClass(a[1])
+    try:
+      self.timezone = pytz.timezone(a[2].strip())
+    except pytz.exceptions.UnknownTimeZoneError:
+      raise unknownTimezone
+    #e.g. 30 February
+    if self.cronExpression.getNextMatch(datetime.datetime(2000,1,1)) is None:
+      raise badParamater
+
+  #Times are matched by the clock in the RI timezone. Like DAILY times that don't exist because the clocks go forward
+  # are taken as standard time. A time that happens twice runs on its first occurrence (or its second if curDateTime
+  # is already past the first) and expressions that match every hour keep running through the repeated hour
+  def _getNextOccuranceDatetimeForCronMode(self, curDateTime):
+    localCur = curDateTime.astimezone(self.timezone).replace(tzinfo=None)
+    nd = self._getNextCronMatchAfter(curDateTime, localCur, True)
+    if self.cronExpression.matchesEveryHour():
+      #what the wall clock will show at curDateTime once it has gone back, differs from localCur only before the repeat
+      localCurAfterRepeat = curDateTime.astimezone(pytz.utc).replace(tzinfo=None) + self.timezone.localize(localCur, is_dst=False).utcoffset()
+      if (localCurAfterRepeat != localCur):
+        nd = min(nd, self._getNextCronMatchAfter(curDateTime, localCurAfterRepeat, False))
+    return nd
+
+  def _getNextCronMatchAfter(self, curDateTime, localCur, isDst):
+    #the second after the current one, a match in the current second is no later than curDateTime
+    localStart = localCur.replace(microsecond=0) + timedelta(seconds=1)
+    while True:
+      localMatch = self.cronExpression.getNextMatch(localStart)
+      if (localMatch is None):
+        raise Exception("Algroythm Error")
+      nd = self.timezone.localize(localMatch, is_dst=False).astimezone(pytz.utc)
+      if isDst:
+        #only differs for a repeated time (or a skipped one, which still runs as if the clocks hadn't gone forward)
+        firstOccurrence = self.timezone.localize(localMatch, is_dst=True).astimezone(pytz.utc)
+        if (curDateTime < firstOccurrence < nd) and (firstOccurrence.astimezone(self.timezone).replace(tzinfo=None) == localMatch):
+          nd = firstOccurrence
+      if (nd > curDateTime):
+        return nd
+      localStart = localMatch + timedelta(seconds=1)
+
   #We must do arethmetic in UTC only or datetime gives wrong answer
   def addTimeInUTC(self, time, amount):
     utctime = time.astimezone(pytz.timezone('UTC'))
@@ -158,7 +415,7 @@ class RepetitionIntervalClass():
       curDateTime.day,
       curDateTime.hour,
       minute,
-      0,
+      self.second,
       0,
       curDateTime.tzinfo
     )
@@ -180,51 +437,65 @@ class RepetitionIntervalClass():
       raise Exception("Algroythm Error")
     return minRetVal
 
-  def _getNextOccuranceDatetimeForMonthlyModeForParticulayDayOfMonth(self, curDateTime, dayOfMonth):
-    # Setup time to test in timezone specified by RI
+  #hour:minute on a date in the RI timezone as a UTC datetime
+  # times that don't exist because the clocks go forward are taken as standard time so run an hour later by the clock
+  # and times that happen twice because the clocks go back are the second one
+  def _localizeToUTC(self, date):
+    #jobs sharing this object are mostly scheduled for the same date one after another
+    lastLocalized = self.lastLocalized
+    if lastLocalized is not None and lastLocalized[0] == date:
+      return lastLocalized[1]
     nd = self.timezone.localize(datetime.datetime(
-      curDateTime.year,
-      curDateTime.month,
-      dayOfMonth,
+      date.year,
+      date.month,
+      date.day,
       self.hour,
       self.minute,
       0,
       0
-    ))
-    #convert to UTC for comparison
-    nd = nd.astimezone(pytz.timezone('UTC'))
+    )).astimezone(pytz.utc)
+    self.lastLocalized = (date, nd)
+    return nd
+
+  #Dates are worked out in the RI timezone and only the chosen date is localized so the run is always
+  # at the same time by the clock on either side of a DST change
+  def _getNextOccuranceDatetimeForDailyMode(self, curDateTime):
+    localDate = curDateTime.astimezone(self.timezone).date()
+    localDate += timedelta(days=self.daysUntilValidDay[localDate.weekday()])
+    nd = self._localizeToUTC(localDate)
     if (nd <= curDateTime):
-      year = curDateTime.year
-      month = curDateTime.month + 1
-      if (month > 12):
-        year = year + 1
-        month = 1
-      nd = self.timezone.localize(datetime.datetime(
-        year,
-        month,
-        dayOfMonth,
-        self.hour,
-        self.minute,
-        0,
-        0
-      ))
-      nd = nd.astimezone(pytz.timezone('UTC'))
+      #only possible when localDate is today
+      localDate += timedelta(days=1)
+      localDate += timedelta(days=self.daysUntilValidDay[localDate.weekday()])
+      nd = self._localizeToUTC(localDate)
     return nd
 
+  #Days that are not in a month (e.g. 31 in April) are skipped
   def _getNextOccuranceDatetimeForMonthlyMode(self, curDateTime):
-    minRetVal = pytz.timezone('UTC').localize(datetime.datetime(4016,1,14,13,0,1,0))
-    cc = True
-    for curDOM in self.dayOfMonth:
-      rv = self._getNextOccuranceDatetimeForMonthlyModeForParticulayDayOfMonth(curDateTime, curDOM)
-      if rv < minRetVal:
-        minRetVal = rv
-        cc = False
-    if cc:
-      raise Exception("Algroythm Error")
-    return minRetVal
+    localDate = curDateTime.astimezone(self.timezone).date()
+    year = localDate.year
+    month = localDate.month
+    firstDay = localDate.day
+    #every day of month exists in at least one of any two months in a row so this always returns in the first 3 months
+    for monthsAhead in range(0, 3):
+      daysInMonth = calendar.monthrange(year, month)[1]
+      for dayIdx in range(bisect_left(self.sortedDaysOfMonth, firstDay), len(self.sortedDaysOfMonth)):
+        dayOfMonth = self.sortedDaysOfMonth[dayIdx]
+        if (dayOfMonth > daysInMonth):
+          break
+        nd = self._localizeToUTC(datetime.date(year, month, dayOfMonth))
+        if (nd > curDateTime):
+          return nd
+      firstDay = 1
+      month = month + 1
+      if (month > 12):
+        year = year + 1
+        month = 1
+    raise Exception("Algroythm Error")
 
   #Returns the next time that the repetition interval defines according to the current datetime passed in
-  def getNextOccuranceDatetime(self, curDateTime):
+  # anchor is only used by intervals where isAnchored is True. Defaults to the unix epoch
+  def getNextOccuranceDatetime(self, curDateTime, anchor=None):
     if (curDateTime.tzinfo == None):
       raise missingTimezoneException
     if (str(curDateTime.tzinfo) != 'UTC'):
@@ -232,29 +503,24 @@ class RepetitionIntervalClass():
     if (self.mode == ModeType.HOURLY):
       return self._getNextOccuranceDatetimeForHourlyMode(curDateTime)
     if (self.mode == ModeType.DAILY):
-      nd = self.timezone.localize(datetime.datetime(
-        curDateTime.year,
-        curDateTime.month,
-        curDateTime.day,
-        self.hour,
-        self.minute,
-        0,
-        0
-      ))
-      #convert to UTC for comparison
-      nd = nd.astimezone(pytz.timezone('UTC'))
-      if (nd <= curDateTime):
-        nd = self.addTimeInUTC(nd, timedelta(days=1))
-      #keep incrementing the day value until it falls on a valid day
-      while (self.isValidDay(nd) != True):
-        nd = self.addTimeInUTC(nd, timedelta(days=1))
-      return nd
+      return self._getNextOccuranceDatetimeForDailyMode(curDateTime)
 
     if (self.mode == ModeType.MONTHLY):
       return self._getNextOccuranceDatetimeForMonthlyMode(curDateTime)
+    if (self.mode == ModeType.CRON):
+      return self._getNextOccuranceDatetimeForCronMode(curDateTime)
+    if (self.mode == ModeType.EVERY):
+      return self._getNextOccuranceDatetimeForEveryMode(curDateTime, anchor)
 
     raise Exception('Mode Not Implemented')
 
+  #Generator giving every occurrence after curDateTime in order. Callers take as many as they need (e.g. with itertools.islice)
+  def getNextOccurances(self, curDateTime, anchor=None):
+    nd = curDateTime
+    while True:
+      nd = self.getNextOccuranceDatetime(nd, anchor)
+      yield nd
+
   def __str__(self):
     if (self.mode == ModeType.HOURLY):
       #example 'HOURLY:03'
@@ -266,6 +532,8 @@ class RepetitionIntervalClass():
         else:
           sf += ","
         sf += str(curHour).zfill(2)
+      if (self.second != 0):
+        sf += ":" + str(self.second).zfill(2)
       return sf
     if (self.mode == ModeType.DAILY):
       #example 'DAILY:03:15:+++++++:Europe/London'
@@ -289,7 +557,35 @@ class RepetitionIntervalClass():
         sf += str(curDOM).zfill(2)
       sf += ":" + self.timezone.__str__()
       return sf
+    if (self.mode == ModeType.CRON):
+      #example 'CRON:*/5 8-18 * * MON-FRI:Europe/London'
+      return 'CRON:' + self.cronExpression.expression + ':' + self.timezone.__str__()
+    if (self.mode == ModeType.EVERY):
+      #example 'EVERY:15'
+      return 'EVERY:' + str(self.periodSeconds)
     raise Exception('Invalid mode encountered in RepetitionIntervalClass.__str__')
 
+everyModeDefaultAnchor = pytz.utc.localize(datetime.datetime(1970,1,1,0,0,0,0))
 
+#Jobs share a RepetitionIntervalClass for each distinct interval rather than parsing their interval every time they
+# are scheduled. Objects are keyed by the string they were created from and by their canonical (__str__) form so
+# strings that differ only in formatting share an object. Objects returned must not be changed.
+maxCompiledRepetitionIntervals = 1024
+compiledRepetitionIntervals = dict()
+compiledRepetitionIntervalsLock = threading.Lock()
 
+def getCompiledRepetitionInterval(intervalString):
+  with compiledRepetitionIntervalsLock:
+    ri = compiledRepetitionIntervals.get(intervalString, None)
+  if ri is not None:
+    return ri
+  ri = RepetitionIntervalClass(intervalString) # raises for invalid intervals which are never cached
+  canonicalString = ri.__str__()
+  with compiledRepetitionIntervalsLock:
+    ri = compiledRepetitionIntervals.get(canonicalString, ri)
+    if len(compiledRepetitionIntervals) >= maxCompiledRepetitionIntervals:
+      #intervals still in use stay referenced by their jobs and are added back the next time they are looked up
+      compiledRepetitionIntervals.clear()
+    compiledRepetitionIntervals[canonicalString] = ri
+    compiledRepetitionIntervals[intervalString] = ri
+  return ri
@@ -6,7 +6,7 @@
 
 import pytz
 
-from baseapp_for_restapi_backend_with_swagger import AppObjBaseClass as parAppObj, readFromEnviroment
+from baseapp_for_restapi_backend_with_swagger import AppObjBaseClass as parAppObj, readFromEnviroment, getInvalidEnvVarParamaterException
 from serverInfoAPI import registerAPI as registerMainApi
 from jobsDataAPI import registerAPI as registerJobsApi, resetData as resetJobsData, getJobServerInfoModel
 from jobExecutionsDataAPI import registerAPI as registerJobExecutionsApi
@@ -14,11 +14,42 @@ from flask_restplus import fields
 from JobExecutor import JobExecutorClass
 import time
 import datetime
+import os
+import tempfile
+
+#Read an integer enviroment variable, values come in as strings from the real enviroment
+def readIntFromEnviroment(env, envVarName, defaultValue, minValue):
+  val = readFromEnviroment(env, envVarName, defaultValue, None)
+  try:
+    val = int(val)
+  except (ValueError, TypeError):
+    raise getInvalidEnvVarParamaterException(envVarName, str(val), 'Not an integer')
+  if val < minValue:
+    raise getInvalidEnvVarParamaterException(envVarName, str(val), 'Must be at least ' + str(minValue))
+  return val
+
+#Comma separated list of server enviroment variables jobs can see. None means jobs see all of them
+def readJobEnvAllowList(env):
+  val = readFromEnviroment(env, 'APIAPP_JOBENVALLOWLIST', '', None, nullValueAllowed=True)
+  if val.strip() == '':
+    return None
+  return [x.strip() for x in val.split(',') if x.strip() != '']
 
 class appObjClass(parAppObj):
   jobExecutor = None
   userforjobs = None
   groupforjobs = None
+  maxConcurrentJobs = None
+  defaultJobTimeoutSeconds = None
+  jobKillGraceSeconds = None
+  jobEnvAllowList = None
+  useJobSpawner = None
+  maxJobOutputBytes = None
+  maxPendingExecutions = None
+  maxPendingExecutionsPerJob = None
+  misfireThresholdSeconds = None
+  executionPurgeIntervalSeconds = None
+  jobOutputSpoolDir = None
   serverStartTime = None
   curDateTimeOverrideForTesting = None
   minutesBeforeMostRecentCompletionStatusBecomesUnknown = None
@@ -32,6 +63,7 @@ class appObjClass(parAppObj):
       self.jobExecutor.stopThreadRunning()
       if self.jobExecutor.isAlive():
         self.jobExecutor.join()
+      self.jobExecutor.stopJobSpawner()
       self.jobExecutor = None
     super(appObjClass, self).init(env)
     resetJobsData(self)
@@ -39,6 +71,17 @@ class appObjClass(parAppObj):
     self.userforjobs = readFromEnviroment(env, 'APIAPP_USERFORJOBS', None, None)
     self.groupforjobs = readFromEnviroment(env, 'APIAPP_GROUPFORJOBS', None, None)
     skipUserCheck = readFromEnviroment(env, 'APIAPP_SKIPUSERCHECK', False, [False, True])
+    self.maxConcurrentJobs = readIntFromEnviroment(env, 'APIAPP_MAXCONCURRENTJOBS', 4, 1)
+    self.defaultJobTimeoutSeconds = readIntFromEnviroment(env, 'APIAPP_DEFAULTJOBTIMEOUTSECONDS', 15, 1)
+    self.jobKillGraceSeconds = readIntFromEnviroment(env, 'APIAPP_JOBKILLGRACESECONDS', 5, 0)
+    self.maxJobOutputBytes = readIntFromEnviroment(env, 'APIAPP_MAXJOBOUTPUTBYTES', 1024 * 1024, 1024)
+    self.maxPendingExecutions = readIntFromEnviroment(env, 'APIAPP_MAXPENDINGEXECUTIONS', 1000, 1)
+    self.maxPendingExecutionsPerJob = readIntFromEnviroment(env, 'APIAPP_MAXPENDINGEXECUTIONSPERJOB', 100, 1)
+    self.misfireThresholdSeconds = readIntFromEnviroment(env, 'APIAPP_MISFIRETHRESHOLDSECONDS', 60, 0)
+    self.executionPurgeIntervalSeconds = readIntFromEnviroment(env, 'APIAPP_EXECUTIONPURGEINTERVALSECONDS', 60, 0)
+    self.jobOutputSpoolDir = readFromEnviroment(env, 'APIAPP_JOBOUTPUTSPOOLDIR', os.path.join(tempfile.gettempdir(), 'dockjob_output'), None)
+    self.jobEnvAllowList = readJobEnvAllowList(env)
+    self.useJobSpawner = readFromEnviroment(env, 'APIAPP_USEJOBSPAWNER', False, [False, True, 'False', 'True']) in [True, 'True']
     self.jobExecutor = JobExecutorClass(self, skipUserCheck)
 
     #When we are testing we will launch the loop iterations manually
@@ -64,6 +107,8 @@ class appObjClass(parAppObj):
       'ServerDatetime': fields.DateTime(dt_format=u'iso8601', description='Current server date time'),
       'ServerStartupTime': fields.DateTime(dt_format=u'iso8601', description='Time the dockJob server started'),
       'TotalJobExecutions': fields.Integer(default='0',description='Number to jobs executed since server started'),
+      'PendingJobExecutions': fields.Integer(default='0',description='Number of executions waiting to be started'),
+      'DroppedScheduledJobExecutions': fields.Integer(default='0',description='Number of scheduled or event triggered executions not created since server started because too many executions were waiting to run'),
       'MinutesBeforeMostRecentCompletionStatusBecomesUnknown': fields.Integer(default='0',description='Default number of minutes a job has not been run before a job is considered to have Unknown status.')
     })
 
@@ -79,6 +124,8 @@ class appObjClass(parAppObj):
     self.serverObj['ServerDatetime'] = curDateTime.isoformat()
     self.serverObj['ServerStartupTime'] = self.serverStartTime.isoformat()
     self.serverObj['TotalJobExecutions'] = self.jobExecutor.totalExecutions
+    self.serverObj['PendingJobExecutions'] = self.jobExecutor.waitingExecutionCount
+    self.serverObj['DroppedScheduledJobExecutions'] = self.jobExecutor.droppedScheduledExecutions
     self.serverObj['MinutesBeforeMostRecentCompletionStatusBecomesUnknown'] = self.minutesBeforeMostRecentCompletionStatusBecomesUnknown
     return {'Server': self.serverObj, 'Jobs': self.appData['jobsData'].getJobServerInfo()}
     #return json.dumps({'Server': self.serverObj, 'Jobs': jobsObj})
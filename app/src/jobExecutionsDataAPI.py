@@ -1,8 +1,22 @@
 from flask_restplus import Resource
 from JobExecution import getJobExecutionModel
-from flask import request
+from flask import request, Response
 from werkzeug.exceptions import BadRequest
 
+outputChunkSize = 64 * 1024
+followWaitSeconds = 15 # how long a follow request waits for output before checking again
+
+#Generator used to stream output of an execution as it is written
+def followExecutionOutput(outputBuffer, offset):
+  while True:
+    (offset, data) = outputBuffer.read(offset, outputChunkSize)
+    if len(data) > 0:
+      offset += len(data)
+      yield data
+      continue
+    if not outputBuffer.waitForOutput(offset, followWaitSeconds):
+      return
+
 
 def registerAPI(appObj):
   nsJobExecutions = appObj.flastRestPlusAPIObject.namespace('executions', description='Job Executions')
@@ -20,7 +34,7 @@ def registerAPI(appObj):
     def get(self):
       '''Get Job Executions'''
       def outputJobExecution(item):
-        return item._caculatedDict()
+        return item._caculatedDict(appObj)
       def filterJobExecution(item, whereClauseText):
         return True
       return appObj.getPaginatedResult(
@@ -42,5 +56,38 @@ def registerAPI(appObj):
       execution = appObj.jobExecutor.getJobExecutionStatus(guid)
       if execution is None:
         raise BadRequest('Invalid Job Execution Identifier')
-      return execution._caculatedDict()
+      return execution._caculatedDict(appObj)
 
+  @nsJobExecutions.route('/<string:guid>/output')
+  @nsJobExecutions.response(400, 'Job Execution not found')
+  @nsJobExecutions.param('guid', 'Job Execution identifier')
+  class jobOutput(Resource):
+    '''Output of a single execution'''
+    @nsJobExecutions.doc('get_jobexecutionoutput')
+    @nsJobExecutions.produces(['text/plain'])
+    @nsJobExecutions.param('offset', 'Byte offset in the output to start from (default 0)')
+    @nsJobExecutions.param('follow', 'If true the output is streamed until the execution finishes')
+    @nsJobExecutions.response(200, 'Output from offset. X-Output-Offset header gives the offset of the first byte returned and X-Output-Next-Offset the offset to resume from')
+    def get(self, guid):
+      '''Fetch output of an execution, optionally following it while it runs'''
+      execution = appObj.jobExecutor.getJobExecutionStatus(guid)
+      if execution is None:
+        raise BadRequest('Invalid Job Execution Identifier')
+      try:
+        offset = int(request.args.get('offset', 0))
+      except ValueError:
+        raise BadRequest('Invalid offset')
+      if offset < 0:
+        raise BadRequest('Invalid offset')
+      follow = request.args.get('follow', 'false').lower() == 'true'
+      outputBuffer = execution.outputBuffer
+      if outputBuffer is None:
+        return Response(b'', mimetype='text/plain', headers={'X-Output-Offset': str(offset), 'X-Output-Next-Offset': str(offset)})
+      if follow:
+        return Response(followExecutionOutput(outputBuffer, offset), mimetype='text/plain', headers={'X-Output-Offset': str(offset)})
+      (startOffset, data) = outputBuffer.read(offset, appObj.jobExecutor.maxJobOutputBytes)
+      return Response(data, mimetype='text/plain', headers={
+        'X-Output-Offset': str(startOffset),
+        'X-Output-Next-Offset': str(startOffset + len(data)),
+        'X-Execution-Stage': execution.stage
+      })
@@ -4,7 +4,17 @@ import pytz
 import uuid
 from threading import Lock
 from dateutil.relativedelta import relativedelta
-from RepetitionInterval import RepetitionIntervalClass
+from RepetitionInterval import getCompiledRepetitionInterval
+from HTTPJob import normaliseHTTPRequest
+from baseapp_for_restapi_backend_with_swagger import from_iso8601
+from JobResourceLimits import normaliseResourceLimits
+import re
+import shlex
+import itertools
+import copy
+import collections
+
+environmentVariableNameRegex = re.compile('^[A-Za-z_][A-Za-z0-9_]*$')
 
 
 #Class to represent a job
@@ -14,10 +24,12 @@ class jobClass():
   command = None
   enabled = None
   repetitionInterval = None
+  compiledRepetitionInterval = None #shared RepetitionIntervalClass for repetitionInterval, None if there isn't one
   creationDate = None
   lastUpdateDate = None
   lastRunDate = None
   nextScheduledRun = None
+  scheduleAnchor = None #when the last scheduled run dispatched was due, fixed period (EVERY) intervals carry on from it
   lastRunReturnCode = None
   lastRunExecutionGUID = None
   pinned = False
@@ -27,6 +39,25 @@ class jobClass():
   StateChangeSuccessJobGUID = None
   StateChangeFailJobGUID = None
   StateChangeUnknownJobGUID = None
+  maxConcurrentExecutions = None
+  concurrencyPolicy = 'Queue'
+  timeoutSeconds = None
+  environment = None
+  executionMode = 'shell'
+  commandArgs = None #command split into arguments when executionMode is exec, worked out when the job is saved
+  httpRequest = None #request made when executionMode is http
+  coalescePendingExecutions = False #scheduled and event runs are merged into a Pending execution of this job if there is one
+  priority = 0 #Pending executions of jobs with higher priority run first (within manual, event and scheduled runs)
+  resourceLimits = None #rlimits, nice and io priority applied to the jobs process
+  misfirePolicy = 'RunOnce' #what happens to scheduled runs that are later than the servers misfire threshold
+  misfireMaxRuns = 10 #most missed runs submitted at once with the RunAll misfire policy (the most recent ones)
+
+  #Resource usage totals of this jobs executions. Updated when an execution completes
+  measuredExecutions = 0
+  totalDurationSeconds = 0.0
+  totalUserCPUSeconds = 0.0
+  totalSystemCPUSeconds = 0.0
+  peakMaxRSSKB = None
 
   CompletionstatusLock = None
 
@@ -54,16 +85,125 @@ class jobClass():
         raise BadRequest('Repetition interval not set but enabled is true')
       return None
     try:
-      return RepetitionIntervalClass(ri)
+      return getCompiledRepetitionInterval(ri)
     except:
       raise BadRequest('Invalid Repetition Interval')
 
+  #What to do with a new execution when the job already has maxConcurrentExecutions Pending or Running
+  # Queue - new execution waits until a running one finishes
+  # Skip - new execution is not created
+  # Replace - Pending executions are replaced by the new one
+  validConcurrencyPolicies = ['Queue', 'Skip', 'Replace']
+  def assertValidConcurrencyPolicy(concurrencyPolicy):
+    if concurrencyPolicy not in jobClass.validConcurrencyPolicies:
+      raise BadRequest('Invalid concurrency policy (must be one of ' + ','.join(jobClass.validConcurrencyPolicies) + ')')
+  def assertValidMaxConcurrentExecutions(maxConcurrentExecutions):
+    if maxConcurrentExecutions is None:
+      return
+    if maxConcurrentExecutions < 0:
+      raise BadRequest('maxConcurrentExecutions can not be negative')
+
+  def setConcurrencyValues(self, maxConcurrentExecutions, concurrencyPolicy):
+    if concurrencyPolicy is None:
+      concurrencyPolicy = 'Queue'
+    jobClass.assertValidMaxConcurrentExecutions(maxConcurrentExecutions)
+    jobClass.assertValidConcurrencyPolicy(concurrencyPolicy)
+    if maxConcurrentExecutions == 0:
+      maxConcurrentExecutions = None
+    self.maxConcurrentExecutions = maxConcurrentExecutions
+    self.concurrencyPolicy = concurrencyPolicy
+
+  def setTimeoutSeconds(self, timeoutSeconds):
+    if timeoutSeconds == 0:
+      timeoutSeconds = None
+    if timeoutSeconds is not None:
+      if timeoutSeconds < 0:
+        raise BadRequest('timeoutSeconds can not be negative')
+    self.timeoutSeconds = timeoutSeconds
+
+  #Extra enviroment variables set for every execution of the job
+  def setEnvironment(self, environment):
+    if environment is not None:
+      if not isinstance(environment, dict):
+        raise BadRequest('environment must be an object mapping variable names to values')
+      for name in environment:
+        if environmentVariableNameRegex.match(name) is None:
+          raise BadRequest('Invalid environment variable name ' + name)
+        if name.startswith('DOCKJOB_'):
+          raise BadRequest('Environment variables starting with DOCKJOB_ are set by dockjob (' + name + ')')
+        if not isinstance(environment[name], str):
+          raise BadRequest('Value of environment variable ' + name + ' must be a string')
+      if len(environment) == 0:
+        environment = None
+    self.environment = environment
+
+  def setPriority(self, priority):
+    if priority is None:
+      priority = 0
+    if not isinstance(priority, int):
+      raise BadRequest('priority must be an integer')
+    self.priority = priority
+
+  #RunOnce - a single run is submitted however many runs were missed
+  # RunAll - a run is submitted for each missed run, up to the most recent misfireMaxRuns
+  # Skip - missed runs are not submitted, the job next runs at its next scheduled time
+  validMisfirePolicies = ['RunOnce', 'RunAll', 'Skip']
+  def setMisfirePolicy(self, misfirePolicy, misfireMaxRuns):
+    if misfirePolicy is None:
+      misfirePolicy = 'RunOnce'
+    if misfirePolicy not in jobClass.validMisfirePolicies:
+      raise BadRequest('Invalid misfire policy (must be one of ' + ','.join(jobClass.validMisfirePolicies) + ')')
+    if misfireMaxRuns is None:
+      misfireMaxRuns = 10
+    if not isinstance(misfireMaxRuns, int) or misfireMaxRuns < 1:
+      raise BadRequest('misfireMaxRuns must be a positive integer')
+    self.misfirePolicy = misfirePolicy
+    self.misfireMaxRuns = misfireMaxRuns
+
+  def setResourceLimits(self, resourceLimits):
+    try:
+      self.resourceLimits = normaliseResourceLimits(resourceLimits)
+    except ValueError as err:
+      raise BadRequest(str(err))
+
+  #shell - command is run by /bin/sh so can use pipes, redirection, variables etc
+  # exec - command is split into arguments (shell quoting rules) and the program is run directly
+  # http - httpRequest is made by dockjob, no process is started and command is not used
+  validExecutionModes = ['shell', 'exec', 'http']
+  def setCommandAndExecutionMode(self, command, executionMode, httpRequest):
+    if executionMode is None:
+      executionMode = 'shell'
+    if executionMode not in jobClass.validExecutionModes:
+      raise BadRequest('Invalid execution mode (must be one of ' + ','.join(jobClass.validExecutionModes) + ')')
+    if executionMode == 'http':
+      if httpRequest is None:
+        raise BadRequest('httpRequest must be set in http mode')
+      try:
+        httpRequest = normaliseHTTPRequest(httpRequest)
+      except ValueError as err:
+        raise BadRequest(str(err))
+    else:
+      httpRequest = None
+    commandArgs = None
+    if executionMode == 'exec':
+      try:
+        commandArgs = shlex.split(command)
+      except ValueError as err:
+        raise BadRequest('Could not split command into arguments - ' + str(err))
+      if len(commandArgs) == 0:
+        raise BadRequest('Command can not be empty in exec mode')
+    self.command = command
+    self.executionMode = executionMode
+    self.commandArgs = commandArgs
+    self.httpRequest = httpRequest
+
   def setNewRepetitionInterval(self, newRepetitionInterval):
     self.repetitionInterval = newRepetitionInterval
+    self.compiledRepetitionInterval = None
     if (self.repetitionInterval != None):
       if (self.repetitionInterval != ''):
-        ri = RepetitionIntervalClass(self.repetitionInterval)
-        self.repetitionInterval = ri.__str__()
+        self.compiledRepetitionInterval = getCompiledRepetitionInterval(self.repetitionInterval)
+        self.repetitionInterval = self.compiledRepetitionInterval.__str__()
 
   def verifyJobGUID(self, appObj, jobGUID, callingJobGUID):
     if jobGUID is None:
@@ -86,14 +226,25 @@ class jobClass():
       overrideMinutesBeforeMostRecentCompletionStatusBecomesUnknown,
       StateChangeSuccessJobGUID,
       StateChangeFailJobGUID,
-      StateChangeUnknownJobGUID
+      StateChangeUnknownJobGUID,
+      maxConcurrentExecutions = None,
+      concurrencyPolicy = 'Queue',
+      timeoutSeconds = None,
+      environment = None,
+      executionMode = 'shell',
+      httpRequest = None,
+      priority = 0,
+      coalescePendingExecutions = False,
+      resourceLimits = None,
+      misfirePolicy = 'RunOnce',
+      misfireMaxRuns = 10
   ):
     jobClass.assertValidName(name)
     jobClass.assertValidRepetitionInterval(repetitionInterval, enabled)
     curTime = datetime.datetime.now(pytz.timezone("UTC"))
     self.guid = str(uuid.uuid4())
     self.name = name
-    self.command = command
+    self.setCommandAndExecutionMode(command, executionMode, httpRequest)
     self.enabled = enabled
     self.setNewRepetitionInterval(repetitionInterval)
     self.creationDate = curTime.isoformat()
@@ -102,6 +253,7 @@ class jobClass():
     self.lastRunExecutionGUID = ''
     self.lastRunReturnCode = None
     self.nextScheduledRun = None
+    self.scheduleAnchor = None
     self.setNextScheduledRun(datetime.datetime.now(pytz.timezone("UTC")))
     self.pinned = pinned
     if overrideMinutesBeforeMostRecentCompletionStatusBecomesUnknown == 0:
@@ -111,6 +263,18 @@ class jobClass():
     self.StateChangeSuccessJobGUID = self.verifyJobGUID(appObj, StateChangeSuccessJobGUID, self.guid)
     self.StateChangeFailJobGUID = self.verifyJobGUID(appObj, StateChangeFailJobGUID, self.guid)
     self.StateChangeUnknownJobGUID = self.verifyJobGUID(appObj, StateChangeUnknownJobGUID, self.guid)
+    self.setConcurrencyValues(maxConcurrentExecutions, concurrencyPolicy)
+    self.setTimeoutSeconds(timeoutSeconds)
+    self.setEnvironment(environment)
+    self.setPriority(priority)
+    self.coalescePendingExecutions = bool(coalescePendingExecutions)
+    self.setResourceLimits(resourceLimits)
+    self.setMisfirePolicy(misfirePolicy, misfireMaxRuns)
+    self.measuredExecutions = 0
+    self.totalDurationSeconds = 0.0
+    self.totalUserCPUSeconds = 0.0
+    self.totalSystemCPUSeconds = 0.0
+    self.peakMaxRSSKB = None
 
     #fields excluded from JSON output
     self.resetCompletionStatusToUnknownTime = None
@@ -137,6 +301,9 @@ class jobClass():
     ret = dict(self.__dict__)
     del ret['CompletionstatusLock']
     del ret['resetCompletionStatusToUnknownTime']
+    del ret['compiledRepetitionInterval']
+    del ret['scheduleAnchor']
+    del ret['commandArgs']
     if self.lastRunDate is not None:
       ret['lastRunDate'] = self.lastRunDate.isoformat()
 
@@ -153,7 +320,12 @@ class jobClass():
 
     return ret
 
-  def setNewValues(
+  #The values are applied to a copy first so if any of them is invalid the job is left unchanged
+  def setNewValues(self, *args, **kwargs):
+    copy.copy(self)._applyNewValues(*args, **kwargs)
+    self._applyNewValues(*args, **kwargs)
+
+  def _applyNewValues(
     self,
     appObj,
     name,
@@ -164,10 +336,28 @@ class jobClass():
     overrideMinutesBeforeMostRecentCompletionStatusBecomesUnknown,
     StateChangeSuccessJobGUID,
     StateChangeFailJobGUID,
-    StateChangeUnknownJobGUID
+    StateChangeUnknownJobGUID,
+    maxConcurrentExecutions = None,
+    concurrencyPolicy = 'Queue',
+    timeoutSeconds = None,
+    environment = None,
+    executionMode = 'shell',
+    httpRequest = None,
+    priority = 0,
+    coalescePendingExecutions = False,
+    resourceLimits = None,
+    misfirePolicy = 'RunOnce',
+    misfireMaxRuns = 10
   ):
+    self.setConcurrencyValues(maxConcurrentExecutions, concurrencyPolicy)
+    self.setTimeoutSeconds(timeoutSeconds)
+    self.setEnvironment(environment)
+    self.setPriority(priority)
+    self.coalescePendingExecutions = bool(coalescePendingExecutions)
+    self.setResourceLimits(resourceLimits)
+    self.setMisfirePolicy(misfirePolicy, misfireMaxRuns)
     self.name = name
-    self.command = command
+    self.setCommandAndExecutionMode(command, executionMode, httpRequest)
     self.enabled = enabled
     self.setNewRepetitionInterval(repetitionInterval)
     self.setNextScheduledRun(datetime.datetime.now(pytz.timezone("UTC")))
@@ -179,15 +369,47 @@ class jobClass():
     self.StateChangeFailJobGUID = self.verifyJobGUID(appObj, StateChangeFailJobGUID, self.guid)
     self.StateChangeUnknownJobGUID = self.verifyJobGUID(appObj, StateChangeUnknownJobGUID, self.guid)
 
-  def setNextScheduledRun(self, curTime):
-    ri = None
+  #nextRunsByInterval can be passed when many jobs are scheduled for the same curTime so each distinct interval is only worked out once
+  def setNextScheduledRun(self, curTime, nextRunsByInterval=None):
     if self.enabled == False:
       self.nextScheduledRun = None
     else:
-      if (self.repetitionInterval != None):
-        if (self.repetitionInterval != ''):
-          ri = RepetitionIntervalClass(self.repetitionInterval)
-          self.nextScheduledRun = ri.getNextOccuranceDatetime(curTime).isoformat()
+      if self.compiledRepetitionInterval is not None:
+        if nextRunsByInterval is None or self.compiledRepetitionInterval.isAnchored():
+          self.nextScheduledRun = self.compiledRepetitionInterval.getNextOccuranceDatetime(curTime, self.getScheduleAnchor()).isoformat()
+          return
+        if self.repetitionInterval not in nextRunsByInterval:
+          nextRunsByInterval[self.repetitionInterval] = self.compiledRepetitionInterval.getNextOccuranceDatetime(curTime).isoformat()
+        self.nextScheduledRun = nextRunsByInterval[self.repetitionInterval]
+
+  #The next count times this job is scheduled to run after curTime (whether or not it is enabled)
+  def getUpcomingRuns(self, curTime, count):
+    if self.compiledRepetitionInterval is None:
+      return []
+    return list(itertools.islice(self.compiledRepetitionInterval.getNextOccurances(curTime, self.getScheduleAnchor()), count))
+
+  #Fixed period (EVERY) intervals run a whole number of periods after the last scheduled run or, if there isn't one,
+  # the job creation. Manual runs and how long runs take don't move the schedule
+  def getScheduleAnchor(self):
+    if self.scheduleAnchor is not None:
+      return self.scheduleAnchor
+    return from_iso8601(self.creationDate)
+
+  #Called when the run due at nextScheduledRun is submitted
+  def anchorScheduleOnNextScheduledRun(self):
+    if self.nextScheduledRun is not None:
+      self.scheduleAnchor = from_iso8601(self.nextScheduledRun)
+
+  #Times this job was scheduled to run from firstRun up to curTime, oldest first. If there are more than maxRuns
+  # only the most recent maxRuns are returned
+  def getScheduledRunsBetween(self, firstRun, curTime, maxRuns):
+    ri = self.compiledRepetitionInterval
+    ret = collections.deque(maxlen=maxRuns)
+    runTime = firstRun.astimezone(pytz.utc)
+    while runTime <= curTime:
+      ret.append(runTime)
+      runTime = ri.getNextOccuranceDatetime(runTime, self.getScheduleAnchor())
+    return list(ret)
 
   def uniqueJobNameStatic(name):
     return name.strip().upper()
@@ -241,6 +463,7 @@ class jobClass():
     self.lastRunDate = newLastRunDate
     self.lastRunReturnCode = newLastRunReturnCode
     self.lastRunExecutionGUID = triggerExecutionObj.guid
+    self._addResourceUsage(triggerExecutionObj)
     self.resetCompletionStatusToUnknownTime = newLastRunDate + relativedelta(minutes=self._getMinutesBeforeMostRecentCompletionStatusBecomesUnknown(appObj))
 
     newCompletionStatus = self._getCaculatedValueForModeRecentCompletionStatus(appObj, lastRunDate=newLastRunDate, lastRunReturnCode=newLastRunReturnCode)
@@ -250,6 +473,18 @@ class jobClass():
       triggerExecutionObj=triggerExecutionObj
     )
 
+  def _addResourceUsage(self, executionObj):
+    if executionObj.durationSeconds is None:
+      return
+    self.measuredExecutions += 1
+    self.totalDurationSeconds += executionObj.durationSeconds
+    if executionObj.userCPUSeconds is not None:
+      self.totalUserCPUSeconds += executionObj.userCPUSeconds
+      self.totalSystemCPUSeconds += executionObj.systemCPUSeconds
+    if executionObj.maxRSSKB is not None:
+      if self.peakMaxRSSKB is None or executionObj.maxRSSKB > self.peakMaxRSSKB:
+        self.peakMaxRSSKB = executionObj.maxRSSKB
+
   #In the loop each job needs to check if its status needs to become unknown
   # this is required because the job may need to emit an event as a result
   # This is called from the job execution thread
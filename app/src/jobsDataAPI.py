@@ -35,6 +35,22 @@ def getJobModel(appObj):
       'StateChangeSuccessJobNAME': fields.String(default=None,description='READONLY - Name of job to call when this jobs state changes to Success'),
       'StateChangeFailJobNAME': fields.String(default=None,description='READONLY - Name of job to call when this jobs state changes to Fail'),
       'StateChangeUnknownJobNAME': fields.String(default=None,description='READONLY - Name of job to call when this jobs state changes to Unknown'),
+      'maxConcurrentExecutions': fields.Integer(default=None,description='Maximum number of Pending or Running executions this job can have (null for no limit)'),
+      'concurrencyPolicy': fields.String(default='Queue',description='What happens to a new execution when the job is at maxConcurrentExecutions. Queue, Skip or Replace'),
+      'timeoutSeconds': fields.Integer(default=None,description='Seconds an execution can run before it is killed (null to use the server default)'),
+      'environment': fields.Raw(default=None,description='Extra enviroment variables set for executions of this job (object mapping name to value)'),
+      'executionMode': fields.String(default='shell',description='shell to run the command with /bin/sh, exec to split the command into arguments and run the program directly, http to make httpRequest'),
+      'httpRequest': fields.Raw(default=None,description='Request made in http mode (method, url, headers, body, expectedStatus)'),
+      'priority': fields.Integer(default=0,description='Pending executions of jobs with a higher priority run first. Manual runs always go before event triggered runs which go before scheduled runs'),
+      'coalescePendingExecutions': fields.Boolean(default=False,description='Scheduled and event triggered runs are merged into a Pending execution of this job if it has one instead of creating another execution. Manual runs always create an execution'),
+      'resourceLimits': fields.Raw(default=None,description='Limits applied to the jobs process (cpuSeconds, addressSpaceMB, openFiles, nice 0-19, ioClass best-effort or idle, ioLevel 0-7)'),
+      'misfirePolicy': fields.String(default='RunOnce',description='What happens when scheduled runs are later than the servers misfire threshold. RunOnce (submit one run), RunAll (submit a run for each of the most recent misfireMaxRuns missed runs) or Skip (wait for the next scheduled run)'),
+      'misfireMaxRuns': fields.Integer(default=10,description='Most missed runs submitted at once with the RunAll misfire policy. Older missed runs are dropped'),
+      'measuredExecutions': fields.Integer(default=0,description='READONLY - Number of completed executions included in the resource usage totals'),
+      'totalDurationSeconds': fields.Float(default=0.0,description='READONLY - Total wall clock time of this jobs executions'),
+      'totalUserCPUSeconds': fields.Float(default=0.0,description='READONLY - Total user mode CPU time of this jobs executions'),
+      'totalSystemCPUSeconds': fields.Float(default=0.0,description='READONLY - Total kernel CPU time of this jobs executions'),
+      'peakMaxRSSKB': fields.Integer(default=None,description='READONLY - Highest peak resident memory in kilobytes of any of this jobs executions'),
     })
   return jobModel
 
@@ -50,6 +66,17 @@ def getJobCreationModel(appObj):
     'StateChangeSuccessJobGUID': fields.String(default=None,description='GUID of job to call when this jobs state changes to Success'),
     'StateChangeFailJobGUID': fields.String(default=None,description='GUID of job to call when this jobs state changes to Fail'),
     'StateChangeUnknownJobGUID': fields.String(default=None,description='GUID of job to call when this jobs state changes to Unknown'),
+    'maxConcurrentExecutions': fields.Integer(default=None,description='Maximum number of Pending or Running executions this job can have (0 for no limit)'),
+    'concurrencyPolicy': fields.String(default='Queue',description='What happens to a new execution when the job is at maxConcurrentExecutions. Queue (wait for a running execution to finish), Skip (do not create the execution) or Replace (replace any Pending executions)'),
+    'timeoutSeconds': fields.Integer(default=None,description='Seconds an execution can run before it is killed. SIGTERM is sent first then SIGKILL after a grace period (0 to use the server default)'),
+    'environment': fields.Raw(default=None,description='Extra enviroment variables set for executions of this job (object mapping name to value)'),
+    'executionMode': fields.String(default='shell',description='shell to run the command with /bin/sh, exec to split the command into arguments (using shell quoting rules) and run the program directly, http to make httpRequest (command is not run)'),
+    'httpRequest': fields.Raw(default=None,description='Request made in http mode (method, url, headers, body, expectedStatus). Required in http mode and ignored otherwise'),
+    'priority': fields.Integer(default=0,description='Pending executions of jobs with a higher priority run first (can be negative). Manual runs always go before event triggered runs which go before scheduled runs'),
+    'coalescePendingExecutions': fields.Boolean(default=False,description='Scheduled and event triggered runs are merged into a Pending execution of this job if it has one instead of creating another execution. Manual runs always create an execution'),
+    'resourceLimits': fields.Raw(default=None,description='Limits applied to the jobs process (cpuSeconds, addressSpaceMB, openFiles, nice 0-19, ioClass best-effort or idle, ioLevel 0-7)'),
+    'misfirePolicy': fields.String(default='RunOnce',description='What happens when scheduled runs are later than the servers misfire threshold. RunOnce (submit one run), RunAll (submit a run for each of the most recent misfireMaxRuns missed runs) or Skip (wait for the next scheduled run)'),
+    'misfireMaxRuns': fields.Integer(default=10,description='Most missed runs submitted at once with the RunAll misfire policy (at least 1). Older missed runs are dropped'),
   })
 
 def getJobServerInfoModel(appObj):
@@ -61,6 +88,16 @@ def getJobServerInfoModel(appObj):
     'JobsLastExecutionFailed': fields.Integer(default='-1',description='Jobs where last execution failed')
   })
 
+def getJobScheduleModel(appObj):
+  return appObj.flastRestPlusAPIObject.model('JobSchedule', {
+    'guid': fields.String(default='',description='Job GUID'),
+    'repetitionInterval': fields.String(default=''),
+    'enabled': fields.Boolean(default=False,description='Runs are only made if the job is enabled'),
+    'nextRuns': fields.List(fields.DateTime(dt_format=u'iso8601'),description='Next times the repetitionInterval gives, empty if the job has none')
+  })
+
+maxScheduleCount = 1000
+
 def resetData(appObj):
   appObj.appData['jobsData']=jobsDataClass(appObj)
 
@@ -122,7 +159,18 @@ def registerAPI(appObj):
         content.get('overrideMinutesBeforeMostRecentCompletionStatusBecomesUnknown',None),
         content.get('StateChangeSuccessJobGUID',None),
         content.get('StateChangeFailJobGUID',None),
-        content.get('StateChangeUnknownJobGUID',None)
+        content.get('StateChangeUnknownJobGUID',None),
+        content.get('maxConcurrentExecutions',None),
+        content.get('concurrencyPolicy','Queue'),
+        content.get('timeoutSeconds',None),
+        content.get('environment',None),
+        content.get('executionMode','shell'),
+        content.get('httpRequest',None),
+        content.get('priority',0),
+        content.get('coalescePendingExecutions',False),
+        content.get('resourceLimits',None),
+        content.get('misfirePolicy','RunOnce'),
+        content.get('misfireMaxRuns',10)
       )
       res = appObj.appData['jobsData'].addJob(jobObj)
       if res['msg']!='OK':
@@ -181,6 +229,37 @@ def registerAPI(appObj):
       appObj.appData['jobsData'].updateJob(Job, request.get_json())
       return Job._caculatedDict(appObj)
 
+  @nsJobs.route('/<string:guid>/schedule')
+  @nsJobs.response(400, 'Job not found')
+  @nsJobs.param('guid', 'Job identifier (or name)')
+  class jobSchedule(Resource):
+    @nsJobs.doc('getjobschedule')
+    @nsJobs.param('count', 'Number of runs to return (default 10, max ' + str(maxScheduleCount) + ')')
+    @nsJobs.marshal_with(getJobScheduleModel(appObj))
+    @appObj.flastRestPlusAPIObject.response(200, 'Success')
+    def get(self, guid):
+      '''Preview the next runs of a job'''
+      jobObj = None
+      try:
+        jobObj = appObj.appData['jobsData'].getJob(guid)
+      except:
+        try:
+          jobObj = appObj.appData['jobsData'].getJobByName(guid)
+        except:
+          raise BadRequest('Invalid Job Identifier')
+      try:
+        count = int(request.args.get('count', 10))
+      except ValueError:
+        raise BadRequest('Invalid count')
+      if count < 1 or count > maxScheduleCount:
+        raise BadRequest('count must be between 1 and ' + str(maxScheduleCount))
+      return {
+        'guid': jobObj.guid,
+        'repetitionInterval': jobObj.repetitionInterval,
+        'enabled': jobObj.enabled,
+        'nextRuns': jobObj.getUpcomingRuns(appObj.getCurDateTime(), count)
+      }
+
   @nsJobs.route('/<string:guid>/execution')
   @nsJobs.response(400, 'Job not found')
   @nsJobs.param('guid', 'Job identifier (or name)')
@@ -188,12 +267,16 @@ def registerAPI(appObj):
     @nsJobs.doc('postexecution')
     @nsJobs.expect(getJobExecutionCreationModel(appObj), validate=True)
     @appObj.flastRestPlusAPIObject.response(400, 'Validation error')
+    @appObj.flastRestPlusAPIObject.response(429, 'Too many executions are waiting to run. Retry-After header gives seconds to wait')
     @appObj.flastRestPlusAPIObject.response(200, 'Success')
     @appObj.flastRestPlusAPIObject.marshal_with(getJobExecutionModel(appObj), code=200, description='Job created')
     def post(self, guid):
       '''Create Job Execution'''
       content = request.get_json()
-      return appObj.jobExecutor.submitJobForExecution(guid, content['name'], True)._caculatedDict()
+      execution = appObj.jobExecutor.submitJobForExecution(guid, content['name'], True)
+      if execution is None:
+        raise BadRequest('Job already has the maximum number of concurrent executions')
+      return execution._caculatedDict(appObj)
 
     @nsJobs.doc('getjobexecutions')
     @nsJobs.marshal_with(appObj.getResultModel(getJobExecutionModel(appObj)))
@@ -211,7 +294,7 @@ def registerAPI(appObj):
           raise BadRequest('Invalid Job Identifier')
 
       def outputJobExecution(item):
-        return item._caculatedDict()
+        return item._caculatedDict(appObj)
       def filterJobExecution(item, whereClauseText): #if multiple separated by spaces each is passed individually and anded together
         return True
       return appObj.getPaginatedResult(
@@ -2,6 +2,7 @@ from jobObj import jobClass
 
 #I need jobs to be stored in order so pagination works
 from sortedcontainers import SortedDict
+import threading
 
 from werkzeug.exceptions import BadRequest
 
@@ -15,16 +16,61 @@ class jobsDataClass():
   # map of Job name to guid
   jobs_name_lookup = None
   appObj = None
+  #Jobs that are scheduled to run keyed by (nextScheduledRun, guid). Kept up to date as jobs are added, changed,
+  # deleted and run so the jobs that are due can be found without looking at every job
+  scheduleIndex = None
+  scheduleIndexKeys = None # guid -> key of the job in scheduleIndex
+  scheduleIndexLock = None # covers scheduleIndex and scheduleIndexKeys
+  #Jobs with a Success or Fail status keyed by (resetCompletionStatusToUnknownTime, guid) so each loop
+  # iteration only looks at the jobs whose status is due to become Unknown
+  expiryIndex = None
+  expiryIndexKeys = None # guid -> key of the job in expiryIndex
+  expiryIndexLock = None # covers expiryIndex and expiryIndexKeys
 
   def __init__(self, appObj):
     self.jobs = SortedDict()
     self.jobs_name_lookup = SortedDict()
     self.appObj = appObj
+    self.scheduleIndex = SortedDict()
+    self.scheduleIndexKeys = dict()
+    self.scheduleIndexLock = threading.Lock()
+    self.expiryIndex = SortedDict()
+    self.expiryIndexKeys = dict()
+    self.expiryIndexLock = threading.Lock()
 
   #Run Job loop iteration
   def loopIteration(self, appObj, curTime):
-    for jobIdx in self.jobs:
-      self.jobs[jobIdx].loopIteration(appObj, curTime)
+    for jobObj in self._popExpiredJobs(curTime):
+      jobObj.loopIteration(appObj, curTime)
+
+  #Remove and return the jobs whose status is due to become Unknown
+  def _popExpiredJobs(self, curTime):
+    with self.expiryIndexLock:
+      #(time,) sorts before every (time, guid) key so, as in jobClass.loopIteration, a status expires once curTime is after the reset time
+      expiredCount = self.expiryIndex.bisect_left((curTime,))
+      expiredJobs = []
+      for x in range(0, expiredCount):
+        (key, jobObj) = self.expiryIndex.popitem(0)
+        del self.expiryIndexKeys[key[1]]
+        expiredJobs.append(jobObj)
+      return expiredJobs
+
+  #Called whenever the resetCompletionStatusToUnknownTime of a job changes
+  def _updateExpiryIndex(self, jobObj):
+    with self.expiryIndexLock:
+      oldKey = self.expiryIndexKeys.pop(jobObj.guid, None)
+      if oldKey is not None:
+        del self.expiryIndex[oldKey]
+      if jobObj.resetCompletionStatusToUnknownTime is not None:
+        newKey = (jobObj.resetCompletionStatusToUnknownTime, jobObj.guid)
+        self.expiryIndex[newKey] = jobObj
+        self.expiryIndexKeys[jobObj.guid] = newKey
+
+  def _removeFromExpiryIndex(self, jobGUID):
+    with self.expiryIndexLock:
+      oldKey = self.expiryIndexKeys.pop(jobGUID, None)
+      if oldKey is not None:
+        del self.expiryIndex[oldKey]
 
   def getJobServerInfo(self):
     nextJobToExecute = self.getNextJobToExecute()
@@ -72,7 +118,7 @@ class jobsDataClass():
       return {'msg': 'Job Name already in use - ' + uniqueJobName, 'guid':''}
     self.jobs[str(job.guid)] = job
     self.jobs_name_lookup[uniqueJobName] = job.guid
-    self.nextJobToExecuteCalcRequired = True
+    self._updateScheduleIndex(job)
     return {'msg': 'OK', 'guid':job.guid}
 
   def updateJob(self, jobObj, newValues):
@@ -86,24 +132,13 @@ class jobsDataClass():
     if (oldUniqueJobName not in self.jobs_name_lookup):
       raise Exception('Old Job Name does not exist')
 
-    # Only change the name lookup if there actually is a change
     if oldUniqueJobName != newUniqueJobName:
       if (newUniqueJobName in self.jobs_name_lookup):
         raise Exception('New Job Name already in use')
-      # remove old unique name lookup
-      tmpVar = self.jobs_name_lookup.pop(oldUniqueJobName)
-      if tmpVar is None:
-        raise Execption('Failed to remove old unique name')
-      # add new unique lookup
-      self.jobs_name_lookup[newUniqueJobName] = jobObj.guid
-
-    # set recaculation of repetition interval values
-    if jobObj.repetitionInterval != newValues['repetitionInterval']:
-      self.nextJobToExecuteCalcRequired = True
-    if jobObj.enabled != newValues['enabled']:
-      self.nextJobToExecuteCalcRequired = True
 
-    # change values in object to new values
+    # change values in object to new values (nothing is changed if any value is invalid)
+    # settings added after the original job fields keep their current value when they are left out
+    # as clients such as the web frontend only send the original fields
     jobObj.setNewValues(
       self.appObj,
       newValues['name'],
@@ -114,9 +149,30 @@ class jobsDataClass():
       newValues.get('overrideMinutesBeforeMostRecentCompletionStatusBecomesUnknown',None),
       newValues.get('StateChangeSuccessJobGUID',None),
       newValues.get('StateChangeFailJobGUID',None),
-      newValues.get('StateChangeUnknownJobGUID',None)
+      newValues.get('StateChangeUnknownJobGUID',None),
+      newValues.get('maxConcurrentExecutions',jobObj.maxConcurrentExecutions),
+      newValues.get('concurrencyPolicy',jobObj.concurrencyPolicy),
+      newValues.get('timeoutSeconds',jobObj.timeoutSeconds),
+      newValues.get('environment',jobObj.environment),
+      newValues.get('executionMode',jobObj.executionMode),
+      newValues.get('httpRequest',jobObj.httpRequest),
+      newValues.get('priority',jobObj.priority),
+      newValues.get('coalescePendingExecutions',jobObj.coalescePendingExecutions),
+      newValues.get('resourceLimits',jobObj.resourceLimits),
+      newValues.get('misfirePolicy',jobObj.misfirePolicy),
+      newValues.get('misfireMaxRuns',jobObj.misfireMaxRuns)
     )
 
+    # Only change the name lookup if there actually is a change
+    if oldUniqueJobName != newUniqueJobName:
+      # remove old unique name lookup
+      tmpVar = self.jobs_name_lookup.pop(oldUniqueJobName)
+      if tmpVar is None:
+        raise Execption('Failed to remove old unique name')
+      # add new unique lookup
+      self.jobs_name_lookup[newUniqueJobName] = jobObj.guid
+    self._updateScheduleIndex(jobObj)
+
   def deleteJob(self, jobObj):
     uniqueJobName = jobObj.uniqueName()
     tmpVar = self.jobs_name_lookup.pop(uniqueJobName)
@@ -125,44 +181,72 @@ class jobsDataClass():
     tmpVar2 = self.jobs.pop(jobObj.guid)
     if tmpVar2 is None:
       raise Execption('Failed to delete a job could not get it out of the jobs')
+    self._removeFromScheduleIndex(jobObj.guid)
+    self._removeFromExpiryIndex(jobObj.guid)
     # Delete any executions
     self.appObj.jobExecutor.deleteExecutionsForJob(jobObj.guid)
-    # If it is next to execute we need to recaculate
-    if self.nextJobToExecute != None:
-      if jobObj.guid == self.nextJobToExecute.guid:
-        self.nextJobToExecuteCalcRequired = True
-
-  #nextJobToExecute holds the next job scheduled to execute
-  # When ever any actions are preformed that may change this the CalcRequired flag is set to true
-  # the get function will either return or recaculate as desired
-  # Changing actions:
-  #  - Adding Job
-  #  - Delete job if it is the next to execute
-  #  - Executing a job
-  #  - Editing a job
-  # None is a valid next job to execute but when it 
-  nextJobToExecute = None
-  nextJobToExecuteCalcRequired = True
+
+  #Called whenever the nextScheduledRun of a job may have changed
+  def _updateScheduleIndex(self, jobObj):
+    with self.scheduleIndexLock:
+      oldKey = self.scheduleIndexKeys.pop(jobObj.guid, None)
+      if oldKey is not None:
+        del self.scheduleIndex[oldKey]
+      if jobObj.nextScheduledRun is not None:
+        newKey = (jobObj.nextScheduledRun, jobObj.guid)
+        self.scheduleIndex[newKey] = jobObj
+        self.scheduleIndexKeys[jobObj.guid] = newKey
+    self._wakeScheduler()
+
+  #The executors main loop sleeps until the next job is due so it is woken when schedules or statuses change
+  def _wakeScheduler(self):
+    if self.appObj.jobExecutor is not None:
+      self.appObj.jobExecutor.wakeScheduler()
+
+  def _removeFromScheduleIndex(self, jobGUID):
+    with self.scheduleIndexLock:
+      oldKey = self.scheduleIndexKeys.pop(jobGUID, None)
+      if oldKey is not None:
+        del self.scheduleIndex[oldKey]
+
+  #Job with the earliest next scheduled run or None if no jobs are scheduled
   def getNextJobToExecute(self):
-    if not self.nextJobToExecuteCalcRequired:
-      return self.nextJobToExecute
-    self.nextJobToExecute = None
-    for jobIdx in self.jobs:
-      if self.jobs[jobIdx].nextScheduledRun is not None:
-        if self.nextJobToExecute is None:
-          self.nextJobToExecute = self.jobs[jobIdx]
-        else:
-          if self.jobs[jobIdx].nextScheduledRun < self.nextJobToExecute.nextScheduledRun:
-            self.nextJobToExecute = self.jobs[jobIdx]
-    self.nextJobToExecuteCalcRequired = False
-    return self.nextJobToExecute
+    with self.scheduleIndexLock:
+      if len(self.scheduleIndex) == 0:
+        return None
+      return self.scheduleIndex.peekitem(0)[1]
+
+  #Jobs that were scheduled to run before curTime, earliest first
+  def getDueJobs(self, curTime):
+    with self.scheduleIndexLock:
+      #(time,) sorts before every (time, guid) key so jobs due exactly at curTime are not included
+      dueCount = self.scheduleIndex.bisect_left((curTime.isoformat(),))
+      return [self.scheduleIndex[key] for key in self.scheduleIndex.islice(0, dueCount)]
+
+  #Work out when a job runs next after it has been submitted
+  def setNextScheduledRun(self, jobObj, curTime, nextRunsByInterval=None):
+    jobObj.setNextScheduledRun(curTime, nextRunsByInterval)
+    self._updateScheduleIndex(jobObj)
 
   def registerRunDetails(self, jobGUID, newLastRunDate, newLastRunReturnCode, triggerExecutionObj):
-    self.jobs[str(jobGUID)].registerRunDetails(self.appObj, newLastRunDate, newLastRunReturnCode, triggerExecutionObj)
+    jobObj = self.jobs.get(str(jobGUID), None)
+    if jobObj is None:
+      return # the job was deleted while the execution was running
+    jobObj.registerRunDetails(self.appObj, newLastRunDate, newLastRunReturnCode, triggerExecutionObj)
+    self._updateExpiryIndex(jobObj)
+    self._wakeScheduler()
+
+  #Earliest time a job status is due to become Unknown or None if no job has a Success or Fail status
+  def getNextCompletionStatusExpiry(self):
+    with self.expiryIndexLock:
+      if len(self.expiryIndex) == 0:
+        return None
+      return self.expiryIndex.peekitem(0)[0][0]
 
   #funciton for testing allowing us to pretend it is currently a different time
+  # jobs share a next run time with every other job with the same interval
   def recaculateExecutionTimesBasedonNewTime(self, curTime):
+    nextRunsByInterval = dict()
     for jobIdx in self.jobs:
-      self.jobs[jobIdx].setNextScheduledRun(curTime)
-    self.nextJobToExecuteCalcRequired = True
+      self.setNextScheduledRun(self.jobs[jobIdx], curTime, nextRunsByInterval)
 
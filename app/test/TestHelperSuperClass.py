@@ -29,6 +29,9 @@ class testHelperSuperClass(unittest.TestCase):
     result['nextScheduledRun'] = expectedResult['nextScheduledRun']
     result['creationDate'] = expectedResult['creationDate']
     result['lastUpdateDate'] = expectedResult['lastUpdateDate']
+    #measured resource usage varies from run to run
+    for measuredField in ['totalDurationSeconds', 'totalUserCPUSeconds', 'totalSystemCPUSeconds', 'peakMaxRSSKB']:
+      result[measuredField] = expectedResult[measuredField]
     self.assertJSONStringsEqual(result, expectedResult);
 
   def checkGotRightException(self, context, ExpectedException):
@@ -33,6 +33,22 @@ data_simpleJobCreateExpRes = {
   "StateChangeFailJobNAME": None,
   "StateChangeUnknownJobGUID": None,
   "StateChangeUnknownJobNAME": None,
+  "maxConcurrentExecutions": None,
+  "concurrencyPolicy": "Queue",
+  "timeoutSeconds": None,
+  "environment": None,
+  "executionMode": "shell",
+  "httpRequest": None,
+  "priority": 0,
+  "coalescePendingExecutions": False,
+  "resourceLimits": None,
+  "misfirePolicy": "RunOnce",
+  "misfireMaxRuns": 10,
+  "measuredExecutions": 0,
+  "totalDurationSeconds": 0.0,
+  "totalUserCPUSeconds": 0.0,
+  "totalSystemCPUSeconds": 0.0,
+  "peakMaxRSSKB": None,
 }
 
 data_simpleManualJobCreateParamsWithAllOptionalFields = dict(data_simpleJobCreateParams)
@@ -58,7 +74,14 @@ data_simpleJobExecutionCreateExpRes = {
   "manual": True, 
   "dateCreated": 'IGNORE', 
   "dateStarted": 'IGNORE', 
-  "dateCompleted": 'IGNORE' 
+  "dateCompleted": 'IGNORE',
+  "queuePosition": 1,
+  "coalescedCount": 0,
+  "schedulingDelaySeconds": None,
+  "durationSeconds": None,
+  "userCPUSeconds": None,
+  "systemCPUSeconds": None,
+  "maxRSSKB": None
 }
 
 
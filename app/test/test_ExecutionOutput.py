@@ -0,0 +1,93 @@
+#tests for ExecutionOutput
+from TestHelperSuperClass import testHelperSuperClass
+from ExecutionOutput import ExecutionOutputClass
+import os
+import tempfile
+import uuid
+
+class test_ExecutionOutput(testHelperSuperClass):
+  def _getSpoolFileName(self):
+    return os.path.join(tempfile.gettempdir(), 'test_ExecutionOutput_' + str(uuid.uuid4()) + '.out')
+
+  def test_smallOutputKeptInFull(self):
+    a = ExecutionOutputClass(100, self._getSpoolFileName())
+    a.write(b'Hello ')
+    a.write(b'World')
+    a.close()
+    self.assertFalse(a.isTruncated())
+    self.assertEqual(a.getValue(), b'Hello World')
+    self.assertFalse(os.path.isfile(a.spoolFileName))
+
+  def test_outputExactlyMaxBytesIsNotTruncated(self):
+    a = ExecutionOutputClass(10, self._getSpoolFileName())
+    a.write(b'0123456789')
+    self.assertFalse(a.isTruncated())
+    self.assertEqual(a.getValue(), b'0123456789')
+
+  def test_largeOutputKeepsHeadAndTailAndSpoolsEverything(self):
+    spoolFileName = self._getSpoolFileName()
+    a = ExecutionOutputClass(10, spoolFileName)
+    expectedFullOutput = b''
+    for x in range(0, 100):
+      chunk = ('<' + str(x) + '>').encode()
+      expectedFullOutput += chunk
+      a.write(chunk)
+    a.close()
+    self.assertTrue(a.isTruncated())
+    self.assertEqual(a.totalBytes, len(expectedFullOutput))
+    self.assertEqual(len(a.head), 5)
+    self.assertEqual(len(a.tail), 5)
+    value = a.getValue()
+    self.assertTrue(value.startswith(expectedFullOutput[:5]))
+    self.assertTrue(value.endswith(expectedFullOutput[-5:]))
+    self.assertTrue(b'bytes of output truncated' in value)
+    with open(spoolFileName, 'rb') as f:
+      self.assertEqual(f.read(), expectedFullOutput)
+    a.remove()
+    self.assertFalse(os.path.isfile(spoolFileName))
+
+  def test_spoolFileIsOnlyReadableByItsOwner(self):
+    a = ExecutionOutputClass(10, self._getSpoolFileName())
+    a.write(b'0123456789abcdefghij')
+    a.close()
+    self.assertEqual(os.stat(a.spoolFileName).st_mode & 0o777, 0o600)
+    a.remove()
+
+  def test_truncatedOutputDoesNotSplitUTF8Characters(self):
+    a = ExecutionOutputClass(10, self._getSpoolFileName())
+    a.write(('abcdé' + ('x' * 50) + 'éé').encode())
+    a.remove()
+    value = a.getValue().decode()
+    self.assertTrue(value.startswith('abcd'))
+    self.assertTrue(value.endswith('é'))
+
+  def test_spoolFileFailureStillKeepsHeadAndTail(self):
+    a = ExecutionOutputClass(10, os.path.join(self._getSpoolFileName(), 'notADirectory', 'x.out'))
+    a.write(b'0123456789abcdefghij')
+    a.close()
+    self.assertTrue(a.isTruncated())
+    self.assertEqual(a.getValue(), b'01234\n...[10 bytes of output truncated]...\nfghij')
+
+  def test_readByOffsetFromHeadSpoolAndTail(self):
+    a = ExecutionOutputClass(10, self._getSpoolFileName())
+    a.write(b'0123456789abcdefghij')
+    self.assertEqual(a.read(0, 100), (0, b'01234'))
+    self.assertEqual(a.read(3, 1), (3, b'3'))
+    self.assertEqual(a.read(5, 100), (5, b'56789abcde'))
+    self.assertEqual(a.read(15, 100), (15, b'fghij'))
+    self.assertEqual(a.read(20, 100), (20, b''))
+    a.remove()
+
+  def test_readSkipsOutputThatIsNoLongerAvailable(self):
+    a = ExecutionOutputClass(10, None)
+    a.write(b'0123456789abcdefghij')
+    self.assertEqual(a.read(7, 100), (15, b'fghij'))
+
+  def test_waitForOutput(self):
+    a = ExecutionOutputClass(10, None)
+    self.assertTrue(a.waitForOutput(0, 0.01))
+    a.write(b'abc')
+    self.assertTrue(a.waitForOutput(0, 0.01))
+    a.close()
+    self.assertTrue(a.waitForOutput(2, 0.01))
+    self.assertFalse(a.waitForOutput(3, 0.01))
@@ -0,0 +1,157 @@
+from TestHelperSuperClass import testHelperAPIClient
+from HTTPJob import HTTPJobRunnerClass, normaliseHTTPRequest
+from ExecutionOutput import ExecutionOutputClass
+from appObj import appObj
+from commonJSONStrings import data_simpleManualJobCreateParams
+import json
+import threading
+import socket
+import time
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from socketserver import ThreadingMixIn
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+  daemon_threads = True
+
+#Local stand in server. Records the client port of every request so tests can see if connections were reused
+class testRequestHandler(BaseHTTPRequestHandler):
+  protocol_version = 'HTTP/1.1'
+
+  def log_message(self, format, *args):
+    pass
+
+  def do_GET(self):
+    self.server.clientPorts.append(self.client_address[1])
+    if self.path == '/slow':
+      time.sleep(2)
+    status = 200
+    if self.path == '/missing':
+      status = 404
+    body = ('GET ' + self.path).encode()
+    if self.path == '/large':
+      body = b'a' * 10000
+    self.send_response(status)
+    self.send_header('Content-Length', str(len(body)))
+    self.end_headers()
+    self.wfile.write(body)
+
+  def do_POST(self):
+    self.server.clientPorts.append(self.client_address[1])
+    body = self.rfile.read(int(self.headers['Content-Length']))
+    body = ('POST ' + self.headers['X-Test'] + ' ').encode() + body
+    self.send_response(201)
+    self.send_header('Content-Length', str(len(body)))
+    self.end_headers()
+    self.wfile.write(body)
+
+class test_HTTPJob(testHelperAPIClient):
+  server = None
+  baseURL = None
+
+  def setUp(self):
+    super(test_HTTPJob, self).setUp()
+    self.server = ThreadingHTTPServer(('127.0.0.1', 0), testRequestHandler)
+    self.server.clientPorts = []
+    serverThread = threading.Thread(target=self.server.serve_forever)
+    serverThread.daemon = True
+    serverThread.start()
+    self.baseURL = 'http://127.0.0.1:' + str(self.server.server_address[1])
+
+  def tearDown(self):
+    self.server.shutdown()
+    self.server.server_close()
+    super(test_HTTPJob, self).tearDown()
+
+  def runRequest(self, runner, httpRequest, timeout=5, maxBodyBytes=1024):
+    outputBuffer = ExecutionOutputClass(1024 * 1024, None)
+    returncode = runner.execute(normaliseHTTPRequest(httpRequest), outputBuffer, timeout, maxBodyBytes)
+    outputBuffer.close()
+    return (returncode, outputBuffer.getValue().decode())
+
+  def test_GetRequest(self):
+    runner = HTTPJobRunnerClass(2)
+    (returncode, output) = self.runRequest(runner, {'url': self.baseURL + '/ping?a=b'})
+    self.assertEqual(returncode, 0)
+    self.assertEqual(output, 'HTTP 200 OK\nGET /ping?a=b')
+
+  def test_UnexpectedStatusReturnsStatusCode(self):
+    runner = HTTPJobRunnerClass(2)
+    (returncode, output) = self.runRequest(runner, {'url': self.baseURL + '/missing'})
+    self.assertEqual(returncode, 404)
+    (returncode, output) = self.runRequest(runner, {'url': self.baseURL + '/missing', 'expectedStatus': 404})
+    self.assertEqual(returncode, 0)
+
+  def test_PostWithHeadersAndBody(self):
+    runner = HTTPJobRunnerClass(2)
+    (returncode, output) = self.runRequest(runner, {'url': self.baseURL + '/', 'method': 'post', 'headers': {'X-Test': 'hdr'}, 'body': 'content'})
+    self.assertEqual(returncode, 0)
+    self.assertEqual(output, 'HTTP 201 Created\nPOST hdr content')
+
+  def test_ConnectionsAreReused(self):
+    runner = HTTPJobRunnerClass(2)
+    for x in range(0, 5):
+      (returncode, output) = self.runRequest(runner, {'url': self.baseURL + '/ping'})
+      self.assertEqual(returncode, 0)
+    self.assertEqual(len(self.server.clientPorts), 5)
+    self.assertEqual(len(set(self.server.clientPorts)), 1)
+
+  def test_ClosedConnectionIsReplaced(self):
+    runner = HTTPJobRunnerClass(2)
+    self.runRequest(runner, {'url': self.baseURL + '/ping'})
+    #simulate the server dropping the idle connection
+    for key in runner.connectionPool.idleConnections:
+      for conn in runner.connectionPool.idleConnections[key]:
+        (clientEnd, serverEnd) = socket.socketpair()
+        serverEnd.close()
+        conn.sock.close()
+        conn.sock = clientEnd
+    (returncode, output) = self.runRequest(runner, {'url': self.baseURL + '/ping'})
+    self.assertEqual(returncode, 0)
+    self.assertEqual(output, 'HTTP 200 OK\nGET /ping')
+
+  def test_LargeBodyIsTruncated(self):
+    runner = HTTPJobRunnerClass(2)
+    (returncode, output) = self.runRequest(runner, {'url': self.baseURL + '/large'}, maxBodyBytes=100)
+    self.assertEqual(returncode, 0)
+    self.assertEqual(output, 'HTTP 200 OK\n' + 'a' * 100 + '\n...[response body truncated]...')
+    #partly read connection is not reused
+    self.assertEqual(runner.connectionPool.idleConnections.get(('http', '127.0.0.1', self.server.server_address[1]), []), [])
+
+  def test_RequestTimeout(self):
+    runner = HTTPJobRunnerClass(2)
+    (returncode, output) = self.runRequest(runner, {'url': self.baseURL + '/slow'}, timeout=0.5)
+    self.assertEqual(returncode, -1)
+
+  def test_ConnectionRefused(self):
+    runner = HTTPJobRunnerClass(2)
+    (returncode, output) = self.runRequest(runner, {'url': 'http://127.0.0.1:1/'})
+    self.assertEqual(returncode, 1)
+    self.assertTrue('Request failed' in output)
+
+  def test_InvalidHTTPRequests(self):
+    for invalid in [{}, {'url': 'ftp://abc/'}, {'url': self.baseURL, 'method': 'BAD'}, {'url': self.baseURL, 'headers': {'a': 1}}, {'url': self.baseURL, 'expectedStatus': 'a'}]:
+      with self.assertRaises(ValueError):
+        normaliseHTTPRequest(invalid)
+
+  def test_HTTPJobThroughAPI(self):
+    jc = dict(data_simpleManualJobCreateParams)
+    jc['command'] = ''
+    jc['executionMode'] = 'http'
+    jc['httpRequest'] = {'url': self.baseURL + '/health'}
+    result = self.testClient.post('/api/jobs/', data=json.dumps(jc), content_type='application/json')
+    self.assertResponseCodeEqual(result, 200)
+    resultJSON = json.loads(result.get_data(as_text=True))
+    self.assertEqual(resultJSON['httpRequest'], {'method': 'GET', 'url': self.baseURL + '/health', 'headers': {}, 'body': None, 'expectedStatus': None})
+    executionGUID = self.addExecution(resultJSON['guid'], 'Execution001')['guid']
+    appObj.jobExecutor.loopIteration(appObj.getCurDateTime())
+    result = self.testClient.get('/api/executions/' + executionGUID)
+    resultJSON = json.loads(result.get_data(as_text=True))
+    self.assertEqual(resultJSON['stage'], 'Completed')
+    self.assertEqual(resultJSON['resultReturnCode'], 0)
+    self.assertEqual(resultJSON['resultSTDOUT'], 'HTTP 200 OK\nGET /health')
+
+  def test_HTTPJobWithoutRequestFails(self):
+    jc = dict(data_simpleManualJobCreateParams)
+    jc['executionMode'] = 'http'
+    result = self.testClient.post('/api/jobs/', data=json.dumps(jc), content_type='application/json')
+    self.assertResponseCodeEqual(result, 400)
@@ -54,6 +54,24 @@ class test_JobExecution(testHelperAPIClient):
     self.assertTimeCloseToCurrent(a.dateStarted)
     self.assertTimeCloseToCurrent(a.dateCompleted)
 
+  def test_outputIsOnlyHeldInTheOutputBuffer(self):
+    jobObj = self.createJobObj()
+    a = self._getJobExecutionObj(jobObj)
+    a.execute(appObj.jobExecutor, self.aquireJobExecutionLock, self.releaseJobExecutionLock, self.registerRunDetails, appObj)
+    self.assertNotIn('resultSTDOUT', a.__dict__)
+    self.assertEqual(a.outputBuffer.getValue(), b'This is a test\n')
+    self.assertEqual(a.resultSTDOUT, 'This is a test')
+
+  def test_runRecordsResourceUsage(self):
+    jobObj = self.createJobObj(command='i=0; while [ $i -lt 20000 ]; do i=$((i+1)); done')
+    a = self._getJobExecutionObj(jobObj)
+    a.execute(appObj.jobExecutor, self.aquireJobExecutionLock, self.releaseJobExecutionLock, self.registerRunDetails, appObj)
+    self.assertEqual(a.stage, 'Completed')
+    self.assertGreater(a.durationSeconds, 0)
+    self.assertGreater(a.userCPUSeconds + a.systemCPUSeconds, 0)
+    self.assertLessEqual(a.userCPUSeconds + a.systemCPUSeconds, a.durationSeconds + 0.1)
+    self.assertGreater(a.maxRSSKB, 0)
+
   #Time consuming tests commented out
   #def test_timeout(self):
   #  jobObj = jobClass('TestJob123', 'sleep 5', True, '')
@@ -89,7 +107,13 @@ class test_JobExecution(testHelperAPIClient):
       'resultReturnCode': None,
       'resultSTDOUT': None,
       'executionName': 'TestExecutionName',
-      'manual': False
+      'manual': False,
+      'coalescedCount': 0,
+      'schedulingDelaySeconds': None,
+      'durationSeconds': None,
+      'userCPUSeconds': None,
+      'systemCPUSeconds': None,
+      'maxRSSKB': None
     }
     expCompleted = dict(expPending)
     expCompleted['resultSTDOUT'] = 'This is a test'
@@ -97,6 +121,8 @@ class test_JobExecution(testHelperAPIClient):
     expCompleted['dateStarted'] = 'OVERRIDE'
     expCompleted['dateCompleted'] = 'OVERRIDE'
     expCompleted['resultReturnCode'] = 0
+    for measuredField in ['durationSeconds', 'userCPUSeconds', 'systemCPUSeconds', 'maxRSSKB']:
+      expCompleted[measuredField] = 'OVERRIDE'
     a = self._getJobExecutionObj(jobObj)
     resDict = dict(a._caculatedDict())
     tim = from_iso8601(a.dateCreated)
@@ -110,6 +136,9 @@ class test_JobExecution(testHelperAPIClient):
     resDict['dateStarted'] = 'OVERRIDE'
     resDict['dateCompleted'] = 'OVERRIDE'
     resDict['guid'] = 'OVERRIDE'
+    for measuredField in ['durationSeconds', 'userCPUSeconds', 'systemCPUSeconds', 'maxRSSKB']:
+      self.assertNotEqual(resDict[measuredField], None)
+      resDict[measuredField] = 'OVERRIDE'
     tim = from_iso8601(a.dateStarted)
     self.assertTimeCloseToCurrent(tim)
     tim = from_iso8601(a.dateCompleted)
@@ -1,9 +1,16 @@
-from TestHelperSuperClass import testHelperAPIClient
+from TestHelperSuperClass import testHelperAPIClient, env
 from JobExecutor import JobExecutorClass
 from JobExecution import SimpleJobExecutionClass
 import os
 from appObj import appObj
 import uuid
+import json
+import time
+import threading
+from baseapp_for_restapi_backend_with_swagger import from_iso8601
+from commonJSONStrings import data_simpleManualJobCreateParams, data_simpleJobCreateParams
+import datetime
+import pytz
 
 
 class test_appObjClass(testHelperAPIClient):
@@ -54,5 +61,482 @@ class test_appObjClass(testHelperAPIClient):
     appObj.jobExecutor.stopThreadRunning()
     testClient = None
 
+  def waitForExecutionsToComplete(self, executionGUIDs, maxWait=10):
+    start_time = time.time()
+    while (time.time() - start_time) < maxWait:
+      completed = 0
+      for curGUID in executionGUIDs:
+        if appObj.jobExecutor.getJobExecutionStatus(curGUID).stage != 'Pending':
+          if appObj.jobExecutor.getJobExecutionStatus(curGUID).dateCompleted is not None:
+            completed += 1
+      if completed == len(executionGUIDs):
+        return
+      time.sleep(0.05)
+    self.assertTrue(False, msg='Executions did not complete in time')
 
+  def test_ExecutionsRunConcurrently(self):
+    concurrentEnv = dict(env)
+    concurrentEnv['APIAPP_MAXCONCURRENTJOBS'] = '2'
+    appObj.init(concurrentEnv, self.standardStartupTime)
+    self.testClient = appObj.flaskAppObject.test_client()
 
+    jc = dict(data_simpleManualJobCreateParams)
+    jc['command'] = 'sleep 1'
+    result = self.testClient.post('/api/jobs/', data=json.dumps(jc), content_type='application/json')
+    self.assertResponseCodeEqual(result, 200)
+    jobGUID = json.loads(result.get_data(as_text=True))['guid']
+
+    executionGUIDs = [
+      self.addExecution(jobGUID, 'Execution001')['guid'],
+      self.addExecution(jobGUID, 'Execution002')['guid']
+    ]
+    self.waitForExecutionsToComplete(executionGUIDs)
+    self.assertEqual(len(appObj.jobExecutor.workers), 2)
+
+    first = appObj.jobExecutor.getJobExecutionStatus(executionGUIDs[0])
+    second = appObj.jobExecutor.getJobExecutionStatus(executionGUIDs[1])
+    self.assertEqual(first.stage, 'Completed')
+    self.assertEqual(second.stage, 'Completed')
+    #Second execution must have started before the first one finished
+    self.assertLess(from_iso8601(second.dateStarted), from_iso8601(first.dateCompleted))
+
+  def test_InvalidMaxConcurrentJobs(self):
+    for invalidValue in ['0', 'abc']:
+      badEnv = dict(env)
+      badEnv['APIAPP_MAXCONCURRENTJOBS'] = invalidValue
+      with self.assertRaises(Exception) as context:
+        appObj.init(badEnv, self.standardStartupTime, testingMode = True)
+      self.assertTrue('APIAPP_MAXCONCURRENTJOBS' in str(context.exception))
+
+  def test_JobEnviromentAllowList(self):
+    serverEnviroment = {'PATH': '/bin', 'LANG': 'C', 'LC_ALL': 'C', 'APIAPP_SECRET': 'x'}
+    jobEnv = appObj.jobExecutor.buildBaseJobEnviroment(serverEnviroment, ['PATH', 'LC_*'])
+    self.assertEqual(jobEnv, {'PATH': '/bin', 'LC_ALL': 'C'})
+    self.assertEqual(appObj.jobExecutor.buildBaseJobEnviroment(serverEnviroment, None), serverEnviroment)
+
+  def test_JobEnviromentAllowListFromEnv(self):
+    os.environ['APIAPP_TESTJOBSECRET'] = 'secret'
+    try:
+      allowListEnv = dict(env)
+      allowListEnv['APIAPP_JOBENVALLOWLIST'] = 'PATH, HOME'
+      appObj.init(allowListEnv, self.standardStartupTime, testingMode = True)
+      res = appObj.jobExecutor.executeCommand(SimpleJobExecutionClass('echo "${APIAPP_TESTJOBSECRET}x"'))
+      self.assertEqual(res.stdout.decode(), 'x\n')
+      self.assertFalse('APIAPP_TESTJOBSECRET' in appObj.jobExecutor.baseJobEnviroment)
+      self.assertTrue('PATH' in appObj.jobExecutor.baseJobEnviroment)
+    finally:
+      del os.environ['APIAPP_TESTJOBSECRET']
+
+  def test_MaxConcurrentExecutionsForJobIsRespectedByWorkers(self):
+    concurrentEnv = dict(env)
+    concurrentEnv['APIAPP_MAXCONCURRENTJOBS'] = '2'
+    appObj.init(concurrentEnv, self.standardStartupTime)
+    self.testClient = appObj.flaskAppObject.test_client()
+
+    jc = dict(data_simpleManualJobCreateParams)
+    jc['command'] = 'sleep 0.5'
+    jc['maxConcurrentExecutions'] = 1
+    jc['concurrencyPolicy'] = 'Queue'
+    result = self.testClient.post('/api/jobs/', data=json.dumps(jc), content_type='application/json')
+    self.assertResponseCodeEqual(result, 200)
+    jobGUID = json.loads(result.get_data(as_text=True))['guid']
+
+    executionGUIDs = [
+      self.addExecution(jobGUID, 'Execution001')['guid'],
+      self.addExecution(jobGUID, 'Execution002')['guid']
+    ]
+    self.waitForExecutionsToComplete(executionGUIDs)
+
+    first = appObj.jobExecutor.getJobExecutionStatus(executionGUIDs[0])
+    second = appObj.jobExecutor.getJobExecutionStatus(executionGUIDs[1])
+    self.assertEqual(first.stage, 'Completed')
+    self.assertEqual(second.stage, 'Completed')
+    #Executions must not overlap even though a worker was free (either one may have been picked up first)
+    if from_iso8601(first.dateStarted) > from_iso8601(second.dateStarted):
+      first, second = second, first
+    self.assertGreaterEqual(from_iso8601(second.dateStarted), from_iso8601(first.dateCompleted))
+
+  def test_ShortJobHasNoPollingDelay(self):
+    start_time = time.monotonic()
+    res = appObj.jobExecutor.executeCommand(SimpleJobExecutionClass('true'))
+    elapsed_time = time.monotonic() - start_time
+    self.assertEqual(res.returncode, 0)
+    self.assertLess(elapsed_time, 0.15)
+
+  def test_TimeoutKillsJob(self):
+    appObj.jobExecutor.timeout = 1
+    start_time = time.monotonic()
+    res = appObj.jobExecutor.executeCommand(SimpleJobExecutionClass('echo "Started"; sleep 5'))
+    elapsed_time = time.monotonic() - start_time
+    self.assertLess(elapsed_time, 2.5)
+    self.assertEqual(res.returncode, -1)
+    self.assertEqual(res.stdout.decode(), 'Started\n')
+
+  def test_JobIgnoringSIGTERMIsKilledAfterGracePeriod(self):
+    appObj.jobExecutor.timeout = 1
+    appObj.jobExecutor.killGracePeriod = 1
+    start_time = time.monotonic()
+    res = appObj.jobExecutor.executeCommand(SimpleJobExecutionClass('trap "" TERM; echo "Started"; sleep 10'))
+    elapsed_time = time.monotonic() - start_time
+    self.assertGreater(elapsed_time, 1.9)
+    self.assertLess(elapsed_time, 3.5)
+    self.assertEqual(res.returncode, -1)
+    self.assertEqual(res.stdout.decode(), 'Started\n')
+
+  def test_OutputLargerThanPipeBufferDoesNotBlock(self):
+    res = appObj.jobExecutor.executeCommand(SimpleJobExecutionClass('head -c 200000 /dev/zero | tr "\\0" "a"'))
+    self.assertEqual(res.returncode, 0)
+    self.assertEqual(len(res.stdout), 200000)
+
+  def test_LargeOutputIsTruncatedAndSpooled(self):
+    appObj.jobExecutor.maxJobOutputBytes = 1000
+    execution = SimpleJobExecutionClass('head -c 200000 /dev/zero | tr "\\0" "a"')
+    res = appObj.jobExecutor.executeCommand(execution)
+    self.assertEqual(res.returncode, 0)
+    self.assertLess(len(res.stdout), 2000)
+    self.assertTrue(res.stdout.startswith(b'a' * 500))
+    self.assertTrue(res.stdout.endswith(b'a' * 500))
+    spoolFileName = execution.outputBuffer.spoolFileName
+    self.assertEqual(os.path.getsize(spoolFileName), 200000)
+    execution.outputBuffer.remove()
+    self.assertFalse(os.path.isfile(spoolFileName))
+
+  def test_SpoolDirIsPrivateAndLeftoverSpoolFilesAreRemoved(self):
+    spoolDir = appObj.jobExecutor.jobOutputSpoolDir
+    os.chmod(spoolDir, 0o755)
+    leftoverFileName = os.path.join(spoolDir, str(uuid.uuid4()) + '.out')
+    with open(leftoverFileName, 'wb') as f:
+      f.write(b'output from before a restart')
+    appObj.init(env, self.standardStartupTime, testingMode = True)
+    self.assertEqual(os.stat(spoolDir).st_mode & 0o777, 0o700)
+    self.assertFalse(os.path.isfile(leftoverFileName))
+
+  def _createJob(self, name, priority=0):
+    jc = dict(data_simpleManualJobCreateParams)
+    jc['name'] = name
+    jc['priority'] = priority
+    result = self.testClient.post('/api/jobs/', data=json.dumps(jc), content_type='application/json')
+    self.assertResponseCodeEqual(result, 200)
+    resultJSON = json.loads(result.get_data(as_text=True))
+    self.assertEqual(resultJSON['priority'], priority)
+    return resultJSON['guid']
+
+  def _getQueuePosition(self, executionGUID):
+    result = self.testClient.get('/api/executions/' + executionGUID)
+    self.assertResponseCodeEqual(result, 200)
+    return json.loads(result.get_data(as_text=True))['queuePosition']
+
+  def test_ManualExecutionsRunBeforeEventAndScheduledExecutions(self):
+    jobGUID = self._createJob('PriorityTestJob')
+    jobObj = appObj.appData['jobsData'].getJob(jobGUID)
+    scheduled = appObj.jobExecutor.submitJobForExecution(jobGUID, 'Scheduled', False)
+    event = appObj.jobExecutor.submitJobForExecution(jobGUID, 'Event', False, triggerJobObj=jobObj)
+    manual = self.addExecution(jobGUID, 'Manual')
+    self.assertEqual(self._getQueuePosition(manual['guid']), 1)
+    self.assertEqual(self._getQueuePosition(event.guid), 2)
+    self.assertEqual(self._getQueuePosition(scheduled.guid), 3)
+
+    appObj.jobExecutor.loopIteration(appObj.getCurDateTime())
+    self.assertEqual(appObj.jobExecutor.getJobExecutionStatus(manual['guid']).stage, 'Completed')
+    self.assertEqual(appObj.jobExecutor.getJobExecutionStatus(event.guid).stage, 'Pending')
+    self.assertEqual(self._getQueuePosition(manual['guid']), None)
+    self.assertEqual(self._getQueuePosition(event.guid), 1)
+    appObj.jobExecutor.loopIteration(appObj.getCurDateTime())
+    self.assertEqual(appObj.jobExecutor.getJobExecutionStatus(event.guid).stage, 'Completed')
+    self.assertEqual(appObj.jobExecutor.getJobExecutionStatus(scheduled.guid).stage, 'Pending')
+
+  def test_HigherPriorityJobsRunFirst(self):
+    lowGUID = self._createJob('LowPriorityJob', 0)
+    highGUID = self._createJob('HighPriorityJob', 10)
+    low1 = self.addExecution(lowGUID, 'Low1')
+    low2 = self.addExecution(lowGUID, 'Low2')
+    high = self.addExecution(highGUID, 'High')
+    self.assertEqual(self._getQueuePosition(high['guid']), 1)
+    self.assertEqual(self._getQueuePosition(low1['guid']), 2)
+    self.assertEqual(self._getQueuePosition(low2['guid']), 3)
+    appObj.jobExecutor.loopIteration(appObj.getCurDateTime())
+    self.assertEqual(appObj.jobExecutor.getJobExecutionStatus(high['guid']).stage, 'Completed')
+    self.assertEqual(appObj.jobExecutor.getJobExecutionStatus(low1['guid']).stage, 'Pending')
+
+  def test_DeletedExecutionIsRemovedFromQueue(self):
+    jobGUID = self._createJob('PriorityTestJob')
+    first = self.addExecution(jobGUID, 'First')
+    second = self.addExecution(jobGUID, 'Second')
+    self.assertEqual(self._getQueuePosition(second['guid']), 2)
+    appObj.jobExecutor.deleteExecution(first['guid'])
+    self.assertEqual(self._getQueuePosition(second['guid']), 1)
+
+  def _createCoalescingJob(self, coalescePendingExecutions):
+    jc = dict(data_simpleManualJobCreateParams)
+    jc['coalescePendingExecutions'] = coalescePendingExecutions
+    result = self.testClient.post('/api/jobs/', data=json.dumps(jc), content_type='application/json')
+    self.assertResponseCodeEqual(result, 200)
+    resultJSON = json.loads(result.get_data(as_text=True))
+    self.assertEqual(resultJSON['coalescePendingExecutions'], coalescePendingExecutions)
+    return resultJSON['guid']
+
+  def test_ScheduledAndEventRunsAreCoalesced(self):
+    jobGUID = self._createCoalescingJob(True)
+    jobObj = appObj.appData['jobsData'].getJob(jobGUID)
+    first = appObj.jobExecutor.submitJobForExecution(jobGUID, 'Scheduled', False)
+    second = appObj.jobExecutor.submitJobForExecution(jobGUID, 'Scheduled', False)
+    third = appObj.jobExecutor.submitJobForExecution(jobGUID, 'Event', False, triggerJobObj=jobObj)
+    self.assertEqual(second.guid, first.guid)
+    self.assertEqual(third.guid, first.guid)
+    self.assertEqual(len(appObj.jobExecutor.getAllJobExecutions(jobGUID)), 1)
+    result = self.testClient.get('/api/executions/' + first.guid)
+    self.assertEqual(json.loads(result.get_data(as_text=True))['coalescedCount'], 2)
+
+    #manual runs are never coalesced
+    self.addExecution(jobGUID, 'Manual')
+    self.assertEqual(len(appObj.jobExecutor.getAllJobExecutions(jobGUID)), 2)
+
+    #once the execution has started a new one is created
+    appObj.jobExecutor.loopIteration(appObj.getCurDateTime())
+    appObj.jobExecutor.loopIteration(appObj.getCurDateTime())
+    fourth = appObj.jobExecutor.submitJobForExecution(jobGUID, 'Scheduled', False)
+    self.assertNotEqual(fourth.guid, first.guid)
+    self.assertEqual(fourth.coalescedCount, 0)
+
+  def test_RunsAreNotCoalescedByDefault(self):
+    jobGUID = self._createCoalescingJob(False)
+    first = appObj.jobExecutor.submitJobForExecution(jobGUID, 'Scheduled', False)
+    second = appObj.jobExecutor.submitJobForExecution(jobGUID, 'Scheduled', False)
+    self.assertNotEqual(second.guid, first.guid)
+    self.assertEqual(len(appObj.jobExecutor.getAllJobExecutions(jobGUID)), 2)
+
+  def _initWithPendingLimits(self, maxPending, maxPendingPerJob):
+    limitEnv = dict(env)
+    limitEnv['APIAPP_MAXPENDINGEXECUTIONS'] = str(maxPending)
+    limitEnv['APIAPP_MAXPENDINGEXECUTIONSPERJOB'] = str(maxPendingPerJob)
+    appObj.init(limitEnv, self.standardStartupTime, testingMode = True)
+
+  def _postExecution(self, jobGUID, name):
+    return self.testClient.post('/api/jobs/' + jobGUID + '/execution', data=json.dumps({'name': name}), content_type='application/json')
+
+  def test_ManualExecutionsOverPerJobLimitAreRejected(self):
+    self._initWithPendingLimits(10, 2)
+    jobGUID = self._createJob('LimitedJob')
+    otherJobGUID = self._createJob('OtherJob')
+    self.assertResponseCodeEqual(self._postExecution(jobGUID, 'First'), 200)
+    self.assertResponseCodeEqual(self._postExecution(jobGUID, 'Second'), 200)
+    result = self._postExecution(jobGUID, 'Third')
+    self.assertResponseCodeEqual(result, 429)
+    self.assertEqual(result.headers['Retry-After'], str(appObj.jobExecutor.timeout))
+    self.assertEqual(len(appObj.jobExecutor.getAllJobExecutions(jobGUID)), 2)
+    #other jobs are not affected
+    self.assertResponseCodeEqual(self._postExecution(otherJobGUID, 'Other'), 200)
+    #once an execution has started there is room again
+    appObj.jobExecutor.loopIteration(appObj.getCurDateTime())
+    self.assertResponseCodeEqual(self._postExecution(jobGUID, 'Third'), 200)
+
+  def test_ManualExecutionsOverGlobalLimitAreRejected(self):
+    self._initWithPendingLimits(2, 10)
+    firstJobGUID = self._createJob('FirstJob')
+    secondJobGUID = self._createJob('SecondJob')
+    self.assertResponseCodeEqual(self._postExecution(firstJobGUID, 'First'), 200)
+    secondExecution = json.loads(self._postExecution(secondJobGUID, 'Second').get_data(as_text=True))
+    self.assertResponseCodeEqual(self._postExecution(secondJobGUID, 'Third'), 429)
+    #deleting a pending execution makes room
+    appObj.jobExecutor.deleteExecution(secondExecution['guid'])
+    self.assertResponseCodeEqual(self._postExecution(secondJobGUID, 'Third'), 200)
+
+  def test_ScheduledExecutionsOverLimitAreDropped(self):
+    self._initWithPendingLimits(10, 1)
+    jobGUID = self._createJob('LimitedJob')
+    self.assertNotEqual(appObj.jobExecutor.submitJobForExecution(jobGUID, 'Scheduled', False), None)
+    self.assertEqual(appObj.jobExecutor.submitJobForExecution(jobGUID, 'Scheduled', False), None)
+    self.assertEqual(len(appObj.jobExecutor.getAllJobExecutions(jobGUID)), 1)
+    result = self.testClient.get('/api/serverinfo/')
+    resultJSON = json.loads(result.get_data(as_text=True))
+    self.assertEqual(resultJSON['Server']['PendingJobExecutions'], 1)
+    self.assertEqual(resultJSON['Server']['DroppedScheduledJobExecutions'], 1)
+
+  def _createScheduledJob(self, misfirePolicy, misfireMaxRuns=10):
+    jc = dict(data_simpleJobCreateParams)
+    jc['misfirePolicy'] = misfirePolicy
+    jc['misfireMaxRuns'] = misfireMaxRuns
+    result = self.testClient.post('/api/jobs/', data=json.dumps(jc), content_type='application/json')
+    self.assertResponseCodeEqual(result, 200)
+    resultJSON = json.loads(result.get_data(as_text=True))
+    self.assertEqual(resultJSON['misfirePolicy'], misfirePolicy)
+    #HOURLY:03 so the next run is at 14:03
+    appObj.appData['jobsData'].recaculateExecutionTimesBasedonNewTime(datetime.datetime(2016,1,5,14,2,59,0,pytz.timezone('UTC')))
+    return resultJSON['guid']
+
+  def _getSchedulingDelays(self, jobGUID):
+    executions = appObj.jobExecutor.getAllJobExecutions(jobGUID)
+    return sorted([executions[guid].schedulingDelaySeconds for guid in executions])
+
+  def test_OnTimeRunRecordsSchedulingDelay(self):
+    jobGUID = self._createScheduledJob('Skip')
+    appObj.jobExecutor.loopIteration(datetime.datetime(2016,1,5,14,3,30,0,pytz.timezone('UTC')))
+    self.assertEqual(self._getSchedulingDelays(jobGUID), [30.0])
+    #manual runs have no scheduling delay
+    manual = self.addExecution(jobGUID, 'Manual')
+    self.assertEqual(manual['schedulingDelaySeconds'], None)
+
+  def test_MisfireRunOnce(self):
+    jobGUID = self._createScheduledJob('RunOnce')
+    appObj.jobExecutor.loopIteration(datetime.datetime(2016,1,5,17,10,0,0,pytz.timezone('UTC')))
+    self.assertEqual(self._getSchedulingDelays(jobGUID), [3 * 3600 + 7 * 60])
+    self.assertEqual(appObj.appData['jobsData'].getJob(jobGUID).nextScheduledRun, '2016-01-05T18:03:00+00:00')
+
+  def test_MisfireRunAll(self):
+    jobGUID = self._createScheduledJob('RunAll')
+    appObj.jobExecutor.loopIteration(datetime.datetime(2016,1,5,17,10,0,0,pytz.timezone('UTC')))
+    self.assertEqual(self._getSchedulingDelays(jobGUID), [7 * 60, 3600 + 7 * 60, 2 * 3600 + 7 * 60, 3 * 3600 + 7 * 60])
+    self.assertEqual(appObj.appData['jobsData'].getJob(jobGUID).nextScheduledRun, '2016-01-05T18:03:00+00:00')
+
+  def test_MisfireRunAllIsLimitedToMaxRuns(self):
+    jobGUID = self._createScheduledJob('RunAll', 2)
+    appObj.jobExecutor.loopIteration(datetime.datetime(2016,1,5,17,10,0,0,pytz.timezone('UTC')))
+    #the most recent missed runs are submitted
+    self.assertEqual(self._getSchedulingDelays(jobGUID), [7 * 60, 3600 + 7 * 60])
+
+  def test_MisfireSkip(self):
+    jobGUID = self._createScheduledJob('Skip')
+    appObj.jobExecutor.loopIteration(datetime.datetime(2016,1,5,17,10,0,0,pytz.timezone('UTC')))
+    self.assertEqual(self._getSchedulingDelays(jobGUID), [])
+    self.assertEqual(appObj.appData['jobsData'].getJob(jobGUID).nextScheduledRun, '2016-01-05T18:03:00+00:00')
+
+  def test_InvalidMisfirePolicy(self):
+    for (policy, maxRuns) in [('Bad', 10), ('RunAll', 0), ('RunAll', 'a')]:
+      jc = dict(data_simpleJobCreateParams)
+      jc['misfirePolicy'] = policy
+      jc['misfireMaxRuns'] = maxRuns
+      result = self.testClient.post('/api/jobs/', data=json.dumps(jc), content_type='application/json')
+      self.assertResponseCodeEqual(result, 400)
+
+  def test_SecondsUntilNextEvent(self):
+    executor = appObj.jobExecutor
+    #nothing scheduled
+    self.assertEqual(executor.getSecondsUntilNextEvent(datetime.datetime(2016,1,5,14,2,30,0,pytz.timezone('UTC'))), executor.maxLoopSleepSeconds)
+    self._createScheduledJob('RunOnce')
+    self.assertAlmostEqual(executor.getSecondsUntilNextEvent(datetime.datetime(2016,1,5,14,2,30,0,pytz.timezone('UTC'))), 30, places=2)
+    self.assertEqual(executor.getSecondsUntilNextEvent(datetime.datetime(2016,1,5,14,1,0,0,pytz.timezone('UTC'))), executor.maxLoopSleepSeconds)
+    self.assertEqual(executor.getSecondsUntilNextEvent(datetime.datetime(2016,1,5,14,5,0,0,pytz.timezone('UTC'))), 0)
+
+  def test_SecondsUntilNextEventIncludesStatusExpiryAndPurge(self):
+    executor = appObj.jobExecutor
+    executor.maxLoopSleepSeconds = 100 * 3600
+    jobGUID = self._createJob('ExpiryTestJob')
+    self.addExecution(jobGUID, 'Execution001')
+    executor.loopIteration(appObj.getCurDateTime())
+    curTime = appObj.getCurDateTime()
+    expiry = appObj.appData['jobsData'].getNextCompletionStatusExpiry()
+    self.assertNotEqual(expiry, None)
+    self.assertAlmostEqual(executor.getSecondsUntilNextEvent(curTime), (expiry - curTime).total_seconds(), places=0)
+    executor.executionRetention = datetime.timedelta(hours=1)
+    self.assertAlmostEqual(executor.getSecondsUntilNextEvent(curTime), (executor.getNextPurgeTime() - curTime).total_seconds(), places=0)
+    self.assertLess(executor.getSecondsUntilNextEvent(curTime), 3601)
+
+  def test_WakeSchedulerEndsWait(self):
+    executor = appObj.jobExecutor
+    executor.running = True
+    def wake():
+      time.sleep(0.2)
+      executor.wakeScheduler()
+    threading.Thread(target=wake).start()
+    startTime = time.monotonic()
+    executor.waitForNextEvent(10)
+    self.assertLess(time.monotonic() - startTime, 5)
+    executor.running = False
+
+  def test_AddingAJobWakesScheduler(self):
+    executor = appObj.jobExecutor
+    executor.wakeRequested = False
+    self._createScheduledJob('RunOnce')
+    self.assertTrue(executor.wakeRequested)
+
+  def test_PurgeRemovesExecutionsInBatches(self):
+    executor = appObj.jobExecutor
+    executor.purgeBatchSize = 2
+    jobGUID = self._createJob('PurgeTestJob')
+    for x in range(0, 5):
+      self.addExecution(jobGUID, 'Execution' + str(x))
+      executor.loopIteration(appObj.getCurDateTime())
+    self.assertEqual(len(executor.retentionIndex), 5)
+    keep = self.addExecution(jobGUID, 'Pending')
+    executor.purgeExecutions(appObj.getCurDateTime() + datetime.timedelta(days=8))
+    self.assertEqual(list(executor.getAllJobExecutions(jobGUID).keys()), [keep['guid']])
+    self.assertEqual(len(executor.retentionIndex), 0)
+    self.assertEqual(executor.getNextPurgeTime(), None)
+
+  def test_PurgeRunsAtMostOncePerInterval(self):
+    executor = appObj.jobExecutor
+    jobGUID = self._createJob('PurgeTestJob')
+    self.addExecution(jobGUID, 'Execution001')
+    executor.loopIteration(appObj.getCurDateTime())
+    purgeTime = appObj.getCurDateTime() + datetime.timedelta(days=8)
+    executor.lastPurgeTime = purgeTime - datetime.timedelta(seconds=30)
+    self.assertEqual(executor.getNextPurgeTime(), executor.lastPurgeTime + executor.executionPurgeInterval)
+    executor.purgeExecutions(purgeTime)
+    self.assertEqual(len(executor.getAllJobExecutions(jobGUID)), 1)
+    executor.purgeExecutions(purgeTime + datetime.timedelta(seconds=31))
+    self.assertEqual(len(executor.getAllJobExecutions(jobGUID)), 0)
+
+  def test_DeletedExecutionIsRemovedFromRetentionIndex(self):
+    jobGUID = self._createJob('PurgeTestJob')
+    execution = self.addExecution(jobGUID, 'Execution001')
+    appObj.jobExecutor.loopIteration(appObj.getCurDateTime())
+    self.assertEqual(list(appObj.jobExecutor.retentionIndex.values()), [execution['guid']])
+    result = self.testClient.delete('/api/jobs/' + jobGUID)
+    self.assertResponseCodeEqual(result, 200)
+    self.assertEqual(len(appObj.jobExecutor.retentionIndex), 0)
+
+  def test_ExecutionDeletedWhileRunningIsNotPurgedAgain(self):
+    executor = appObj.jobExecutor
+    jc = dict(data_simpleManualJobCreateParams)
+    jc['command'] = 'sleep 1'
+    result = self.testClient.post('/api/jobs/', data=json.dumps(jc), content_type='application/json')
+    self.assertResponseCodeEqual(result, 200)
+    executionGUID = self.addExecution(json.loads(result.get_data(as_text=True))['guid'], 'Execution001')['guid']
+    runner = threading.Thread(target=executor.loopIteration, args=(appObj.getCurDateTime(),))
+    runner.start()
+    while executor.getJobExecutionStatus(executionGUID).stage != 'Running':
+      time.sleep(0.01)
+    executor.deleteExecution(executionGUID)
+    runner.join()
+    self.assertEqual(len(executor.retentionIndex), 0)
+    executor.purgeExecutions(appObj.getCurDateTime() + datetime.timedelta(days=8))
+    self.assertEqual(executor.getJobExecutionStatus(executionGUID), None)
+
+  def test_FailedLoopIterationDoesNotStopTheRunner(self):
+    executor = appObj.jobExecutor
+    executor.failedIterationRetrySeconds = 0.01
+    calls = []
+    def loopIteration(curDatetime):
+      calls.append(curDatetime)
+      if len(calls) == 1:
+        raise Exception('Timeout waiting for Job Execution lock')
+      executor.running = False
+    executor.loopIteration = loopIteration
+    runner = threading.Thread(target=executor.run)
+    runner.start()
+    runner.join(5)
+    self.assertFalse(runner.is_alive())
+    self.assertEqual(len(calls), 2)
+
+  def test_DeletingAJobWithARunningExecutionClearsItsTracking(self):
+    executor = appObj.jobExecutor
+    jc = dict(data_simpleManualJobCreateParams)
+    jc['command'] = 'sleep 1'
+    jc['maxConcurrentExecutions'] = 1
+    result = self.testClient.post('/api/jobs/', data=json.dumps(jc), content_type='application/json')
+    self.assertResponseCodeEqual(result, 200)
+    jobGUID = json.loads(result.get_data(as_text=True))['guid']
+    runningGUID = self.addExecution(jobGUID, 'Execution001')['guid']
+    self.addExecution(jobGUID, 'Execution002')
+    runner = threading.Thread(target=executor.loopIteration, args=(appObj.getCurDateTime(),))
+    runner.start()
+    while executor.getJobExecutionStatus(runningGUID).stage != 'Running':
+      time.sleep(0.01)
+    result = self.testClient.delete('/api/jobs/' + jobGUID)
+    self.assertResponseCodeEqual(result, 200)
+    runner.join()
+    for tracking in [executor.activeExecutionsByJob, executor.runningCountByJob, executor.deferredExecutionsByJob, executor.waitingExecutionsByJob]:
+      self.assertNotIn(jobGUID, tracking)
+    self.assertEqual(executor.waitingExecutionCount, 0)
+    self.assertEqual(len(executor.getAllJobExecutions(jobGUID)), 0)
+    self.assertFalse(executor.JobExecutionLock.locked())
@@ -0,0 +1,134 @@
+from TestHelperSuperClass import testHelperAPIClient, env
+from JobExecution import SimpleJobExecutionClass
+from appObj import appObj
+import os
+import json
+import time
+import threading
+from commonJSONStrings import data_simpleManualJobCreateParams
+
+class test_JobSpawner(testHelperAPIClient):
+  def setUp(self):
+    spawnerEnv = dict(env)
+    spawnerEnv['APIAPP_USEJOBSPAWNER'] = 'True'
+    appObj.init(spawnerEnv, self.standardStartupTime, testingMode = True)
+    self.testClient = appObj.flaskAppObject.test_client()
+    self.testClient.testing = True
+
+  def tearDown(self):
+    appObj.jobExecutor.stopJobSpawner()
+    super(test_JobSpawner, self).tearDown()
+
+  def test_SpawnerIsRunning(self):
+    self.assertNotEqual(appObj.jobExecutor.jobSpawner, None)
+    self.assertEqual(appObj.jobExecutor.jobSpawner.process.poll(), None)
+
+  def test_SpawnerIsNotUsedByDefault(self):
+    appObj.jobExecutor.stopJobSpawner()
+    appObj.init(env, self.standardStartupTime, testingMode = True)
+    self.assertEqual(appObj.jobExecutor.jobSpawner, None)
+
+  def test_ExecuteCommandWithSpawner(self):
+    res = appObj.jobExecutor.executeCommand(SimpleJobExecutionClass('echo "Out"; echo "Err" 1>&2; exit 3'))
+    self.assertEqual(res.returncode, 3)
+    self.assertEqual(res.stdout.decode(), 'Out\nErr\n')
+
+  def test_JobIsInItsOwnSession(self):
+    res = appObj.jobExecutor.executeCommand(SimpleJobExecutionClass('ps -o sid= -p $$; echo $$'))
+    (sid, pid) = res.stdout.decode().split()
+    self.assertEqual(sid, pid)
+
+  def test_TimeoutKillsSpawnedJob(self):
+    appObj.jobExecutor.timeout = 1
+    appObj.jobExecutor.killGracePeriod = 1
+    start_time = time.monotonic()
+    res = appObj.jobExecutor.executeCommand(SimpleJobExecutionClass('trap "" TERM; echo "Started"; sleep 10'))
+    elapsed_time = time.monotonic() - start_time
+    self.assertLess(elapsed_time, 3.5)
+    self.assertEqual(res.returncode, -1)
+    self.assertEqual(res.stdout.decode(), 'Started\n')
+
+  def test_TimeoutKillsChildrenOfExitedSpawnedJob(self):
+    appObj.jobExecutor.timeout = 1
+    appObj.jobExecutor.killGracePeriod = 1
+    start_time = time.monotonic()
+    res = appObj.jobExecutor.executeCommand(SimpleJobExecutionClass('sleep 30 & echo $!'))
+    elapsed_time = time.monotonic() - start_time
+    self.assertLess(elapsed_time, 2.5)
+    self.assertEqual(res.returncode, -1)
+    #the background sleep must be gone (or at most an unreaped zombie)
+    statPath = '/proc/' + res.stdout.decode().strip() + '/stat'
+    if os.path.exists(statPath):
+      with open(statPath) as statFile:
+        self.assertEqual(statFile.read().rsplit(')', 1)[1].split()[0], 'Z')
+
+  def test_SpawnerIsRestartedIfItDies(self):
+    oldProcess = appObj.jobExecutor.jobSpawner.process
+    oldProcess.kill()
+    oldProcess.wait()
+    res = appObj.jobExecutor.executeCommand(SimpleJobExecutionClass('echo "Out"'))
+    self.assertEqual(res.returncode, 0)
+    self.assertEqual(res.stdout.decode(), 'Out\n')
+    self.assertNotEqual(appObj.jobExecutor.jobSpawner.process.pid, oldProcess.pid)
+
+  def test_JobCompletesIfSpawnerDiesWhileItRuns(self):
+    spawnerProcess = appObj.jobExecutor.jobSpawner.process
+    killer = threading.Timer(0.5, spawnerProcess.kill)
+    killer.start()
+    res = appObj.jobExecutor.executeCommand(SimpleJobExecutionClass('echo "Started"; sleep 1'))
+    killer.join()
+    spawnerProcess.wait()
+    self.assertEqual(res.returncode, 1)
+    self.assertTrue(res.stdout.decode().startswith('Started\n\nLost track of job - Job spawner exited'))
+
+  def test_JobEnvironmentWithSpawner(self):
+    jc = dict(data_simpleManualJobCreateParams)
+    jc['command'] = 'echo "$MY_SETTING:$DOCKJOB_EXECUTION_NAME"'
+    jc['environment'] = {'MY_SETTING': 'abc'}
+    result = self.testClient.post('/api/jobs/', data=json.dumps(jc), content_type='application/json')
+    self.assertResponseCodeEqual(result, 200)
+    jobGUID = json.loads(result.get_data(as_text=True))['guid']
+    executionGUID = self.addExecution(jobGUID, 'Execution001')['guid']
+    appObj.jobExecutor.loopIteration(appObj.getCurDateTime())
+    result = self.testClient.get('/api/executions/' + executionGUID)
+    resultJSON = json.loads(result.get_data(as_text=True))
+    self.assertEqual(resultJSON['resultSTDOUT'], 'abc:Execution001')
+
+  def test_ManyJobsCanBeSpawned(self):
+    for x in range(0, 50):
+      res = appObj.jobExecutor.executeCommand(SimpleJobExecutionClass('echo ' + str(x)))
+      self.assertEqual(res.stdout.decode(), str(x) + '\n')
+    #no file descriptors should be leaked by the executor
+    fdsBefore = len(os.listdir('/proc/self/fd'))
+    for x in range(0, 10):
+      appObj.jobExecutor.executeCommand(SimpleJobExecutionClass('true'))
+    self.assertEqual(len(os.listdir('/proc/self/fd')), fdsBefore)
+
+  def test_SpawnerSocketsAreNotInheritedByJobs(self):
+    res = appObj.jobExecutor.executeCommand(SimpleJobExecutionClass('ls -l /proc/$$/fd | grep -c socket'))
+    self.assertEqual(res.stdout.decode(), '0\n')
+
+  def test_ExecModeWithSpawner(self):
+    res = appObj.jobExecutor.executeCommand(SimpleJobExecutionClass('echo $HOME', ['echo', '$HOME']))
+    self.assertEqual(res.returncode, 0)
+    self.assertEqual(res.stdout.decode(), '$HOME\n')
+    res = appObj.jobExecutor.executeCommand(SimpleJobExecutionClass('notAProgramThatExists', ['notAProgramThatExists']))
+    self.assertEqual(res.returncode, 127)
+
+  def test_ResourceUsageWithSpawner(self):
+    res = appObj.jobExecutor.executeCommand(SimpleJobExecutionClass('i=0; while [ $i -lt 20000 ]; do i=$((i+1)); done'))
+    self.assertEqual(res.returncode, 0)
+    self.assertGreater(res.resourceUsage['durationSeconds'], 0)
+    self.assertGreater(res.resourceUsage['userCPUSeconds'] + res.resourceUsage['systemCPUSeconds'], 0)
+    self.assertGreater(res.resourceUsage['maxRSSKB'], 0)
+
+  def test_ResourceLimitsWithSpawner(self):
+    jc = dict(data_simpleManualJobCreateParams)
+    jc['command'] = 'ulimit -n; nice; ionice -p $$'
+    jc['resourceLimits'] = {'openFiles': 40, 'nice': 3, 'ioLevel': 6}
+    result = self.testClient.post('/api/jobs/', data=json.dumps(jc), content_type='application/json')
+    self.assertResponseCodeEqual(result, 200)
+    executionGUID = self.addExecution(json.loads(result.get_data(as_text=True))['guid'], 'Execution001')['guid']
+    appObj.jobExecutor.loopIteration(appObj.getCurDateTime())
+    resultJSON = json.loads(self.testClient.get('/api/executions/' + executionGUID).get_data(as_text=True))
+    self.assertEqual(resultJSON['resultSTDOUT'].split('\n'), ['40', '3', 'best-effort: prio 6'])
@@ -1,8 +1,9 @@
 from TestHelperSuperClass import testHelperSuperClass
-from RepetitionInterval import RepetitionIntervalClass, badModeException, badNumberOfModeParamaters, badParamater, unknownTimezone, missingTimezoneException, curDateTimeTimezoneNotUTCException
+from RepetitionInterval import RepetitionIntervalClass, getCompiledRepetitionInterval, badModeException, badNumberOfModeParamaters, badParamater, unknownTimezone, missingTimezoneException, curDateTimeTimezoneNotUTCException
 import datetime
 from datetime import timedelta
 import pytz
+import time
 
 class test_RepetitionInterval(testHelperSuperClass):
   def checkNextRun(self, riOBj, curTime, expTime, msg=''):
@@ -243,6 +244,38 @@ class test_RepetitionInterval(testHelperSuperClass):
       pytz.timezone('UTC').localize(datetime.datetime(2018,11,4,15,3,0,0))
     )
 
+  def test_DailyKeepsClockTimeWhenClocksGoBack(self):
+    ri = RepetitionIntervalClass("DAILY:03:15:+++++++:Europe/London")
+    #clocks went back at 2am on Sunday 28 Oct 2018
+    self.checkNextRun(ri,
+      pytz.timezone('UTC').localize(datetime.datetime(2018,10,27,16,30,0,0)),
+      pytz.timezone('Europe/London').localize(datetime.datetime(2018,10,28,15,3,0,0))
+    )
+
+  def test_DailyTimeSkippedWhenClocksGoForward(self):
+    ri = RepetitionIntervalClass("DAILY:30:01:+++++++:Europe/London")
+    #1:30 did not happen on 25 Mar 2018 so the run is an hour later by the clock
+    self.checkNextRun(ri,
+      pytz.timezone('UTC').localize(datetime.datetime(2018,3,25,0,0,0,0)),
+      pytz.timezone('UTC').localize(datetime.datetime(2018,3,25,1,30,0,0))
+    )
+    self.checkNextRun(ri,
+      pytz.timezone('UTC').localize(datetime.datetime(2018,3,25,1,31,0,0)),
+      pytz.timezone('Europe/London').localize(datetime.datetime(2018,3,26,1,30,0,0))
+    )
+
+  def test_DailyUsesDayOfWeekInTimezone(self):
+    #11pm on a Monday in New York is Tuesday in UTC
+    ri = RepetitionIntervalClass("DAILY:00:23:+------:America/New_York")
+    self.checkNextRun(ri,
+      pytz.timezone('UTC').localize(datetime.datetime(2018,10,29,12,0,0,0)),
+      pytz.timezone('America/New_York').localize(datetime.datetime(2018,10,29,23,0,0,0))
+    )
+    self.checkNextRun(ri,
+      pytz.timezone('UTC').localize(datetime.datetime(2018,10,30,3,30,0,0)),
+      pytz.timezone('America/New_York').localize(datetime.datetime(2018,11,5,23,0,0,0))
+    )
+
 # MONTHLY Tests
   def test_MonthlyDayBefore(self):
     ri = RepetitionIntervalClass("MONTHLY:03:15:11:Europe/London")
@@ -547,5 +580,185 @@ class test_RepetitionInterval(testHelperSuperClass):
       a = RepetitionIntervalClass("DAILY:1:11:-------:UTC")
     self.checkGotRightException(context,badParamater)
 
+  def test_dailyIntervalsDoNotShareDays(self):
+    a = RepetitionIntervalClass("DAILY:03:15:+------:UTC")
+    b = RepetitionIntervalClass("DAILY:03:15:------+:UTC")
+    self.assertEqual(a.__str__(),'DAILY:03:15:+------:UTC')
+    self.assertEqual(b.__str__(),'DAILY:03:15:------+:UTC')
+    #failing to parse must not change existing intervals either
+    with self.assertRaises(Exception) as context:
+      RepetitionIntervalClass("DAILY:03:15:+++++XX:UTC")
+    self.assertEqual(a.__str__(),'DAILY:03:15:+------:UTC')
+
+  def test_compiledIntervalsAreShared(self):
+    a = getCompiledRepetitionInterval("DAILY:3:15:+++++++:Europe/London")
+    b = getCompiledRepetitionInterval("DAILY:03:15:+++++++:Europe/London")
+    self.assertIs(a, b)
+    self.assertIs(getCompiledRepetitionInterval("daily:3:15:+++++++:Europe/London"), a)
+    self.assertIsNot(getCompiledRepetitionInterval("DAILY:03:16:+++++++:Europe/London"), a)
+    with self.assertRaises(Exception) as context:
+      getCompiledRepetitionInterval("DAILY:03:15:-------:Europe/London")
+    self.checkGotRightException(context,badParamater)
+
+  def test_MonthlySkipsMonthsWithoutTheDay(self):
+    ri = RepetitionIntervalClass("MONTHLY:03:15:31:Europe/London")
+    self.checkNextRun(ri,
+      pytz.timezone('UTC').localize(datetime.datetime(2018,1,31,16,30,0,0)),
+      pytz.timezone('Europe/London').localize(datetime.datetime(2018,3,31,15,3,0,0))
+    )
+    ri = RepetitionIntervalClass("MONTHLY:03:15:29,30:Europe/London")
+    self.checkNextRun(ri,
+      pytz.timezone('UTC').localize(datetime.datetime(2018,1,30,16,30,0,0)),
+      pytz.timezone('Europe/London').localize(datetime.datetime(2018,3,29,15,3,0,0))
+    )
+    self.checkNextRun(ri,
+      pytz.timezone('UTC').localize(datetime.datetime(2020,1,30,16,30,0,0)),
+      pytz.timezone('Europe/London').localize(datetime.datetime(2020,2,29,15,3,0,0))
+    )
+
+  #Not a strict timing test, fails only if the next run is found by stepping through days
+  def test_NextOccuranceBenchmark(self):
+    numCalls = 2000
+    #a minute apart so calls cover a day and a half including a change of date
+    curTimes = [pytz.timezone('UTC').localize(datetime.datetime(2018,1,1,16,30,0,0)) + timedelta(minutes=x) for x in range(0, numCalls)]
+    for intervalString in ["DAILY:03:15:------+:Europe/London", "MONTHLY:03:15:31:Europe/London", "HOURLY:03"]:
+      ri = RepetitionIntervalClass(intervalString)
+      startTime = time.perf_counter()
+      for curTime in curTimes:
+        ri.getNextOccuranceDatetime(curTime)
+      perCallMicroseconds = (time.perf_counter() - startTime) * 1000000 / numCalls
+      print(intervalString + ' ' + str(round(perCallMicroseconds, 1)) + 'us per call')
+      self.assertLess(perCallMicroseconds, 1000)
 
+  def test_getNextOccurances(self):
+    ri = RepetitionIntervalClass("MONTHLY:03:15:30:Europe/London")
+    occurances = ri.getNextOccurances(pytz.timezone('UTC').localize(datetime.datetime(2018,1,1,0,0,0,0)))
+    self.assertEqual(next(occurances), pytz.timezone('Europe/London').localize(datetime.datetime(2018,1,30,15,3,0,0)))
+    self.assertEqual(next(occurances), pytz.timezone('Europe/London').localize(datetime.datetime(2018,3,30,15,3,0,0)))
+    self.assertEqual(next(occurances), pytz.timezone('Europe/London').localize(datetime.datetime(2018,4,30,15,3,0,0)))
 
+# CRON Tests
+  def test_CronEveryFiveMinutesOnWeekdayWorkingHours(self):
+    ri = RepetitionIntervalClass("CRON:*/5 8-18 * * mon-fri:Europe/London")
+    self.assertEqual(ri.__str__(),'CRON:*/5 8-18 * * MON-FRI:Europe/London')
+    self.checkNextRun(ri,
+      pytz.timezone('UTC').localize(datetime.datetime(2018,10,26,9,2,59,0)),
+      pytz.timezone('Europe/London').localize(datetime.datetime(2018,10,26,10,5,0,0))
+    )
+    #Friday evening to Monday morning, clocks went back over the weekend
+    self.checkNextRun(ri,
+      pytz.timezone('UTC').localize(datetime.datetime(2018,10,26,17,55,0,0)),
+      pytz.timezone('Europe/London').localize(datetime.datetime(2018,10,29,8,0,0,0))
+    )
+
+  def test_CronKeepsRunningThroughHourRepeatedWhenClocksGoBack(self):
+    ri = RepetitionIntervalClass("CRON:*/15 * * * *:Europe/London")
+    curTime = pytz.timezone('UTC').localize(datetime.datetime(2018,10,27,23,40,0,0))
+    nextRuns = []
+    for x in range(0, 10):
+      curTime = ri.getNextOccuranceDatetime(curTime)
+      nextRuns.append(curTime.astimezone(pytz.timezone('UTC')).strftime('%H:%M'))
+    self.assertEqual(nextRuns, ['23:45', '00:00', '00:15', '00:30', '00:45', '01:00', '01:15', '01:30', '01:45', '02:00'])
+
+  def test_CronFixedTimeInRepeatedHourRunsOnce(self):
+    ri = RepetitionIntervalClass("CRON:30 1 * * *:Europe/London")
+    curTime = pytz.timezone('UTC').localize(datetime.datetime(2018,10,27,23,40,0,0))
+    curTime = ri.getNextOccuranceDatetime(curTime)
+    self.assertEqual(curTime, pytz.timezone('UTC').localize(datetime.datetime(2018,10,28,0,30,0,0)))
+    self.assertEqual(ri.getNextOccuranceDatetime(curTime), pytz.timezone('UTC').localize(datetime.datetime(2018,10,29,1,30,0,0)))
+
+  def test_CronMatchInCurrentMinuteIsNotReturned(self):
+    ri = RepetitionIntervalClass("CRON:3 * * * *:UTC")
+    self.checkNextRun(ri,
+      pytz.timezone('UTC').localize(datetime.datetime(2016,1,5,14,3,0,0)),
+      pytz.timezone('UTC').localize(datetime.datetime(2016,1,5,15,3,0,0))
+    )
+
+  def test_CronDayOfMonthOrDayOfWeek(self):
+    #as in cron when both are restricted either can match
+    ri = RepetitionIntervalClass("CRON:0 12 1,15 * 5:UTC")
+    curTime = pytz.timezone('UTC').localize(datetime.datetime(2018,6,1,13,0,0,0))
+    nextRuns = []
+    for x in range(0, 5):
+      curTime = ri.getNextOccuranceDatetime(curTime)
+      nextRuns.append(curTime.day)
+    self.assertEqual(nextRuns, [8, 15, 22, 29, 1])
+
+  def test_CronLeapDay(self):
+    ri = RepetitionIntervalClass("CRON:0 0 29 2 *:UTC")
+    self.checkNextRun(ri,
+      pytz.timezone('UTC').localize(datetime.datetime(2018,3,1,0,0,0,0)),
+      pytz.timezone('UTC').localize(datetime.datetime(2020,2,29,0,0,0,0))
+    )
+
+  def test_CronSundayIsZeroOrSeven(self):
+    a = RepetitionIntervalClass("CRON:0 0 * * 0:UTC")
+    b = RepetitionIntervalClass("CRON:0 0 * * 7:UTC")
+    curTime = pytz.timezone('UTC').localize(datetime.datetime(2018,10,29,0,0,0,0))
+    self.assertEqual(a.getNextOccuranceDatetime(curTime), pytz.timezone('UTC').localize(datetime.datetime(2018,11,4,0,0,0,0)))
+    self.assertEqual(b.getNextOccuranceDatetime(curTime), a.getNextOccuranceDatetime(curTime))
+
+  def test_CronInvalidExpressions(self):
+    for intervalString in ["CRON:* * * *:UTC", "CRON:60 * * * *:UTC", "CRON:*/0 * * * *:UTC", "CRON:5-1 * * * *:UTC", "CRON:* * * BAD *:UTC", "CRON:0 0 30 2 *:UTC"]:
+      with self.assertRaises(Exception) as context:
+        RepetitionIntervalClass(intervalString)
+      self.checkGotRightException(context,badParamater)
+    with self.assertRaises(Exception) as context:
+      RepetitionIntervalClass("CRON:* * * * *")
+    self.checkGotRightException(context,badNumberOfModeParamaters)
+    with self.assertRaises(Exception) as context:
+      RepetitionIntervalClass("CRON:* * * * *:None")
+    self.checkGotRightException(context,unknownTimezone)
+
+# Seconds and EVERY Tests
+  def test_HourlyWithSeconds(self):
+    ri = RepetitionIntervalClass("HOURLY:03,33:30")
+    self.assertEqual(ri.__str__(),'HOURLY:03,33:30')
+    self.checkNextRun(ri,
+      pytz.timezone('UTC').localize(datetime.datetime(2016,1,5,14,3,30,0)),
+      pytz.timezone('UTC').localize(datetime.datetime(2016,1,5,14,33,30,0))
+    )
+    self.assertEqual(RepetitionIntervalClass("HOURLY:03:00").__str__(),'HOURLY:03')
+    for intervalString in ["HOURLY:03:60", "HOURLY:03:a"]:
+      with self.assertRaises(Exception) as context:
+        RepetitionIntervalClass(intervalString)
+      self.checkGotRightException(context,badParamater)
+
+  def test_CronWithSeconds(self):
+    ri = RepetitionIntervalClass("CRON:*/15 * * * * *:UTC")
+    self.assertEqual(ri.__str__(),'CRON:*/15 * * * * *:UTC')
+    self.checkNextRun(ri,
+      pytz.timezone('UTC').localize(datetime.datetime(2016,1,5,14,3,44,500000)),
+      pytz.timezone('UTC').localize(datetime.datetime(2016,1,5,14,3,45,0))
+    )
+    self.checkNextRun(ri,
+      pytz.timezone('UTC').localize(datetime.datetime(2016,1,5,14,3,45,0)),
+      pytz.timezone('UTC').localize(datetime.datetime(2016,1,5,14,4,0,0))
+    )
+    with self.assertRaises(Exception) as context:
+      RepetitionIntervalClass("CRON:60 * * * * *:UTC")
+    self.checkGotRightException(context,badParamater)
+
+  def test_EveryIsAnchored(self):
+    ri = RepetitionIntervalClass("every:15")
+    self.assertEqual(ri.__str__(),'EVERY:15')
+    self.assertTrue(ri.isAnchored())
+    self.assertFalse(RepetitionIntervalClass("HOURLY:03").isAnchored())
+    anchor = pytz.timezone('UTC').localize(datetime.datetime(2016,1,5,14,0,7,0))
+    curTime = pytz.timezone('UTC').localize(datetime.datetime(2016,1,5,14,3,22,0))
+    self.assertEqual(ri.getNextOccuranceDatetime(curTime, anchor), pytz.timezone('UTC').localize(datetime.datetime(2016,1,5,14,3,37,0)))
+    #anchor can be after the current time
+    self.assertEqual(ri.getNextOccuranceDatetime(anchor - timedelta(seconds=20), anchor), anchor - timedelta(seconds=15))
+    #a time exactly on a period gives the next period
+    self.assertEqual(ri.getNextOccuranceDatetime(anchor, anchor), anchor + timedelta(seconds=15))
+    #without an anchor periods start at the unix epoch
+    self.assertEqual(ri.getNextOccuranceDatetime(curTime), pytz.timezone('UTC').localize(datetime.datetime(2016,1,5,14,3,30,0)))
+
+  def test_EveryInvalid(self):
+    for intervalString in ["EVERY:0", "EVERY:a"]:
+      with self.assertRaises(Exception) as context:
+        RepetitionIntervalClass(intervalString)
+      self.checkGotRightException(context,badParamater)
+    with self.assertRaises(Exception) as context:
+      RepetitionIntervalClass("EVERY:15:30")
+    self.checkGotRightException(context,badNumberOfModeParamaters)
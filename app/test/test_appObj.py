@@ -30,6 +30,8 @@ class test_appObjClass(testHelperAPIClient):
         'ServerDatetime': curDatetime.isoformat(),
         'ServerStartupTime': '2018-01-01T13:46:00+00:00',
         'TotalJobExecutions': 0,
+        'PendingJobExecutions': 0,
+        'DroppedScheduledJobExecutions': 0,
         'MinutesBeforeMostRecentCompletionStatusBecomesUnknown': 49 * 60
       },
     }
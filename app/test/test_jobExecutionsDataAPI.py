@@ -1,6 +1,9 @@
-from TestHelperSuperClass import testHelperAPIClient
+from TestHelperSuperClass import testHelperAPIClient, env
 import json
+import time
 from baseapp_for_restapi_backend_with_swagger import from_iso8601
+from appObj import appObj
+from commonJSONStrings import data_simpleManualJobCreateParams
 
 data_simpleJobCreateParams = {
   "name": "TestJob",
@@ -41,5 +44,60 @@ class test_jobExecutionsData(testHelperAPIClient):
     queryJobExecutionsResultJSON = json.loads(queryJobExecutionsResult.get_data(as_text=True))
     self.assertEqual(queryJobExecutionsResult.status_code, 400, msg='Request to ' + reqURL + ' did not fail with error 400')
 
+  def _createJobAndExecution(self, command):
+    jc = dict(data_simpleManualJobCreateParams)
+    jc['command'] = command
+    result = self.testClient.post('/api/jobs/', data=json.dumps(jc), content_type='application/json')
+    self.assertResponseCodeEqual(result, 200)
+    jobGUID = json.loads(result.get_data(as_text=True))['guid']
+    return self.addExecution(jobGUID, 'TestExecution')['guid']
 
+  def test_GetOutputOfCompletedExecution(self):
+    executionGUID = self._createJobAndExecution('echo "Hello"')
+    appObj.jobExecutor.loopIteration(appObj.getCurDateTime())
+    result = self.testClient.get('/api/executions/' + executionGUID + '/output')
+    self.assertResponseCodeEqual(result, 200)
+    self.assertEqual(result.get_data(as_text=True), 'Hello\n')
+    self.assertEqual(result.headers['X-Output-Offset'], '0')
+    self.assertEqual(result.headers['X-Output-Next-Offset'], '6')
+    self.assertEqual(result.headers['X-Execution-Stage'], 'Completed')
 
+    #Resume from an offset
+    result = self.testClient.get('/api/executions/' + executionGUID + '/output?offset=2')
+    self.assertResponseCodeEqual(result, 200)
+    self.assertEqual(result.get_data(as_text=True), 'llo\n')
+    result = self.testClient.get('/api/executions/' + executionGUID + '/output?offset=6')
+    self.assertResponseCodeEqual(result, 200)
+    self.assertEqual(result.get_data(as_text=True), '')
+    self.assertEqual(result.headers['X-Output-Next-Offset'], '6')
+
+  def test_GetOutputOfPendingExecutionIsEmpty(self):
+    executionGUID = self._createJobAndExecution('echo "Hello"')
+    result = self.testClient.get('/api/executions/' + executionGUID + '/output')
+    self.assertResponseCodeEqual(result, 200)
+    self.assertEqual(result.get_data(as_text=True), '')
+    self.assertEqual(result.headers['X-Execution-Stage'], 'Pending')
+
+  def test_GetOutputInvalidRequests(self):
+    result = self.testClient.get('/api/executions/aaa123/output')
+    self.assertResponseCodeEqual(result, 400)
+    executionGUID = self._createJobAndExecution('echo "Hello"')
+    result = self.testClient.get('/api/executions/' + executionGUID + '/output?offset=abc')
+    self.assertResponseCodeEqual(result, 400)
+    result = self.testClient.get('/api/executions/' + executionGUID + '/output?offset=-1')
+    self.assertResponseCodeEqual(result, 400)
+
+  def test_FollowOutputOfRunningExecution(self):
+    #Start the executor thread so the job runs while we follow it
+    appObj.init(env, self.standardStartupTime)
+    self.testClient = appObj.flaskAppObject.test_client()
+    executionGUID = self._createJobAndExecution('echo "One"; sleep 0.5; echo "Two"')
+    result = self.testClient.get('/api/executions/' + executionGUID + '/output?follow=true&offset=1')
+    self.assertResponseCodeEqual(result, 200)
+    self.assertEqual(result.get_data(as_text=True), 'ne\nTwo\n')
+    #output is closed just before the result is recorded
+    for x in range(0, 20):
+      if appObj.jobExecutor.getJobExecutionStatus(executionGUID).stage == 'Completed':
+        break
+      time.sleep(0.05)
+    self.assertEqual(appObj.jobExecutor.getJobExecutionStatus(executionGUID).stage, 'Completed')
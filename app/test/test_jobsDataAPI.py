@@ -602,6 +602,77 @@ class test_jobsData(testHelperAPIClient):
     result6JSON = dict(json.loads(result6.get_data(as_text=True)))
     self.assertJSONJobStringsEqual(result6JSON, data_simpleJobCreateExpRes);
 
+  def test_updateWithOnlyOriginalFieldsKeepsNewerSettings(self):
+    newerSettings = {
+      'maxConcurrentExecutions': 2,
+      'concurrencyPolicy': 'Skip',
+      'environment': {'MY_SETTING': 'abc'},
+      'timeoutSeconds': 30,
+      'priority': 5,
+      'coalescePendingExecutions': True,
+      'resourceLimits': {'openFiles': 40, 'nice': 3},
+      'misfirePolicy': 'RunAll',
+      'misfireMaxRuns': 3,
+    }
+    jc = dict(data_simpleJobCreateParams)
+    jc.update(newerSettings)
+    result = self.testClient.post('/api/jobs/', data=json.dumps(jc), content_type='application/json')
+    self.assertEqual(result.status_code, 200, msg='Job creation should have worked')
+    jobGUID = json.loads(result.get_data(as_text=True))['guid']
+
+    resultJSON = self.updateJobWithOnlyOriginalFields(jobGUID, 'ls -l')
+    self.assertEqual(resultJSON['command'], 'ls -l')
+    for key in newerSettings:
+      self.assertEqual(resultJSON[key], newerSettings[key], msg=key)
+
+  def test_updateHTTPJobWithOnlyOriginalFieldsKeepsHTTPMode(self):
+    jc = dict(data_simpleJobCreateParams)
+    jc['command'] = 'call service'
+    jc['executionMode'] = 'http'
+    jc['httpRequest'] = {'method': 'POST', 'url': 'http://localhost:1/hook', 'body': 'x'}
+    result = self.testClient.post('/api/jobs/', data=json.dumps(jc), content_type='application/json')
+    self.assertEqual(result.status_code, 200, msg='Job creation should have worked')
+    jobGUID = json.loads(result.get_data(as_text=True))['guid']
+
+    resultJSON = self.updateJobWithOnlyOriginalFields(jobGUID, 'call service again')
+    self.assertEqual(resultJSON['executionMode'], 'http')
+    self.assertEqual(resultJSON['httpRequest'], {'method': 'POST', 'url': 'http://localhost:1/hook', 'headers': {}, 'body': 'x', 'expectedStatus': None})
+
+  #PUT the fields the web frontend sends (the original job fields only) and return the job read back
+  def updateJobWithOnlyOriginalFields(self, jobGUID, command):
+    updateInput = dict(data_simpleJobCreateParams)
+    updateInput['command'] = command
+    updateInput['pinned'] = False
+    updateInput['overrideMinutesBeforeMostRecentCompletionStatusBecomesUnknown'] = 0
+    updateInput['StateChangeSuccessJobGUID'] = ''
+    updateInput['StateChangeFailJobGUID'] = ''
+    updateInput['StateChangeUnknownJobGUID'] = ''
+    result = self.testClient.put('/api/jobs/' + jobGUID, data=json.dumps(updateInput), content_type='application/json')
+    self.assertEqual(result.status_code, 200, msg='Put call did not give correct status')
+    return json.loads(self.testClient.get('/api/jobs/' + jobGUID).get_data(as_text=True))
+
+  def test_updateWithOneInvalidValueLeavesJobUnchanged(self):
+    result = self.testClient.post('/api/jobs/', data=json.dumps(data_simpleJobCreateParams), content_type='application/json')
+    self.assertEqual(result.status_code, 200, msg='First job creation should have worked')
+    resultJSON = dict(json.loads(result.get_data(as_text=True)))
+    jobGUID = resultJSON['guid']
+    origName = resultJSON['name']
+
+    updateInput = dict(data_simpleJobCreateParams)
+    updateInput['name'] = 'JobRenamed'
+    updateInput['maxConcurrentExecutions'] = 5
+    updateInput['executionMode'] = 'bogus'
+    updateResult = self.testClient.put('/api/jobs/' + jobGUID, data=json.dumps(updateInput), content_type='application/json')
+    self.assertEqual(updateResult.status_code, 400, msg='Put call did not give correct status')
+
+    result2 = self.testClient.get('/api/jobs/' + jobGUID)
+    self.assertEqual(result2.status_code, 200)
+    result2JSON = dict(json.loads(result2.get_data(as_text=True)))
+    self.assertJSONJobStringsEqual(result2JSON, data_simpleJobCreateExpRes);
+    self.assertEqual(result2JSON['maxConcurrentExecutions'], None)
+    self.assertEqual(self.testClient.get('/api/jobs/' + origName).status_code, 200)
+    self.assertEqual(self.testClient.get('/api/jobs/JobRenamed').status_code, 400)
+
   def test_getJobHasProperlyFormattedRepititionInterval_singledigit(self):
     single_digit_hourly = dict(data_simpleJobCreateParams)
     single_digit_hourly['repetitionInterval'] = 'HOURLY:3'
@@ -652,6 +723,7 @@ class test_jobsData(testHelperAPIClient):
     expRes = dict(data_simpleJobCreateExpRes)
     expRes['mostRecentCompletionStatus'] = expectedResult
     expRes['lastRunReturnCode'] = expectedReturnCode
+    expRes['measuredExecutions'] = 1
     expRes['command'] = js['command']
     self.assertJSONJobStringsEqual(result3JSON, expRes);
 
@@ -662,6 +734,7 @@ class test_jobsData(testHelperAPIClient):
     expRes = dict(data_simpleJobCreateExpRes)
     expRes['mostRecentCompletionStatus'] = "Success"
     expRes['lastRunReturnCode'] = 0
+    expRes['measuredExecutions'] = 1
 
     #Update the job and ensure returned data is still Success
     updateNameInput = dict(data_simpleJobCreateParams)
@@ -708,6 +781,7 @@ class test_jobsData(testHelperAPIClient):
     expRes = dict(data_simpleJobCreateExpRes)
     expRes['mostRecentCompletionStatus'] = "Success"
     expRes['lastRunReturnCode'] = 0
+    expRes['measuredExecutions'] = 1
     #delete the job
     result4 = self.testClient.delete('/api/jobs/' + jobGUID)
     self.assertEqual(result4.status_code, 200, msg='Didn''t delete Job')
@@ -722,6 +796,7 @@ class test_jobsData(testHelperAPIClient):
     expRes = dict(data_simpleJobCreateExpRes)
     expRes['mostRecentCompletionStatus'] = "Fail"
     expRes['lastRunReturnCode'] = 127
+    expRes['measuredExecutions'] = 1
     expRes['command'] = js['command']
     jobGUID = self._generateExecutedRunJob(command=js['command'], expectedResult='Fail', expectedReturnCode=expRes['lastRunReturnCode']) #Will return the GUID of a sucessfully executed job
 
@@ -771,6 +846,7 @@ class test_jobsData(testHelperAPIClient):
     expRes = dict(data_simpleJobCreateExpRes)
     expRes['mostRecentCompletionStatus'] = "Fail"
     expRes['lastRunReturnCode'] = 127
+    expRes['measuredExecutions'] = 1
     expRes['command'] = js['command']
     jobGUID = self._generateExecutedRunJob(command=js['command'], expectedResult='Fail', expectedReturnCode=expRes['lastRunReturnCode']) #Will return the GUID of a sucessfully executed job
 
@@ -928,6 +1004,7 @@ class test_jobsData(testHelperAPIClient):
     expRes = dict(data_simpleJobCreateExpRes)
     expRes['mostRecentCompletionStatus'] = "Success"
     expRes['lastRunReturnCode'] = 0
+    expRes['measuredExecutions'] = 1
     expRes['overrideMinutesBeforeMostRecentCompletionStatusBecomesUnknown'] = jc['overrideMinutesBeforeMostRecentCompletionStatusBecomesUnknown']
     self.assertJSONJobStringsEqual(result3JSON, expRes);
 
@@ -1186,3 +1263,359 @@ class test_jobsData(testHelperAPIClient):
 
 
 
+
+  def _createJobWithConcurrencyLimit(self, maxConcurrentExecutions, concurrencyPolicy):
+    jc = dict(data_simpleManualJobCreateParams)
+    jc['maxConcurrentExecutions'] = maxConcurrentExecutions
+    jc['concurrencyPolicy'] = concurrencyPolicy
+    result = self.testClient.post('/api/jobs/', data=json.dumps(jc), content_type='application/json')
+    self.assertResponseCodeEqual(result, 200)
+    resultJSON = json.loads(result.get_data(as_text=True))
+    self.assertEqual(resultJSON['maxConcurrentExecutions'], maxConcurrentExecutions)
+    self.assertEqual(resultJSON['concurrencyPolicy'], concurrencyPolicy)
+    return resultJSON['guid']
+
+  def test_createJobWithInvalidConcurrencyPolicyFails(self):
+    jc = dict(data_simpleManualJobCreateParams)
+    jc['maxConcurrentExecutions'] = 1
+    jc['concurrencyPolicy'] = 'InvalidPolicy'
+    result = self.testClient.post('/api/jobs/', data=json.dumps(jc), content_type='application/json')
+    self.assertResponseCodeEqual(result, 400)
+    jc['concurrencyPolicy'] = 'Skip'
+    jc['maxConcurrentExecutions'] = -1
+    result = self.testClient.post('/api/jobs/', data=json.dumps(jc), content_type='application/json')
+    self.assertResponseCodeEqual(result, 400)
+
+  def test_skipPolicyDoesNotCreateExecution(self):
+    jobGUID = self._createJobWithConcurrencyLimit(1, 'Skip')
+    self.addExecution(jobGUID, 'Execution001')
+    result = self.testClient.post('/api/jobs/' + jobGUID + '/execution', data=json.dumps({"name": 'Execution002'}), content_type='application/json')
+    self.assertResponseCodeEqual(result, 400)
+    self.assertEqual(len(self._getExecutionsForJob(jobGUID)), 1)
+
+    #Once the first execution has completed a new one can be created
+    appObj.jobExecutor.loopIteration(appObj.getCurDateTime())
+    self.addExecution(jobGUID, 'Execution003')
+    self.assertEqual(len(self._getExecutionsForJob(jobGUID)), 2)
+
+  def test_replacePolicyReplacesPendingExecution(self):
+    jobGUID = self._createJobWithConcurrencyLimit(1, 'Replace')
+    firstExecution = self.addExecution(jobGUID, 'Execution001')
+    secondExecution = self.addExecution(jobGUID, 'Execution002')
+    appObj.jobExecutor.loopIteration(appObj.getCurDateTime())
+    appObj.jobExecutor.loopIteration(appObj.getCurDateTime())
+
+    result = self.testClient.get('/api/executions/' + firstExecution['guid'])
+    resultJSON = json.loads(result.get_data(as_text=True))
+    self.assertEqual(resultJSON['stage'], 'Replaced')
+    self.assertEqual(resultJSON['dateStarted'], None)
+    result = self.testClient.get('/api/executions/' + secondExecution['guid'])
+    resultJSON = json.loads(result.get_data(as_text=True))
+    self.assertEqual(resultJSON['stage'], 'Completed')
+
+  def test_queuePolicyRunsAllExecutions(self):
+    jobGUID = self._createJobWithConcurrencyLimit(1, 'Queue')
+    self.addExecution(jobGUID, 'Execution001')
+    self.addExecution(jobGUID, 'Execution002')
+    appObj.jobExecutor.loopIteration(appObj.getCurDateTime())
+    appObj.jobExecutor.loopIteration(appObj.getCurDateTime())
+    executions = self._getExecutionsForJob(jobGUID)
+    self.assertEqual(len(executions), 2)
+    for curExecution in executions:
+      self.assertEqual(curExecution['stage'], 'Completed')
+
+  def test_jobTimeoutSecondsIsUsedForExecutions(self):
+    jc = dict(data_simpleManualJobCreateParams)
+    jc['command'] = 'echo "Started"; sleep 5'
+    jc['timeoutSeconds'] = 1
+    result = self.testClient.post('/api/jobs/', data=json.dumps(jc), content_type='application/json')
+    self.assertResponseCodeEqual(result, 200)
+    resultJSON = json.loads(result.get_data(as_text=True))
+    self.assertEqual(resultJSON['timeoutSeconds'], 1)
+    jobGUID = resultJSON['guid']
+    executionGUID = self.addExecution(jobGUID, 'Execution001')['guid']
+    start_time = time.monotonic()
+    appObj.jobExecutor.loopIteration(appObj.getCurDateTime())
+    self.assertLess(time.monotonic() - start_time, 2.5)
+    result = self.testClient.get('/api/executions/' + executionGUID)
+    resultJSON = json.loads(result.get_data(as_text=True))
+    self.assertEqual(resultJSON['stage'], 'Timeout')
+    self.assertEqual(resultJSON['resultReturnCode'], -1)
+
+  def test_createJobWithNegativeTimeoutFails(self):
+    jc = dict(data_simpleManualJobCreateParams)
+    jc['timeoutSeconds'] = -1
+    result = self.testClient.post('/api/jobs/', data=json.dumps(jc), content_type='application/json')
+    self.assertResponseCodeEqual(result, 400)
+
+  def test_jobEnvironmentIsSetForExecutions(self):
+    jc = dict(data_simpleManualJobCreateParams)
+    jc['command'] = 'echo "$MY_SETTING:$DOCKJOB_JOB_NAME"'
+    jc['environment'] = {'MY_SETTING': 'abc def'}
+    result = self.testClient.post('/api/jobs/', data=json.dumps(jc), content_type='application/json')
+    self.assertResponseCodeEqual(result, 200)
+    resultJSON = json.loads(result.get_data(as_text=True))
+    self.assertEqual(resultJSON['environment'], {'MY_SETTING': 'abc def'})
+    executionGUID = self.addExecution(resultJSON['guid'], 'Execution001')['guid']
+    appObj.jobExecutor.loopIteration(appObj.getCurDateTime())
+    result = self.testClient.get('/api/executions/' + executionGUID)
+    resultJSON = json.loads(result.get_data(as_text=True))
+    self.assertEqual(resultJSON['resultSTDOUT'], 'abc def:' + jc['name'])
+
+  def test_createJobWithInvalidEnvironmentFails(self):
+    for invalidEnvironment in [{'1ABC': 'x'}, {'DOCKJOB_JOB_NAME': 'x'}, {'ABC': 1}, ['ABC']]:
+      jc = dict(data_simpleManualJobCreateParams)
+      jc['environment'] = invalidEnvironment
+      result = self.testClient.post('/api/jobs/', data=json.dumps(jc), content_type='application/json')
+      self.assertResponseCodeEqual(result, 400)
+
+  def test_execModeRunsProgramWithoutShell(self):
+    jc = dict(data_simpleManualJobCreateParams)
+    jc['command'] = 'echo "a  b" $HOME;'
+    jc['executionMode'] = 'exec'
+    result = self.testClient.post('/api/jobs/', data=json.dumps(jc), content_type='application/json')
+    self.assertResponseCodeEqual(result, 200)
+    resultJSON = json.loads(result.get_data(as_text=True))
+    self.assertEqual(resultJSON['executionMode'], 'exec')
+    self.assertFalse('commandArgs' in resultJSON)
+    executionGUID = self.addExecution(resultJSON['guid'], 'Execution001')['guid']
+    appObj.jobExecutor.loopIteration(appObj.getCurDateTime())
+    result = self.testClient.get('/api/executions/' + executionGUID)
+    resultJSON = json.loads(result.get_data(as_text=True))
+    #no shell so no variable expansion and ; is passed to echo
+    self.assertEqual(resultJSON['resultSTDOUT'], 'a  b $HOME;')
+    self.assertEqual(resultJSON['resultReturnCode'], 0)
+
+  def test_execModeMissingProgramFails(self):
+    jc = dict(data_simpleManualJobCreateParams)
+    jc['command'] = 'notAProgramThatExists arg1'
+    jc['executionMode'] = 'exec'
+    result = self.testClient.post('/api/jobs/', data=json.dumps(jc), content_type='application/json')
+    self.assertResponseCodeEqual(result, 200)
+    executionGUID = self.addExecution(json.loads(result.get_data(as_text=True))['guid'], 'Execution001')['guid']
+    appObj.jobExecutor.loopIteration(appObj.getCurDateTime())
+    result = self.testClient.get('/api/executions/' + executionGUID)
+    resultJSON = json.loads(result.get_data(as_text=True))
+    self.assertEqual(resultJSON['stage'], 'Completed')
+    self.assertEqual(resultJSON['resultReturnCode'], 127)
+    self.assertTrue('notAProgramThatExists' in resultJSON['resultSTDOUT'])
+
+  def test_createJobWithInvalidExecutionModeFails(self):
+    jc = dict(data_simpleManualJobCreateParams)
+    jc['executionMode'] = 'invalid'
+    result = self.testClient.post('/api/jobs/', data=json.dumps(jc), content_type='application/json')
+    self.assertResponseCodeEqual(result, 400)
+    jc['executionMode'] = 'exec'
+    jc['command'] = 'echo "unterminated'
+    result = self.testClient.post('/api/jobs/', data=json.dumps(jc), content_type='application/json')
+    self.assertResponseCodeEqual(result, 400)
+
+  def test_jobResourceUsageTotalsAreUpdatedByExecutions(self):
+    result = self.testClient.post('/api/jobs/', data=json.dumps(data_simpleManualJobCreateParams), content_type='application/json')
+    self.assertResponseCodeEqual(result, 200)
+    jobGUID = json.loads(result.get_data(as_text=True))['guid']
+    executionGUIDs = []
+    for x in range(0, 2):
+      executionGUIDs.append(self.addExecution(jobGUID, 'Execution00' + str(x))['guid'])
+      appObj.jobExecutor.loopIteration(appObj.getCurDateTime())
+    totalDuration = 0.0
+    maxRSS = 0
+    for executionGUID in executionGUIDs:
+      executionJSON = json.loads(self.testClient.get('/api/executions/' + executionGUID).get_data(as_text=True))
+      self.assertGreater(executionJSON['durationSeconds'], 0)
+      self.assertGreater(executionJSON['maxRSSKB'], 0)
+      totalDuration += executionJSON['durationSeconds']
+      maxRSS = max(maxRSS, executionJSON['maxRSSKB'])
+    resultJSON = json.loads(self.testClient.get('/api/jobs/' + jobGUID).get_data(as_text=True))
+    self.assertEqual(resultJSON['measuredExecutions'], 2)
+    self.assertAlmostEqual(resultJSON['totalDurationSeconds'], totalDuration)
+    self.assertEqual(resultJSON['peakMaxRSSKB'], maxRSS)
+
+  def test_jobResourceLimitsAreAppliedToExecutions(self):
+    jc = dict(data_simpleManualJobCreateParams)
+    jc['command'] = 'ulimit -n; ulimit -t; ulimit -v; nice; ionice -p $$'
+    jc['resourceLimits'] = {'openFiles': 32, 'cpuSeconds': 30, 'addressSpaceMB': 2048, 'nice': 7, 'ioClass': 'idle'}
+    result = self.testClient.post('/api/jobs/', data=json.dumps(jc), content_type='application/json')
+    self.assertResponseCodeEqual(result, 200)
+    resultJSON = json.loads(result.get_data(as_text=True))
+    self.assertEqual(resultJSON['resourceLimits'], jc['resourceLimits'])
+    executionGUID = self.addExecution(resultJSON['guid'], 'Execution001')['guid']
+    appObj.jobExecutor.loopIteration(appObj.getCurDateTime())
+    resultJSON = json.loads(self.testClient.get('/api/executions/' + executionGUID).get_data(as_text=True))
+    self.assertEqual(resultJSON['resultReturnCode'], 0)
+    self.assertEqual(resultJSON['resultSTDOUT'].split('\n'), ['32', '30', str(2048 * 1024), '7', 'idle'])
+
+  def test_jobCPULimitKillsExecution(self):
+    jc = dict(data_simpleManualJobCreateParams)
+    jc['command'] = 'while true; do :; done'
+    jc['resourceLimits'] = {'cpuSeconds': 1}
+    result = self.testClient.post('/api/jobs/', data=json.dumps(jc), content_type='application/json')
+    self.assertResponseCodeEqual(result, 200)
+    executionGUID = self.addExecution(json.loads(result.get_data(as_text=True))['guid'], 'Execution001')['guid']
+    appObj.jobExecutor.loopIteration(appObj.getCurDateTime())
+    resultJSON = json.loads(self.testClient.get('/api/executions/' + executionGUID).get_data(as_text=True))
+    self.assertEqual(resultJSON['stage'], 'Completed')
+    self.assertEqual(resultJSON['resultReturnCode'], -24) # SIGXCPU
+
+  def test_createJobWithInvalidResourceLimitsFails(self):
+    for invalid in ['abc', {'unknown': 1}, {'openFiles': 0}, {'cpuSeconds': 'a'}, {'nice': -1}, {'nice': 20}, {'ioClass': 'realtime'}, {'ioClass': 'idle', 'ioLevel': 2}, {'ioLevel': 8}]:
+      jc = dict(data_simpleManualJobCreateParams)
+      jc['resourceLimits'] = invalid
+      result = self.testClient.post('/api/jobs/', data=json.dumps(jc), content_type='application/json')
+      self.assertResponseCodeEqual(result, 400)
+    #io level on its own means best-effort
+    jc['resourceLimits'] = {'ioLevel': 6, 'nice': None}
+    result = self.testClient.post('/api/jobs/', data=json.dumps(jc), content_type='application/json')
+    self.assertResponseCodeEqual(result, 200)
+    self.assertEqual(json.loads(result.get_data(as_text=True))['resourceLimits'], {'ioClass': 'best-effort', 'ioLevel': 6})
+
+  def test_allDueJobsAreSubmittedInOneLoopIteration(self):
+    jobGUIDs = []
+    for x in range(0, 20):
+      jobCreate = dict(data_simpleJobCreateParams)
+      jobCreate['name'] = 'SameTimeJob' + str(x).zfill(3)
+      result = self.testClient.post('/api/jobs/', data=json.dumps(jobCreate), content_type='application/json')
+      self.assertResponseCodeEqual(result, 200)
+      jobGUIDs.append(json.loads(result.get_data(as_text=True))['guid'])
+    laterJobGUID = self.createJobWithRepInterval('HOURLY:30')
+    appObj.appData['jobsData'].recaculateExecutionTimesBasedonNewTime(datetime.datetime(2016,1,5,14,2,59,0,pytz.timezone('UTC')))
+    self.assertEqual(len(appObj.appData['jobsData'].getDueJobs(datetime.datetime(2016,1,5,14,3,0,0,pytz.timezone('UTC')))), 0)
+
+    appObj.jobExecutor.loopIteration(datetime.datetime(2016,1,5,14,3,1,0,pytz.timezone('UTC')))
+    for jobGUID in jobGUIDs:
+      self.assertEqual(len(appObj.jobExecutor.getAllJobExecutions(jobGUID)), 1)
+      self.assertEqual(appObj.appData['jobsData'].getJob(jobGUID).nextScheduledRun, '2016-01-05T15:03:00+00:00')
+    self.assertEqual(len(appObj.jobExecutor.getAllJobExecutions(laterJobGUID)), 0)
+    self.assertEqual(appObj.appData['jobsData'].getNextJobToExecute().guid, laterJobGUID)
+
+  def test_scheduleIndexFollowsJobChanges(self):
+    jobGUID05 = self.createJobWithRepInterval('HOURLY:05')
+    jobGUID25 = self.createJobWithRepInterval('HOURLY:25')
+    appObj.appData['jobsData'].recaculateExecutionTimesBasedonNewTime(datetime.datetime(2016,1,5,14,2,59,0,pytz.timezone('UTC')))
+    dueTime = datetime.datetime(2016,1,5,14,30,0,0,pytz.timezone('UTC'))
+    self.assertEqual([x.guid for x in appObj.appData['jobsData'].getDueJobs(dueTime)], [jobGUID05, jobGUID25])
+
+    #disabled jobs are not scheduled
+    jobChange = dict(data_simpleJobCreateParams)
+    jobChange['name'] = 'Job_with_ri_HOURLY:05'
+    jobChange['enabled'] = False
+    result = self.testClient.put('/api/jobs/' + jobGUID05, data=json.dumps(jobChange), content_type='application/json')
+    self.assertResponseCodeEqual(result, 200)
+    self.assertEqual([x.guid for x in appObj.appData['jobsData'].getDueJobs(dueTime)], [jobGUID25])
+
+    result = self.testClient.delete('/api/jobs/' + jobGUID25)
+    self.assertResponseCodeEqual(result, 200)
+    self.assertEqual(appObj.appData['jobsData'].getDueJobs(dueTime), [])
+    self.assertEqual(appObj.appData['jobsData'].getNextJobToExecute(), None)
+
+  def test_onlyJobsWithExpiredStatusAreVisitedEachLoopIteration(self):
+    jobGUIDs = []
+    for minutes in [10, 2]:
+      jc = dict(data_simpleManualJobCreateParams)
+      jc['name'] = 'ExpiryJob' + str(minutes)
+      jc['overrideMinutesBeforeMostRecentCompletionStatusBecomesUnknown'] = minutes
+      result = self.testClient.post('/api/jobs/', data=json.dumps(jc), content_type='application/json')
+      self.assertResponseCodeEqual(result, 200)
+      jobGUID = json.loads(result.get_data(as_text=True))['guid']
+      jobGUIDs.append(jobGUID)
+      self.addExecution(jobGUID, 'Execution001')
+      appObj.jobExecutor.loopIteration(appObj.getCurDateTime())
+    jobsData = appObj.appData['jobsData']
+    self.assertEqual([key[1] for key in jobsData.expiryIndex], [jobGUIDs[1], jobGUIDs[0]])
+    self.assertEqual(jobsData.getNextCompletionStatusExpiry(), jobsData.getJob(jobGUIDs[1]).resetCompletionStatusToUnknownTime)
+
+    appObj.setTestingDateTime(appObj.getCurDateTime() + relativedelta(minutes=3))
+    appObj.jobExecutor.loopIteration(appObj.getCurDateTime())
+    self.assertEqual(jobsData.getJob(jobGUIDs[1]).mostRecentCompletionStatus, 'Unknown')
+    self.assertEqual(jobsData.getJob(jobGUIDs[0]).mostRecentCompletionStatus, 'Success')
+    self.assertEqual([key[1] for key in jobsData.expiryIndex], [jobGUIDs[0]])
+
+    result = self.testClient.delete('/api/jobs/' + jobGUIDs[0])
+    self.assertResponseCodeEqual(result, 200)
+    self.assertEqual(jobsData.getNextCompletionStatusExpiry(), None)
+
+  def test_getJobSchedule(self):
+    jobGUID = self.createJobWithRepInterval('HOURLY:03,33')
+    appObj.setTestingDateTime(datetime.datetime(2016,1,5,14,2,59,0,pytz.timezone('UTC')))
+    result = self.testClient.get('/api/jobs/' + jobGUID + '/schedule?count=3')
+    self.assertResponseCodeEqual(result, 200)
+    resultJSON = json.loads(result.get_data(as_text=True))
+    self.assertEqual(resultJSON['repetitionInterval'], 'HOURLY:03,33')
+    self.assertEqual(resultJSON['enabled'], True)
+    self.assertEqual(resultJSON['nextRuns'], ['2016-01-05T14:03:00+00:00', '2016-01-05T14:33:00+00:00', '2016-01-05T15:03:00+00:00'])
+    #by name with the default count
+    result = self.testClient.get('/api/jobs/Job_with_ri_HOURLY:03,33/schedule')
+    self.assertResponseCodeEqual(result, 200)
+    self.assertEqual(len(json.loads(result.get_data(as_text=True))['nextRuns']), 10)
+
+  def test_getJobScheduleForManualJob(self):
+    result = self.testClient.post('/api/jobs/', data=json.dumps(data_simpleManualJobCreateParams), content_type='application/json')
+    self.assertResponseCodeEqual(result, 200)
+    jobGUID = json.loads(result.get_data(as_text=True))['guid']
+    result = self.testClient.get('/api/jobs/' + jobGUID + '/schedule')
+    self.assertResponseCodeEqual(result, 200)
+    self.assertEqual(json.loads(result.get_data(as_text=True))['nextRuns'], [])
+
+  def test_getJobScheduleInvalidRequests(self):
+    jobGUID = self.createJobWithRepInterval('HOURLY:03')
+    for count in ['0', '1001', 'a']:
+      result = self.testClient.get('/api/jobs/' + jobGUID + '/schedule?count=' + count)
+      self.assertResponseCodeEqual(result, 400)
+    result = self.testClient.get('/api/jobs/notAJob/schedule')
+    self.assertResponseCodeEqual(result, 400)
+
+  def test_recaculateWorksOutEachIntervalOnce(self):
+    for x in range(0, 5):
+      jobCreate = dict(data_simpleJobCreateParams)
+      jobCreate['name'] = 'SameIntervalJob' + str(x)
+      result = self.testClient.post('/api/jobs/', data=json.dumps(jobCreate), content_type='application/json')
+      self.assertResponseCodeEqual(result, 200)
+    self.createJobWithRepInterval('HOURLY:30')
+    ri = appObj.appData['jobsData'].getJobByName('SameIntervalJob0').compiledRepetitionInterval
+    calls = []
+    originalGetNextOccuranceDatetime = ri.getNextOccuranceDatetime
+    def countingGetNextOccuranceDatetime(curDateTime):
+      calls.append(curDateTime)
+      return originalGetNextOccuranceDatetime(curDateTime)
+    ri.getNextOccuranceDatetime = countingGetNextOccuranceDatetime
+    try:
+      appObj.appData['jobsData'].recaculateExecutionTimesBasedonNewTime(datetime.datetime(2016,1,5,14,2,59,0,pytz.timezone('UTC')))
+    finally:
+      del ri.getNextOccuranceDatetime
+    self.assertEqual(len(calls), 1)
+    for x in range(0, 5):
+      self.assertEqual(appObj.appData['jobsData'].getJobByName('SameIntervalJob' + str(x)).nextScheduledRun, '2016-01-05T14:03:00+00:00')
+    self.assertEqual(appObj.appData['jobsData'].getJobByName('Job_with_ri_HOURLY:30').nextScheduledRun, '2016-01-05T14:30:00+00:00')
+
+  def test_createJobWithCronInterval(self):
+    jobGUID = self.createJobWithRepInterval('CRON:*/15 9-17 * * MON-FRI:UTC')
+    appObj.appData['jobsData'].recaculateExecutionTimesBasedonNewTime(datetime.datetime(2016,1,8,17,50,0,0,pytz.timezone('UTC')))
+    self.assertEqual(appObj.appData['jobsData'].getJob(jobGUID).nextScheduledRun, '2016-01-11T09:00:00+00:00')
+
+  def test_everyJobRunsAPeriodAfterItsLastScheduledRun(self):
+    jobGUID = self.createJobWithRepInterval('EVERY:15')
+    jobObj = appObj.appData['jobsData'].getJob(jobGUID)
+    creationDate = from_iso8601(jobObj.creationDate)
+    self.assertEqual(from_iso8601(jobObj.nextScheduledRun), creationDate + datetime.timedelta(seconds=15 * (((datetime.datetime.now(pytz.utc) - creationDate) // datetime.timedelta(seconds=15)) + 1)))
+
+    #a manual run does not move the schedule
+    firstScheduledRun = from_iso8601(jobObj.nextScheduledRun).astimezone(pytz.utc)
+    manualRunTime = firstScheduledRun - datetime.timedelta(seconds=7)
+    appObj.setTestingDateTime(manualRunTime)
+    self.addExecution(jobGUID, 'Execution001')
+    appObj.jobExecutor.loopIteration(manualRunTime)
+    self.assertEqual(from_iso8601(jobObj.nextScheduledRun), firstScheduledRun)
+
+    #the scheduled run is dispatched late and takes a while but the next is still a period after it was due
+    dispatchTime = firstScheduledRun + datetime.timedelta(seconds=4)
+    appObj.setTestingDateTime(dispatchTime)
+    appObj.jobExecutor.loopIteration(dispatchTime)
+    self.assertEqual(from_iso8601(jobObj.nextScheduledRun), firstScheduledRun + datetime.timedelta(seconds=15))
+    completionTime = firstScheduledRun + datetime.timedelta(seconds=9)
+    appObj.setTestingDateTime(completionTime)
+    appObj.jobExecutor.loopIteration(completionTime)
+    self.assertEqual(jobObj.lastRunDate, completionTime)
+    self.assertEqual(from_iso8601(jobObj.nextScheduledRun), firstScheduledRun + datetime.timedelta(seconds=15))
+
+    result = self.testClient.get('/api/jobs/' + jobGUID + '/schedule?count=3')
+    self.assertEqual(json.loads(result.get_data(as_text=True))['nextRuns'], [(firstScheduledRun + datetime.timedelta(seconds=15 * x)).isoformat() for x in range(1, 4)])
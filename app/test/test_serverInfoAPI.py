@@ -19,6 +19,8 @@ class test_api(testHelperAPIClient):
         'ServerDatetime': 'IGNORE',
         'ServerStartupTime': '2018-01-01T13:46:00+00:00',
         'TotalJobExecutions': 0,
+        'PendingJobExecutions': 0,
+        'DroppedScheduledJobExecutions': 0,
         'MinutesBeforeMostRecentCompletionStatusBecomesUnknown': 49 * 60
       },
     }
@@ -49,6 +51,8 @@ class test_api(testHelperAPIClient):
         'ServerDatetime': 'IGNORE',
         'ServerStartupTime': '2018-01-01T13:46:00+00:00',
         'TotalJobExecutions': 0,
+        'PendingJobExecutions': 0,
+        'DroppedScheduledJobExecutions': 0,
         'MinutesBeforeMostRecentCompletionStatusBecomesUnknown': 49 * 60
       },
     }